@@ -70,6 +70,9 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'appointments.log.RequestLogMiddleware',
+    'appointments.metrics.MetricsMiddleware',
+    'appointments.replicas.ReplicaPinMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -106,6 +109,8 @@ WSGI_APPLICATION = 'appointment_system.wsgi.application'
 # https://docs.djangoproject.com/en/4.2/ref/settings/#databases
 
 import dj_database_url
+import django
+from django.core.exceptions import ImproperlyConfigured
 
 # Default SQLite for local development
 DATABASES = {
@@ -115,10 +120,112 @@ DATABASES = {
     }
 }
 
+# Connections to DATABASE_URL and the replicas:
+#   DATABASE_CONN_MAX_AGE        seconds a worker reuses a connection across requests (0: one per request)
+#   DATABASE_CONN_HEALTH_CHECKS  test a reused connection before a request's first query, so workers
+#                                reconnect at once after a failover instead of failing until it ages out
+#   DATABASE_CONNECT_TIMEOUT     seconds to wait for a new PostgreSQL connection
+#   DATABASE_POOL                PostgreSQL connection pool in each worker (Django 5.1+ with psycopg 3):
+#                                DATABASE_POOL_MIN_SIZE to DATABASE_POOL_MAX_SIZE connections, requests
+#                                wait up to DATABASE_POOL_TIMEOUT seconds for a free one
+#   DATABASE_PGBOUNCER           connecting through PgBouncer in transaction mode, which pools the
+#                                server connections of all workers (server-side cursors are disabled)
+DATABASE_CONN_MAX_AGE = int(os.getenv('DATABASE_CONN_MAX_AGE', 600))
+DATABASE_CONN_HEALTH_CHECKS = os.getenv('DATABASE_CONN_HEALTH_CHECKS', 'True') == 'True'
+DATABASE_CONNECT_TIMEOUT = int(os.getenv('DATABASE_CONNECT_TIMEOUT', 5))
+DATABASE_POOL = os.getenv('DATABASE_POOL', 'False') == 'True'
+DATABASE_POOL_MIN_SIZE = int(os.getenv('DATABASE_POOL_MIN_SIZE', 2))
+DATABASE_POOL_MAX_SIZE = int(os.getenv('DATABASE_POOL_MAX_SIZE', 10))
+DATABASE_POOL_TIMEOUT = float(os.getenv('DATABASE_POOL_TIMEOUT', 10))
+DATABASE_PGBOUNCER = os.getenv('DATABASE_PGBOUNCER', 'False') == 'True'
+if DATABASE_POOL and django.VERSION < (5, 1):
+    raise ImproperlyConfigured(
+        'DATABASE_POOL needs Django 5.1+ with psycopg 3; use PgBouncer (DATABASE_PGBOUNCER=True) instead'
+    )
+
+
+def _database_from_url(url):
+    """DATABASES entry for ``url`` with the connection settings above"""
+    database = dj_database_url.parse(
+        url,
+        conn_max_age=0 if DATABASE_POOL else DATABASE_CONN_MAX_AGE,
+        conn_health_checks=DATABASE_CONN_HEALTH_CHECKS,
+    )
+    if database['ENGINE'] == 'django.db.backends.postgresql':
+        options = database.setdefault('OPTIONS', {})
+        options['connect_timeout'] = DATABASE_CONNECT_TIMEOUT
+        if DATABASE_POOL:
+            options['pool'] = {
+                'min_size': DATABASE_POOL_MIN_SIZE,
+                'max_size': DATABASE_POOL_MAX_SIZE,
+                'timeout': DATABASE_POOL_TIMEOUT,
+            }
+        if DATABASE_PGBOUNCER:
+            database['DISABLE_SERVER_SIDE_CURSORS'] = True
+    return database
+
+
 # Use PostgreSQL in production (Railway/Heroku style)
 if 'DATABASE_URL' in os.environ:
-    DATABASES['default'] = dj_database_url.parse(os.environ.get('DATABASE_URL'))
-    DATABASES['default']['CONN_MAX_AGE'] = 600
+    DATABASES['default'] = _database_from_url(os.environ.get('DATABASE_URL'))
+
+# Read replicas for the read-heavy views (appointments/replicas.py):
+# comma-separated database URLs, added as replica_0, replica_1, ...
+DATABASE_REPLICA_URLS = [url.strip() for url in os.getenv('DATABASE_REPLICA_URLS', '').split(',') if url.strip()]
+for _index, _url in enumerate(DATABASE_REPLICA_URLS):
+    DATABASES[f'replica_{_index}'] = _database_from_url(_url)
+    # Tests read the test database through the replica aliases
+    DATABASES[f'replica_{_index}']['TEST'] = {'MIRROR': 'default'}
+DATABASE_ROUTERS = ['appointments.replicas.ReplicaRouter']
+# round_robin or least_latency
+REPLICA_SELECTION = os.getenv('REPLICA_SELECTION', 'round_robin')
+# Browsers read from the primary this long after they write
+REPLICA_PIN_SECONDS = int(os.getenv('REPLICA_PIN_SECONDS', 5))
+# How often each process checks a replica, how long one that failed is
+# skipped, and the replication lag above which one is skipped
+REPLICA_CHECK_SECONDS = int(os.getenv('REPLICA_CHECK_SECONDS', 5))
+REPLICA_RETRY_SECONDS = int(os.getenv('REPLICA_RETRY_SECONDS', 30))
+REPLICA_MAX_LAG_SECONDS = float(os.getenv('REPLICA_MAX_LAG_SECONDS', 5))
+
+# Cache backend from CACHE_URL:
+#   locmem://                  per-process memory (default)
+#   file:///var/tmp/appt_cache  shared by the processes of one host
+#   memcached://host:11211     one or more comma-separated servers (pymemcache);
+#                              `python manage.py cache_server` is a local stand-in
+#   redis://host:6379/0        Redis (needs the `redis` package)
+CACHE_URL = os.getenv('CACHE_URL', 'locmem://')
+_cache_scheme, _, _cache_location = CACHE_URL.partition('://')
+CACHE_BACKENDS = {
+    'locmem': 'django.core.cache.backends.locmem.LocMemCache',
+    'file': 'django.core.cache.backends.filebased.FileBasedCache',
+    'memcached': 'django.core.cache.backends.memcached.PyMemcacheCache',
+    'redis': 'django.core.cache.backends.redis.RedisCache',
+    'rediss': 'django.core.cache.backends.redis.RedisCache',
+}
+CACHES = {
+    'default': {
+        'BACKEND': CACHE_BACKENDS[_cache_scheme],
+        'LOCATION': (
+            CACHE_URL if _cache_scheme.startswith('redis')
+            else _cache_location.split(',') if _cache_scheme == 'memcached'
+            else _cache_location
+        ),
+        'KEY_PREFIX': os.getenv('CACHE_KEY_PREFIX', 'appointment_system'),
+    }
+}
+# Lifetime of the appointments app's cached slots, pages and counters
+APPOINTMENT_CACHE_TIMEOUT = int(os.getenv('APPOINTMENT_CACHE_TIMEOUT', 300))
+
+# Sessions are read through the cache and written through to the database.
+# With the per-process locmem cache another worker could serve a stale
+# session (e.g. after logout), so that case keeps the plain database backend.
+# SESSION_ENGINE=django.contrib.sessions.backends.signed_cookies stores
+# sessions client-side instead (no session queries, nothing to purge).
+SESSION_ENGINE = os.getenv(
+    'SESSION_ENGINE',
+    'django.contrib.sessions.backends.db' if _cache_scheme == 'locmem'
+    else 'django.contrib.sessions.backends.cached_db',
+)
 
 
 # Password validation
@@ -185,6 +292,8 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 ZOOM_ACCOUNT_ID = os.getenv('ZOOM_ACCOUNT_ID')
 ZOOM_CLIENT_ID = os.getenv('ZOOM_CLIENT_ID')
 ZOOM_CLIENT_SECRET = os.getenv('ZOOM_CLIENT_SECRET')
+ZOOM_BASE_URL = os.getenv('ZOOM_BASE_URL', 'https://api.zoom.us/v2')
+ZOOM_TOKEN_URL = os.getenv('ZOOM_TOKEN_URL', 'https://zoom.us/oauth/token')
 
 # bKash Payment Settings
 BKASH_APP_KEY = os.getenv('BKASH_APP_KEY')
@@ -192,6 +301,76 @@ BKASH_APP_SECRET = os.getenv('BKASH_APP_SECRET')
 BKASH_USERNAME = os.getenv('BKASH_USERNAME')
 BKASH_PASSWORD = os.getenv('BKASH_PASSWORD')
 BKASH_BASE_URL = os.getenv('BKASH_BASE_URL', 'https://tokenized.sandbox.bka.sh/v1.2.0-beta')
+BKASH_CALLBACK_URL = os.getenv('BKASH_CALLBACK_URL', 'http://localhost:8000/payment/callback/')
+# TEST MODE simulates payments without calling bKash; set False to use the
+# real checkout flow (e.g. against `manage.py fake_gateway_server`)
+BKASH_TEST_MODE = os.getenv('BKASH_TEST_MODE', 'True') == 'True'
+
+# Payment reconciliation (run `python manage.py reconcile_payments` from cron)
+RECONCILE_STALE_MINUTES = 15
+RECONCILE_EXPIRE_HOURS = 24
+RECONCILE_CHUNK_SIZE = 500
+RECONCILE_WORKERS = 8
+RECONCILE_RATE_LIMIT = int(os.getenv('RECONCILE_RATE_LIMIT', 20))  # bKash requests per second
+
+# Circuit breakers around Zoom and bKash calls (see appointments/circuit_breaker.py).
+# State is kept in the default cache: use a shared backend so workers agree.
+GATEWAY_TIMEOUT = int(os.getenv('GATEWAY_TIMEOUT', 10))
+CIRCUIT_WINDOW_SECONDS = 60
+CIRCUIT_MINIMUM_CALLS = 5
+CIRCUIT_FAILURE_RATE = 0.5
+CIRCUIT_SLOW_CALL_SECONDS = 5
+CIRCUIT_SLOW_CALL_RATE = 0.8
+CIRCUIT_OPEN_SECONDS = int(os.getenv('CIRCUIT_OPEN_SECONDS', 30))
+
+# Per-route rate limits, per signed-in user or client IP: "<requests>/<period>"
+# with period s, m, h or d (see appointments.ratelimit)
+RATE_LIMIT_ENABLED = os.getenv('RATE_LIMIT_ENABLED', 'True') == 'True'
+RATE_LIMITS = {
+    'login': os.getenv('RATE_LIMIT_LOGIN', '10/m'),
+    'register': os.getenv('RATE_LIMIT_REGISTER', '5/m'),
+    'payment': os.getenv('RATE_LIMIT_PAYMENT', '10/m'),
+    'payment_callback': os.getenv('RATE_LIMIT_PAYMENT_CALLBACK', '30/m'),
+    'slots': os.getenv('RATE_LIMIT_SLOTS', '120/m'),
+}
+# Reverse proxies in front of the app that append to X-Forwarded-For (1 on
+# Railway). Anonymous requests are limited per the address the outermost of
+# them saw; 0 uses REMOTE_ADDR
+RATE_LIMIT_TRUSTED_PROXIES = int(os.getenv('RATE_LIMIT_TRUSTED_PROXIES', 0))
+
+# Clients allowed to scrape /metrics without signing in as staff
+METRICS_ALLOWED_IPS = os.getenv('METRICS_ALLOWED_IPS', '127.0.0.1,::1').split(',')
+
+# Logging: JSON lines on stderr, written by a background thread (see
+# appointments.log). LOG_LEVEL sets the app's level; per-module overrides
+# below, e.g. ZOOM_LOG_LEVEL=DEBUG
+LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO')
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'queue': {
+            'class': 'appointments.log.QueueLogHandler',
+            'queue_size': int(os.getenv('LOG_QUEUE_SIZE', 10000)),
+        },
+    },
+    'root': {'handlers': ['queue'], 'level': 'WARNING'},
+    'loggers': {
+        'django': {'handlers': ['queue'], 'level': os.getenv('DJANGO_LOG_LEVEL', 'INFO'), 'propagate': False},
+        'appointments': {'handlers': ['queue'], 'level': LOG_LEVEL, 'propagate': False},
+        'appointments.requests': {'level': os.getenv('REQUEST_LOG_LEVEL', LOG_LEVEL)},
+        'appointments.zoom_service': {'level': os.getenv('ZOOM_LOG_LEVEL', LOG_LEVEL)},
+        'appointments.bkash_service': {'level': os.getenv('BKASH_LOG_LEVEL', LOG_LEVEL)},
+        'appointments.circuit_breaker': {'level': os.getenv('CIRCUIT_LOG_LEVEL', LOG_LEVEL)},
+    },
+}
+
+# Slow-query log (see appointments.slow_queries): queries slower than
+# SLOW_QUERY_MS are logged and aggregated per SQL fingerprint; on PostgreSQL
+# this share of them is re-run under EXPLAIN (ANALYZE, BUFFERS)
+SLOW_QUERY_LOG = os.getenv('SLOW_QUERY_LOG', 'False') == 'True'
+SLOW_QUERY_MS = float(os.getenv('SLOW_QUERY_MS', 100))
+SLOW_QUERY_EXPLAIN_RATE = float(os.getenv('SLOW_QUERY_EXPLAIN_RATE', 0.1))
 
 # Email Settings
 EMAIL_BACKEND = 'django.core.mail.backends.smtp.EmailBackend'
@@ -200,6 +379,41 @@ EMAIL_PORT = int(os.getenv('EMAIL_PORT', 587))
 EMAIL_USE_TLS = os.getenv('EMAIL_USE_TLS', 'True') == 'True'
 EMAIL_HOST_USER = os.getenv('EMAIL_HOST_USER')
 EMAIL_HOST_PASSWORD = os.getenv('EMAIL_HOST_PASSWORD')
+EMAIL_TIMEOUT = int(os.getenv('EMAIL_TIMEOUT', 10))
+DEFAULT_FROM_EMAIL = os.getenv('DEFAULT_FROM_EMAIL', EMAIL_HOST_USER or 'webmaster@localhost')
+
+# Notification outbox (drained by `python manage.py send_notifications`)
+NOTIFICATION_BATCH_SIZE = int(os.getenv('NOTIFICATION_BATCH_SIZE', 100))
+NOTIFICATION_MAX_ATTEMPTS = int(os.getenv('NOTIFICATION_MAX_ATTEMPTS', 5))
+
+# Appointment reminders (dispatched by `python manage.py send_reminders`)
+REMINDER_LEAD_MINUTES = [24 * 60, 60]
+REMINDER_CHANNELS = ['email', 'sms']
+REMINDER_SENDERS = {
+    'email': 'appointments.reminders.OutboxEmailSender',
+    'sms': 'appointments.reminders.ConsoleSMSSender',
+}
+REMINDER_BUCKET_SECONDS = 60
+REMINDER_BATCH_SIZE = int(os.getenv('REMINDER_BATCH_SIZE', 500))
+REMINDER_MAX_ATTEMPTS = 3
+
+# Refund queue for cancelled paid appointments (drained by `python manage.py process_refunds`)
+REFUND_BATCH_SIZE = int(os.getenv('REFUND_BATCH_SIZE', 100))
+REFUND_WORKERS = 8
+REFUND_MAX_ATTEMPTS = int(os.getenv('REFUND_MAX_ATTEMPTS', 5))
+# A claimed refund not finished within this long (e.g. the worker died) is retried
+REFUND_CLAIM_SECONDS = 300
+
+# Zoom meeting update/delete queue (drained by `python manage.py sync_zoom_meetings`)
+ZOOM_SYNC_BATCH_SIZE = int(os.getenv('ZOOM_SYNC_BATCH_SIZE', 100))
+ZOOM_SYNC_WORKERS = 4
+ZOOM_SYNC_MAX_ATTEMPTS = 5
+ZOOM_SYNC_CLAIM_SECONDS = 300
+
+# Pre-created Zoom meetings handed out at confirmation (run `python manage.py zoom_meeting_pool`)
+ZOOM_POOL_DAYS_AHEAD = 2
+ZOOM_POOL_MAX_CREATE = int(os.getenv('ZOOM_POOL_MAX_CREATE', 200))  # Meetings created per run
+ZOOM_POOL_WORKERS = 4
 
 # Application Settings
 APPOINTMENT_FEE = int(os.getenv('APPOINTMENT_FEE', 500))
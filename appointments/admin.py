@@ -1,11 +1,46 @@
 from django.contrib import admin
+from django.core.paginator import Paginator
+from django.db import connections
+from django.utils import timezone
+from django.utils.functional import cached_property
 from django.utils.html import format_html
-from .models import Patient, Doctor, Appointment, Payment, TimeSlot
+from .models import Patient, Doctor, Appointment, Payment, TimeSlot, Notification, Reminder, Refund, ZoomSyncTask, PooledMeeting, SlowQuery
+from .transitions import bulk_set_status
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Paginator that trusts PostgreSQL's row estimate for unfiltered lists
+
+    COUNT(*) over hundreds of thousands of rows dominates changelist render
+    time. When no filter or search is applied, the planner statistics in
+    pg_class (summed over partitions, if any) are close enough for paging.
+    """
+    # Below this many rows an exact count is cheap enough
+    ESTIMATE_THRESHOLD = 10000
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        connection = connections[queryset.db]
+        if connection.vendor == 'postgresql' and not queryset.query.where:
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    "SELECT SUM(GREATEST(c.reltuples, 0))::bigint FROM pg_class c "
+                    "WHERE c.oid = %s::regclass "
+                    "OR c.oid IN (SELECT inhrelid FROM pg_inherits WHERE inhparent = %s::regclass)",
+                    [queryset.model._meta.db_table] * 2,
+                )
+                estimate = cursor.fetchone()[0] or 0
+            if estimate > self.ESTIMATE_THRESHOLD:
+                return estimate
+        return super().count
 
 
 @admin.register(Patient)
 class PatientAdmin(admin.ModelAdmin):
     list_display = ['get_full_name', 'phone', 'get_email', 'created_at']
+    list_select_related = ['user']
     search_fields = ['user__first_name', 'user__last_name', 'user__email', 'phone']
     list_filter = ['created_at']
     readonly_fields = ['created_at']
@@ -39,6 +74,7 @@ class PatientAdmin(admin.ModelAdmin):
 @admin.register(Doctor)
 class DoctorAdmin(admin.ModelAdmin):
     list_display = ['name', 'specialization', 'get_username', 'consultation_fee', 'phone', 'is_available', 'created_at']
+    list_select_related = ['user']
     search_fields = ['name', 'specialization', 'email', 'user__username']
     list_filter = ['is_available', 'specialization', 'created_at']
     list_editable = ['is_available', 'consultation_fee']
@@ -71,9 +107,13 @@ class DoctorAdmin(admin.ModelAdmin):
 @admin.register(Appointment)
 class AppointmentAdmin(admin.ModelAdmin):
     list_display = ['get_patient_name', 'get_doctor_name', 'appointment_date', 'appointment_time', 'status', 'payment_status', 'has_zoom_link', 'amount', 'created_at']
+    list_select_related = ['patient__user', 'doctor']
     search_fields = ['patient__user__first_name', 'patient__user__last_name', 'doctor__name']
     list_filter = ['status', 'payment_status', 'appointment_date', 'created_at']
     list_editable = ['status', 'payment_status']
+    date_hierarchy = 'appointment_date'
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
     readonly_fields = ['zoom_meeting_id', 'created_at', 'updated_at']
     
     fieldsets = (
@@ -100,10 +140,12 @@ class AppointmentAdmin(admin.ModelAdmin):
     def get_patient_name(self, obj):
         return obj.patient.user.get_full_name()
     get_patient_name.short_description = 'Patient'
+    get_patient_name.admin_order_field = 'patient__user__first_name'
     
     def get_doctor_name(self, obj):
         return f"Dr. {obj.doctor.name}"
     get_doctor_name.short_description = 'Doctor'
+    get_doctor_name.admin_order_field = 'doctor__name'
     
     def has_zoom_link(self, obj):
         return bool(obj.zoom_join_url)
@@ -134,12 +176,12 @@ class AppointmentAdmin(admin.ModelAdmin):
     generate_zoom_link.short_description = "Generate Zoom Meeting Links"
     
     def mark_as_confirmed(self, request, queryset):
-        updated = queryset.update(status='confirmed')
+        updated = bulk_set_status(queryset, 'confirmed')
         self.message_user(request, f"{updated} appointment(s) marked as confirmed")
     mark_as_confirmed.short_description = "Mark as Confirmed"
     
     def mark_as_completed(self, request, queryset):
-        updated = queryset.update(status='completed')
+        updated = bulk_set_status(queryset, 'completed')
         self.message_user(request, f"{updated} appointment(s) marked as completed")
     mark_as_completed.short_description = "Mark as Completed"
 
@@ -147,9 +189,12 @@ class AppointmentAdmin(admin.ModelAdmin):
 @admin.register(Payment)
 class PaymentAdmin(admin.ModelAdmin):
     list_display = ['get_patient_name', 'get_appointment_date', 'amount', 'payment_method', 'status', 'transaction_id', 'payment_date', 'created_at']
-    search_fields = ['appointment__patient__user__first_name', 'appointment__patient__user__last_name', 'transaction_id', 'bkash_transaction_id']
+    list_select_related = ['appointment__patient__user']
+    search_fields = ['appointment__patient__user__first_name', 'appointment__patient__user__last_name', '=transaction_id', '=bkash_transaction_id']
     list_filter = ['status', 'payment_method', 'payment_date', 'created_at']
     readonly_fields = ['transaction_id', 'bkash_transaction_id', 'payment_id', 'created_at', 'updated_at']
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
     
     def get_patient_name(self, obj):
         return obj.appointment.patient.user.get_full_name()
@@ -163,6 +208,7 @@ class PaymentAdmin(admin.ModelAdmin):
 @admin.register(TimeSlot)
 class TimeSlotAdmin(admin.ModelAdmin):
     list_display = ['get_doctor_name', 'get_weekday', 'start_time', 'end_time', 'is_available']
+    list_select_related = ['doctor']
     search_fields = ['doctor__name']
     list_filter = ['weekday', 'is_available', 'doctor']
     list_editable = ['is_available']
@@ -174,3 +220,72 @@ class TimeSlotAdmin(admin.ModelAdmin):
     def get_weekday(self, obj):
         return obj.get_weekday_display()
     get_weekday.short_description = 'Day'
+
+
+@admin.register(Notification)
+class NotificationAdmin(admin.ModelAdmin):
+    list_display = ['recipient', 'kind', 'status', 'attempts', 'next_attempt_at', 'sent_at', 'created_at']
+    list_filter = ['status', 'kind']
+    search_fields = ['=recipient', 'subject']
+    readonly_fields = ['appointment', 'sent_at', 'created_at']
+    actions = ['retry_now']
+
+    def retry_now(self, request, queryset):
+        updated = queryset.exclude(status='sent').update(
+            status='pending', attempts=0, next_attempt_at=timezone.now()
+        )
+        self.message_user(request, f'{updated} notification(s) queued for retry.')
+    retry_now.short_description = "Retry now"
+
+
+@admin.register(Reminder)
+class ReminderAdmin(admin.ModelAdmin):
+    list_display = ['appointment', 'channel', 'lead_minutes', 'due_at', 'status', 'attempts', 'sent_at']
+    list_select_related = ['appointment__patient__user', 'appointment__doctor']
+    list_filter = ['status', 'channel', 'lead_minutes']
+    raw_id_fields = ['appointment']
+    readonly_fields = ['bucket', 'sent_at', 'created_at']
+
+
+@admin.register(Refund)
+class RefundAdmin(admin.ModelAdmin):
+    list_display = ['payment', 'amount', 'status', 'attempts', 'next_attempt_at', 'refund_trx_id', 'refunded_at']
+    list_select_related = ['payment__appointment__patient__user']
+    list_filter = ['status']
+    search_fields = ['=refund_trx_id', '=payment__bkash_transaction_id']
+    raw_id_fields = ['payment']
+    readonly_fields = ['idempotency_key', 'refund_trx_id', 'refunded_at', 'created_at']
+    actions = ['retry_now']
+
+    def retry_now(self, request, queryset):
+        updated = queryset.filter(status='failed').update(
+            status='pending', attempts=0, next_attempt_at=timezone.now()
+        )
+        self.message_user(request, f'{updated} refund(s) queued for retry.')
+    retry_now.short_description = "Retry now"
+
+
+@admin.register(ZoomSyncTask)
+class ZoomSyncTaskAdmin(admin.ModelAdmin):
+    list_display = ['meeting_id', 'action', 'appointment', 'status', 'attempts', 'next_attempt_at', 'processed_at']
+    list_select_related = ['appointment__patient__user', 'appointment__doctor']
+    list_filter = ['status', 'action']
+    search_fields = ['=meeting_id']
+    raw_id_fields = ['appointment']
+    readonly_fields = ['processed_at', 'created_at']
+
+
+@admin.register(PooledMeeting)
+class PooledMeetingAdmin(admin.ModelAdmin):
+    list_display = ['meeting_id', 'start_time', 'status', 'appointment', 'assigned_at', 'created_at']
+    list_filter = ['status']
+    search_fields = ['=meeting_id']
+    raw_id_fields = ['appointment']
+    readonly_fields = ['assigned_at', 'created_at']
+
+
+@admin.register(SlowQuery)
+class SlowQueryAdmin(admin.ModelAdmin):
+    list_display = ['fingerprint', 'calls', 'total_ms', 'max_ms', 'caller', 'view', 'last_seen']
+    search_fields = ['sql', 'caller', 'view']
+    readonly_fields = [field.name for field in SlowQuery._meta.fields]
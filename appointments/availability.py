@@ -0,0 +1,177 @@
+"""
+Bulk availability computation for doctors' booking windows
+"""
+import heapq
+from collections import defaultdict
+from datetime import datetime, timedelta
+from itertools import chain, islice
+
+from django.db.models import Count
+
+from .models import Appointment, Doctor, TimeSlot
+
+
+# Appointment statuses that occupy a time slot
+BOOKED_STATUSES = ['pending', 'confirmed']
+
+# Matches AppointmentForm.clean_appointment_date: today plus 30 days ahead
+BOOKING_WINDOW_DAYS = 31
+
+
+def weekly_slot_times(doctor):
+    """
+    Get the doctor's available slot start times grouped by weekday
+
+    Returns:
+        dict: weekday (0 = Monday) -> sorted list of ``time`` objects
+    """
+    slots = defaultdict(list)
+    time_slots = TimeSlot.objects.filter(
+        doctor=doctor,
+        is_available=True
+    ).order_by('weekday', 'start_time').values_list('weekday', 'start_time')
+    for weekday, start_time in time_slots:
+        slots[weekday].append(start_time)
+    return dict(slots)
+
+
+def booked_times(doctor, start, end):
+    """
+    Get booked slot times per date with a single grouped query
+
+    Returns:
+        dict: date -> set of booked ``time`` objects
+    """
+    booked = defaultdict(set)
+    rows = Appointment.objects.filter(
+        doctor=doctor,
+        appointment_date__range=(start, end),
+        status__in=BOOKED_STATUSES
+    ).values('appointment_date', 'appointment_time').annotate(count=Count('id')).order_by()
+    for row in rows:
+        booked[row['appointment_date']].add(row['appointment_time'])
+    return booked
+
+
+def booking_window(doctor, start, days):
+    """
+    Compute availability for every day in ``[start, start + days)``
+
+    Each day is encoded as a bitmask over that weekday's slot list: bit ``i``
+    is set when ``slots[weekday][i]`` is still free on that date.
+
+    Args:
+        doctor: Doctor instance or id
+        start (date): First day of the window
+        days (int): Number of days in the window
+
+    Returns:
+        dict: ``{'slots': {weekday: ['HH:MM', ...]}, 'days': [bitmask, ...]}``
+    """
+    end = start + timedelta(days=days - 1)
+    slots = weekly_slot_times(doctor)
+    booked = booked_times(doctor, start, end)
+
+    masks = []
+    for offset in range(days):
+        day = start + timedelta(days=offset)
+        taken = booked.get(day, ())
+        mask = 0
+        for index, start_time in enumerate(slots.get(day.weekday(), ())):
+            if start_time not in taken:
+                mask |= 1 << index
+        masks.append(mask)
+
+    return {
+        'slots': {
+            str(weekday): [t.strftime('%H:%M') for t in times]
+            for weekday, times in slots.items()
+        },
+        'days': masks,
+    }
+
+
+def _doctor_openings(doctor_id, day, times, booked, not_before):
+    """Yield ``(datetime, doctor_id)`` for a doctor's free slots on ``day`` in time order"""
+    for start_time in times:
+        if (doctor_id, start_time) in booked:
+            continue
+        slot_datetime = datetime.combine(day, start_time)
+        if slot_datetime >= not_before:
+            yield slot_datetime, doctor_id
+
+
+def _day_openings(specialization, day, slot_cache, not_before):
+    """
+    Merge every matching doctor's free slots on ``day`` into one ordered stream
+
+    Weekly slot templates are loaded in bulk once per weekday and the day's
+    bookings with a single query, never per doctor.
+    """
+    weekday = day.weekday()
+    if weekday not in slot_cache:
+        slots = defaultdict(list)
+        time_slots = TimeSlot.objects.filter(
+            doctor__specialization__icontains=specialization,
+            doctor__is_available=True,
+            weekday=weekday,
+            is_available=True
+        ).order_by('doctor_id', 'start_time').values_list('doctor_id', 'start_time')
+        for doctor_id, start_time in time_slots:
+            slots[doctor_id].append(start_time)
+        slot_cache[weekday] = slots
+
+    slots = slot_cache[weekday]
+    if not slots:
+        return iter(())
+
+    booked = set(Appointment.objects.filter(
+        doctor__specialization__icontains=specialization,
+        doctor__is_available=True,
+        appointment_date=day,
+        status__in=BOOKED_STATUSES
+    ).values_list('doctor_id', 'appointment_time').order_by())
+
+    return heapq.merge(*(
+        _doctor_openings(doctor_id, day, times, booked, not_before)
+        for doctor_id, times in slots.items()
+    ))
+
+
+def earliest_slots(specialization, start, days, k=10, not_before=None):
+    """
+    Find the ``k`` earliest open slots across all doctors of a specialization
+
+    Days are visited in order and stop as soon as ``k`` slots are found. For
+    each visited day every matching doctor's availability is computed in
+    bulk (one TimeSlot query per weekday, one Appointment query per date)
+    and a heap merges the per-doctor streams, so the cost does not depend
+    on issuing queries per doctor.
+
+    Args:
+        specialization (str): Matched case-insensitively, like doctors_list
+        start (date): First day of the search window
+        days (int): Number of days to search
+        k (int): Number of slots to return
+        not_before (datetime): Skip slots earlier than this (naive, local)
+
+    Returns:
+        list: dicts with ``doctor`` (Doctor instance), ``date`` and ``time``
+    """
+    not_before = not_before or datetime.combine(start, datetime.min.time())
+    slot_cache = {}
+    openings = chain.from_iterable(
+        _day_openings(specialization, start + timedelta(days=offset), slot_cache, not_before)
+        for offset in range(days)
+    )
+    results = list(islice(openings, k))
+
+    doctors = Doctor.objects.in_bulk({doctor_id for _, doctor_id in results})
+    return [
+        {
+            'doctor': doctors[doctor_id],
+            'date': slot_datetime.date(),
+            'time': slot_datetime.time(),
+        }
+        for slot_datetime, doctor_id in results
+    ]
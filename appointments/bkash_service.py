@@ -1,294 +1,444 @@
+import logging
 import requests
 import json
+import threading
+import time
 import uuid
 from datetime import datetime
 from django.conf import settings
 
+from .circuit_breaker import CircuitOpenError, bkash_breaker
+from .http_client import async_client
+
+
+logger = logging.getLogger(__name__)
+
 
 class BkashPaymentService:
-    """Service class for bKash Payment Gateway integration"""
-    
+    """
+    Service class for bKash Payment Gateway integration
+
+    Every API method has an async twin with an ``a`` prefix
+    (``acreate_payment`` etc.) that uses a non-blocking HTTP client, for
+    async views running under ASGI.
+    """
+
     def __init__(self):
         self.app_key = settings.BKASH_APP_KEY
         self.app_secret = settings.BKASH_APP_SECRET
         self.username = settings.BKASH_USERNAME
         self.password = settings.BKASH_PASSWORD
         self.base_url = settings.BKASH_BASE_URL
+        self.callback_url = settings.BKASH_CALLBACK_URL
         self.token = None
         self.token_expiry = None
-    
+
+    def _grant_request(self):
+        """URL, headers and body of the grant token request"""
+        url = f"{self.base_url}/tokenized/checkout/token/grant"
+
+        headers = {
+            'Content-Type': 'application/json',
+            'Accept': 'application/json',
+            'username': self.username,
+            'password': self.password
+        }
+
+        data = {
+            'app_key': self.app_key,
+            'app_secret': self.app_secret
+        }
+        return url, headers, data
+
+    def _grant_result(self, result):
+        if result.get('statusCode') == '0000':
+            self.token = result.get('id_token')
+            # time.monotonic() deadline, a minute early to allow for clock skew
+            self.token_expiry = time.monotonic() + int(result.get('expires_in') or 3600) - 60
+            return self.token
+        else:
+            logger.error('Error getting grant token: %s', result.get('statusMessage'))
+            return None
+
+    def token_expired(self):
+        return not self.token or (self.token_expiry is not None and time.monotonic() >= self.token_expiry)
+
+    def _auth_headers(self):
+        return {
+            'Content-Type': 'application/json',
+            'Accept': 'application/json',
+            'Authorization': self.token,
+            'X-APP-Key': self.app_key
+        }
+
+    def _create_request(self, amount, merchant_invoice_number=None):
+        url = f"{self.base_url}/tokenized/checkout/create"
+
+        # Generate unique payment reference
+        payment_reference = merchant_invoice_number or str(uuid.uuid4())
+
+        data = {
+            'mode': '0011',  # Checkout mode
+            'payerReference': ' ',
+            'callbackURL': self.callback_url,
+            'amount': str(amount),
+            'currency': 'BDT',
+            'intent': 'sale',
+            'merchantInvoiceNumber': payment_reference
+        }
+        return url, data
+
+    def _create_result(self, result):
+        if result.get('statusCode') == '0000':
+            return {
+                'payment_id': result.get('paymentID'),
+                'bkash_url': result.get('bkashURL'),
+                'callback_url': result.get('callbackURL'),
+                'success': True,
+                'message': 'Payment created successfully'
+            }
+        else:
+            return {
+                'success': False,
+                'message': result.get('statusMessage', 'Payment creation failed')
+            }
+
+    def _execute_request(self, payment_id):
+        return f"{self.base_url}/tokenized/checkout/execute", {'paymentID': payment_id}
+
+    def _execute_result(self, result):
+        if result.get('statusCode') == '0000':
+            return {
+                'success': True,
+                'transaction_id': result.get('trxID'),
+                'payment_id': result.get('paymentID'),
+                'amount': result.get('amount'),
+                'customer_msisdn': result.get('customerMsisdn'),
+                'transaction_status': result.get('transactionStatus'),
+                'message': 'Payment executed successfully'
+            }
+        else:
+            return {
+                'success': False,
+                'message': result.get('statusMessage', 'Payment execution failed')
+            }
+
+    def _query_request(self, payment_id):
+        return f"{self.base_url}/tokenized/checkout/payment/status", {'paymentID': payment_id}
+
+    def _refund_request(self, payment_id, transaction_id, amount, reason):
+        url = f"{self.base_url}/tokenized/checkout/payment/refund"
+
+        data = {
+            'paymentID': payment_id,
+            'trxID': transaction_id,
+            'amount': str(amount),
+            'reason': reason,
+            'sku': 'refund'
+        }
+        return url, data
+
+    def _refund_result(self, result):
+        if result.get('statusCode') == '0000':
+            return {
+                'success': True,
+                'refund_trx_id': result.get('refundTrxID'),
+                'message': 'Refund processed successfully'
+            }
+        else:
+            return {
+                'success': False,
+                'message': result.get('statusMessage', 'Refund failed')
+            }
+
+    def _unavailable(self, error):
+        """Result while the bKash circuit breaker is open"""
+        return {
+            'success': False,
+            'unavailable': True,
+            'message': str(error)
+        }
+
+    def _post(self, url, data):
+        """POST an authorized request and return the decoded JSON"""
+        response = bkash_breaker.call(
+            requests.post, url, headers=self._auth_headers(), json=data, timeout=settings.GATEWAY_TIMEOUT
+        )
+        response.raise_for_status()
+        return response.json()
+
+    async def _apost(self, url, data):
+        """Async version of ``_post``"""
+        async with async_client(settings.GATEWAY_TIMEOUT) as client:
+            response = await bkash_breaker.acall(client.post, url, headers=self._auth_headers(), json=data)
+        response.raise_for_status()
+        return response.json()
+
     def get_grant_token(self):
         """Get grant token from bKash API"""
         try:
-            url = f"{self.base_url}/tokenized/checkout/token/grant"
-            
-            headers = {
-                'Content-Type': 'application/json',
-                'Accept': 'application/json',
-                'username': self.username,
-                'password': self.password
-            }
-            
-            data = {
-                'app_key': self.app_key,
-                'app_secret': self.app_secret
-            }
-            
-            response = requests.post(url, headers=headers, json=data)
+            url, headers, data = self._grant_request()
+
+            response = bkash_breaker.call(
+                requests.post, url, headers=headers, json=data, timeout=settings.GATEWAY_TIMEOUT
+            )
             response.raise_for_status()
-            
-            result = response.json()
-            
-            if result.get('statusCode') == '0000':
-                self.token = result.get('id_token')
-                return self.token
-            else:
-                print(f"Error getting grant token: {result.get('statusMessage')}")
-                return None
-        
-        except Exception as e:
-            print(f"Error in get_grant_token: {str(e)}")
+
+            return self._grant_result(response.json())
+
+        except CircuitOpenError:
+            raise
+        except Exception:
+            logger.exception('Error in get_grant_token')
             return None
-    
+
     def create_payment(self, amount, invoice_number, merchant_invoice_number=None):
         """
         Create a bKash payment
-        
+
         Args:
             amount (float): Payment amount
             invoice_number (str): Unique invoice number
             merchant_invoice_number (str): Optional merchant invoice number
-        
+
         Returns:
             dict: Payment creation response with bkashURL for redirect
         """
         try:
             if not self.token:
                 self.get_grant_token()
-            
+
             if not self.token:
                 return None
-            
-            url = f"{self.base_url}/tokenized/checkout/create"
-            
-            headers = {
-                'Content-Type': 'application/json',
-                'Accept': 'application/json',
-                'Authorization': self.token,
-                'X-APP-Key': self.app_key
-            }
-            
-            # Generate unique payment reference
-            payment_reference = merchant_invoice_number or str(uuid.uuid4())
-            
-            data = {
-                'mode': '0011',  # Checkout mode
-                'payerReference': ' ',
-                'callbackURL': 'http://localhost:8000/payment/callback/',
-                'amount': str(amount),
-                'currency': 'BDT',
-                'intent': 'sale',
-                'merchantInvoiceNumber': payment_reference
-            }
-            
-            response = requests.post(url, headers=headers, json=data)
-            response.raise_for_status()
-            
-            result = response.json()
-            
-            if result.get('statusCode') == '0000':
-                return {
-                    'payment_id': result.get('paymentID'),
-                    'bkash_url': result.get('bkashURL'),
-                    'callback_url': result.get('callbackURL'),
-                    'success': True,
-                    'message': 'Payment created successfully'
-                }
-            else:
-                return {
-                    'success': False,
-                    'message': result.get('statusMessage', 'Payment creation failed')
-                }
-        
+
+            return self._create_result(self._post(*self._create_request(amount, merchant_invoice_number)))
+
+        except CircuitOpenError as e:
+            return self._unavailable(e)
         except Exception as e:
-            print(f"Error creating payment: {str(e)}")
+            logger.exception('Error creating payment')
             return {
                 'success': False,
                 'message': str(e)
             }
-    
+
     def execute_payment(self, payment_id):
         """
         Execute a bKash payment after user approval
-        
+
         Args:
             payment_id (str): Payment ID from create_payment response
-        
+
         Returns:
             dict: Execution result with transaction details
         """
         try:
             if not self.token:
                 self.get_grant_token()
-            
-            url = f"{self.base_url}/tokenized/checkout/execute"
-            
-            headers = {
-                'Content-Type': 'application/json',
-                'Accept': 'application/json',
-                'Authorization': self.token,
-                'X-APP-Key': self.app_key
-            }
-            
-            data = {
-                'paymentID': payment_id
-            }
-            
-            response = requests.post(url, headers=headers, json=data)
-            response.raise_for_status()
-            
-            result = response.json()
-            
-            if result.get('statusCode') == '0000':
-                return {
-                    'success': True,
-                    'transaction_id': result.get('trxID'),
-                    'payment_id': result.get('paymentID'),
-                    'amount': result.get('amount'),
-                    'customer_msisdn': result.get('customerMsisdn'),
-                    'transaction_status': result.get('transactionStatus'),
-                    'message': 'Payment executed successfully'
-                }
-            else:
-                return {
-                    'success': False,
-                    'message': result.get('statusMessage', 'Payment execution failed')
-                }
-        
+
+            return self._execute_result(self._post(*self._execute_request(payment_id)))
+
+        except CircuitOpenError as e:
+            return self._unavailable(e)
         except Exception as e:
-            print(f"Error executing payment: {str(e)}")
+            logger.exception('Error executing payment %s', payment_id)
             return {
                 'success': False,
                 'message': str(e)
             }
-    
+
     def query_payment(self, payment_id):
         """
         Query payment status
-        
+
         Args:
             payment_id (str): Payment ID to query
-        
+
         Returns:
-            dict: Payment status information
+            dict: Payment status information, the ``_unavailable`` result
+            while the circuit breaker is open, or None if the query failed
         """
         try:
             if not self.token:
                 self.get_grant_token()
-            
-            url = f"{self.base_url}/tokenized/checkout/payment/status"
-            
-            headers = {
-                'Content-Type': 'application/json',
-                'Accept': 'application/json',
-                'Authorization': self.token,
-                'X-APP-Key': self.app_key
-            }
-            
-            data = {
-                'paymentID': payment_id
-            }
-            
-            response = requests.post(url, headers=headers, json=data)
-            response.raise_for_status()
-            
-            result = response.json()
-            
-            return result
-        
-        except Exception as e:
-            print(f"Error querying payment: {str(e)}")
+
+            return self._post(*self._query_request(payment_id))
+
+        except CircuitOpenError as e:
+            return self._unavailable(e)
+        except Exception:
+            logger.exception('Error querying payment %s', payment_id)
             return None
-    
+
     def refund_payment(self, payment_id, transaction_id, amount, reason):
         """
         Refund a payment
-        
+
         Args:
             payment_id (str): Original payment ID
             transaction_id (str): Transaction ID to refund
             amount (float): Refund amount
             reason (str): Refund reason
-        
+
         Returns:
             dict: Refund result
         """
         try:
             if not self.token:
                 self.get_grant_token()
-            
-            url = f"{self.base_url}/tokenized/checkout/payment/refund"
-            
-            headers = {
-                'Content-Type': 'application/json',
-                'Accept': 'application/json',
-                'Authorization': self.token,
-                'X-APP-Key': self.app_key
-            }
-            
-            data = {
-                'paymentID': payment_id,
-                'trxID': transaction_id,
-                'amount': str(amount),
-                'reason': reason,
-                'sku': 'refund'
+
+            return self._refund_result(
+                self._post(*self._refund_request(payment_id, transaction_id, amount, reason))
+            )
+
+        except CircuitOpenError as e:
+            return self._unavailable(e)
+        except Exception as e:
+            logger.exception('Error processing refund of payment %s', payment_id)
+            return {
+                'success': False,
+                'message': str(e)
             }
-            
-            response = requests.post(url, headers=headers, json=data)
+
+    async def aget_grant_token(self):
+        """Async version of ``get_grant_token``"""
+        try:
+            url, headers, data = self._grant_request()
+
+            async with async_client(settings.GATEWAY_TIMEOUT) as client:
+                response = await bkash_breaker.acall(client.post, url, headers=headers, json=data)
             response.raise_for_status()
-            
-            result = response.json()
-            
-            if result.get('statusCode') == '0000':
-                return {
-                    'success': True,
-                    'refund_trx_id': result.get('refundTrxID'),
-                    'message': 'Refund processed successfully'
-                }
-            else:
-                return {
-                    'success': False,
-                    'message': result.get('statusMessage', 'Refund failed')
-                }
-        
+
+            return self._grant_result(response.json())
+
+        except CircuitOpenError:
+            raise
+        except Exception:
+            logger.exception('Error in get_grant_token')
+            return None
+
+    async def acreate_payment(self, amount, invoice_number, merchant_invoice_number=None):
+        """Async version of ``create_payment``"""
+        try:
+            if not self.token:
+                await self.aget_grant_token()
+
+            if not self.token:
+                return None
+
+            return self._create_result(await self._apost(*self._create_request(amount, merchant_invoice_number)))
+
+        except CircuitOpenError as e:
+            return self._unavailable(e)
+        except Exception as e:
+            logger.exception('Error creating payment')
+            return {
+                'success': False,
+                'message': str(e)
+            }
+
+    async def aexecute_payment(self, payment_id):
+        """Async version of ``execute_payment``"""
+        try:
+            if not self.token:
+                await self.aget_grant_token()
+
+            return self._execute_result(await self._apost(*self._execute_request(payment_id)))
+
+        except CircuitOpenError as e:
+            return self._unavailable(e)
+        except Exception as e:
+            logger.exception('Error executing payment %s', payment_id)
+            return {
+                'success': False,
+                'message': str(e)
+            }
+
+    async def aquery_payment(self, payment_id):
+        """Async version of ``query_payment``"""
+        try:
+            if not self.token:
+                await self.aget_grant_token()
+
+            return await self._apost(*self._query_request(payment_id))
+
+        except CircuitOpenError as e:
+            return self._unavailable(e)
+        except Exception:
+            logger.exception('Error querying payment %s', payment_id)
+            return None
+
+    async def arefund_payment(self, payment_id, transaction_id, amount, reason):
+        """Async version of ``refund_payment``"""
+        try:
+            if not self.token:
+                await self.aget_grant_token()
+
+            return self._refund_result(
+                await self._apost(*self._refund_request(payment_id, transaction_id, amount, reason))
+            )
+
+        except CircuitOpenError as e:
+            return self._unavailable(e)
         except Exception as e:
-            print(f"Error processing refund: {str(e)}")
+            logger.exception('Error processing refund of payment %s', payment_id)
             return {
                 'success': False,
                 'message': str(e)
             }
 
 
+class SharedToken:
+    """One grant token for every worker thread, refreshed before it expires"""
+
+    def __init__(self, service):
+        self.service = service
+        self._lock = threading.Lock()
+
+    def ensure(self):
+        with self._lock:
+            if self.service.token_expired():
+                self.service.get_grant_token()
+        return self.service.token
+
+
 # Helper function for appointment payment
 def initiate_appointment_payment(appointment, callback_url=None):
     """
     Initiate bKash payment for an appointment
-    
+
     Args:
         appointment: Appointment model instance
         callback_url: Optional callback URL after payment
-    
+
     Returns:
         dict: Payment initiation response with redirect URL
     """
     bkash_service = BkashPaymentService()
-    
+    if callback_url:
+        bkash_service.callback_url = callback_url
+
     invoice_number = f"APT-{appointment.id}-{datetime.now().strftime('%Y%m%d%H%M%S')}"
     amount = float(appointment.amount)
-    
+
     result = bkash_service.create_payment(
         amount=amount,
         invoice_number=invoice_number
     )
-    
+
     return result
+
+
+async def ainitiate_appointment_payment(appointment, callback_url=None):
+    """Async version of ``initiate_appointment_payment``"""
+    bkash_service = BkashPaymentService()
+    if callback_url:
+        bkash_service.callback_url = callback_url
+
+    invoice_number = f"APT-{appointment.id}-{datetime.now().strftime('%Y%m%d%H%M%S')}"
+    amount = float(appointment.amount)
+
+    return await bkash_service.acreate_payment(
+        amount=amount,
+        invoice_number=invoice_number
+    )
@@ -0,0 +1,124 @@
+"""
+Versioned cache keys for the appointments app
+
+Cached values are keyed under a scope (one per doctor) that carries a
+generation number::
+
+    appt:doctor:7:g1700000000123:slots:2024-05-01
+
+Bumping the scope's generation is a single INCR; every key built before the
+bump is simply never read again and ages out of the cache, so a doctor's
+slots, pages and counters are invalidated together in O(1) however many
+entries they have.
+
+``get_or_set`` guards expensive recomputes against stampedes: one caller
+holds a short lock and recomputes while the others keep serving the expired
+value, or wait for the winner when there is none.
+"""
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+from . import replicas
+
+
+NAMESPACE = 'appt'
+
+# How long one caller may hold a recompute lock, and how long others wait on it
+LOCK_SECONDS = 10
+LOCK_POLL_SECONDS = 0.05
+
+# Expired entries are kept this long past their timeout to be served while
+# one caller recomputes them
+STALE_SECONDS = 60
+
+
+def doctor_scope(doctor):
+    """Scope of everything cached for a doctor (instance or id)"""
+    return f'doctor:{getattr(doctor, "pk", doctor)}'
+
+
+def _generation_key(scope):
+    return f'{NAMESPACE}:gen:{scope}'
+
+
+def generation(scope):
+    """
+    Current generation of ``scope``
+
+    A missing generation (never set, evicted or flushed) starts from the
+    clock in milliseconds, so it never repeats a generation used before.
+    """
+    key = _generation_key(scope)
+    value = cache.get(key)
+    if value is None:
+        cache.add(key, int(time.time() * 1000), timeout=None)
+        value = cache.get(key)
+    return value
+
+
+def bump(scope):
+    """Invalidate every key of ``scope`` by moving it to a new generation"""
+    try:
+        return cache.incr(_generation_key(scope))
+    except ValueError:
+        # No generation yet, so nothing of this scope is cached
+        return generation(scope)
+
+
+def invalidate_doctor(doctor):
+    """Bump a doctor's generation once the current transaction commits"""
+    scope = doctor_scope(doctor)
+    transaction.on_commit(lambda: bump(scope))
+
+
+def make_key(scope, *parts):
+    """Key for ``parts`` within the current generation of ``scope``"""
+    return ':'.join([NAMESPACE, scope, f'g{generation(scope)}', *map(str, parts)])
+
+
+def get_or_set(key, compute, timeout=None):
+    """
+    Cached result of ``compute()`` under ``key``
+
+    Entries are stored as ``(value, fresh_until)`` and outlive their timeout
+    by STALE_SECONDS. When an entry is missing or expired, the caller that
+    takes the key's lock recomputes it; meanwhile the others return the
+    expired value, or poll for the fresh one for up to LOCK_SECONDS and then
+    compute it themselves. Values are computed from the primary database,
+    also within ``replica_reads`` views.
+
+    Args:
+        key: Cache key, normally from ``make_key``
+        compute: Callable returning the value to cache
+        timeout: Seconds the value stays fresh (default APPOINTMENT_CACHE_TIMEOUT)
+    """
+    timeout = timeout or settings.APPOINTMENT_CACHE_TIMEOUT
+    entry = cache.get(key)
+    if entry is not None and entry[1] > time.time():
+        return entry[0]
+
+    lock_key = f'{key}:lock'
+    deadline = time.monotonic() + LOCK_SECONDS
+    locked = cache.add(lock_key, 1, timeout=LOCK_SECONDS)
+    while not locked:
+        if entry is not None:
+            return entry[0]
+        if time.monotonic() >= deadline:
+            break
+        time.sleep(LOCK_POLL_SECONDS)
+        entry = cache.get(key)
+        if entry is None:
+            locked = cache.add(lock_key, 1, timeout=LOCK_SECONDS)
+
+    try:
+        # From the primary: a lagging replica's rows would stay cached for the whole timeout
+        with replicas.primary():
+            value = compute()
+        cache.set(key, (value, time.time() + timeout), timeout=timeout + STALE_SECONDS)
+    finally:
+        if locked:
+            cache.delete(lock_key)
+    return value
@@ -0,0 +1,233 @@
+"""
+Circuit breakers for outbound calls to Zoom and bKash
+
+A breaker counts calls, failures (connection errors, timeouts, HTTP 5xx and
+429) and slow calls over a rolling window of cache buckets. Once at least
+CIRCUIT_MINIMUM_CALLS were made and the failure or slow-call rate crosses its
+threshold, the breaker opens. Calls then raise CircuitOpenError at once, and
+the services drop to their fallback (manual Zoom entry, "payment temporarily
+unavailable") instead of waiting on a dead gateway.
+
+After CIRCUIT_OPEN_SECONDS one caller is let through as a probe
+(half-open). A fast success closes the breaker, anything else reopens it.
+
+State and counters live in the default cache, so every worker sharing the
+cache sees the same breaker. With the local-memory cache each process keeps
+its own.
+"""
+import logging
+import time
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+
+from . import metrics
+
+
+logger = logging.getLogger(__name__)
+
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+# The rolling window is split into this many cache buckets
+WINDOW_BUCKETS = 6
+
+BREAKERS = {}
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling a service whose breaker is open"""
+
+
+class CircuitBreaker:
+    """
+    Guards calls to one external service
+
+    Args:
+        name: Cache key prefix and metrics label
+        unavailable_message: Message of the CircuitOpenError raised while open
+    """
+
+    def __init__(self, name, unavailable_message, window_seconds=None, minimum_calls=None,
+                 failure_rate=None, slow_call_seconds=None, slow_call_rate=None, open_seconds=None):
+        self.name = name
+        self.unavailable_message = unavailable_message
+        self.window_seconds = window_seconds or settings.CIRCUIT_WINDOW_SECONDS
+        self.minimum_calls = minimum_calls or settings.CIRCUIT_MINIMUM_CALLS
+        self.failure_rate = failure_rate or settings.CIRCUIT_FAILURE_RATE
+        self.slow_call_seconds = slow_call_seconds or settings.CIRCUIT_SLOW_CALL_SECONDS
+        self.slow_call_rate = slow_call_rate or settings.CIRCUIT_SLOW_CALL_RATE
+        self.open_seconds = open_seconds or settings.CIRCUIT_OPEN_SECONDS
+        self.bucket_seconds = max(1, self.window_seconds // WINDOW_BUCKETS)
+        self.bucket_ttl = self.window_seconds + self.bucket_seconds
+        self.key = f'circuit:{name}'
+        BREAKERS[name] = self
+
+    def call(self, func, *args, **kwargs):
+        """
+        Make an HTTP request through the breaker
+
+        Args:
+            func: Request function returning a response with ``status_code``
+                (``requests.post``, ``httpx.Client.get`` ...)
+
+        Returns:
+            The response, also for 5xx/429 (recorded as failures)
+
+        Raises:
+            CircuitOpenError: If the breaker is open
+        """
+        probe = self._acquire()
+        started = time.monotonic()
+        try:
+            response = func(*args, **kwargs)
+        except Exception:
+            self._record(True, time.monotonic() - started, probe, 'exception')
+            raise
+        failed = self.is_failure(response)
+        self._record(failed, time.monotonic() - started, probe, response.status_code if failed else None)
+        return response
+
+    async def acall(self, func, *args, **kwargs):
+        """
+        Async version of ``call`` for coroutine request functions
+
+        The breaker's cache reads and writes run in a worker thread, so they
+        don't block the event loop.
+        """
+        probe = await sync_to_async(self._acquire)()
+        started = time.monotonic()
+        try:
+            response = await func(*args, **kwargs)
+        except Exception:
+            await sync_to_async(self._record)(True, time.monotonic() - started, probe, 'exception')
+            raise
+        failed = self.is_failure(response)
+        await sync_to_async(self._record)(
+            failed, time.monotonic() - started, probe, response.status_code if failed else None
+        )
+        return response
+
+    @staticmethod
+    def is_failure(response):
+        return response.status_code >= 500 or response.status_code == 429
+
+    def state(self):
+        open_until = cache.get(self.key)
+        if open_until is None:
+            return CLOSED
+        return OPEN if time.time() < open_until else HALF_OPEN
+
+    def stats(self):
+        """Current state, window counts and lifetime counters, for metrics"""
+        calls, failures, slow = self._window()
+        counters = cache.get_many([
+            f'{self.key}:rejected',
+            *(f'{self.key}:transitions:{state}' for state in (OPEN, HALF_OPEN, CLOSED)),
+        ])
+        return {
+            'name': self.name,
+            'state': self.state(),
+            'window_calls': calls,
+            'window_failures': failures,
+            'window_slow_calls': slow,
+            'rejected': counters.get(f'{self.key}:rejected', 0),
+            'transitions': {
+                state: counters.get(f'{self.key}:transitions:{state}', 0)
+                for state in (OPEN, HALF_OPEN, CLOSED)
+            },
+        }
+
+    def reset(self):
+        """Close the breaker and forget the current window"""
+        cache.delete_many([self.key, f'{self.key}:probe', *self._window_keys()])
+
+    def _acquire(self):
+        """
+        Returns:
+            bool: True if this call is the half-open probe
+
+        Raises:
+            CircuitOpenError: If the breaker is open
+        """
+        open_until = cache.get(self.key)
+        if open_until is None:
+            return False
+        # Past open_until exactly one caller wins the probe slot; the slot
+        # expires in case that caller dies before recording its outcome
+        if time.time() >= open_until and cache.add(f'{self.key}:probe', 1, timeout=self.open_seconds):
+            self._transition(HALF_OPEN)
+            return True
+        self._incr(f'{self.key}:rejected', None)
+        raise CircuitOpenError(self.unavailable_message)
+
+    def _record(self, failed, duration, probe, error=None):
+        metrics.observe_gateway_call(self.name, duration, error)
+        slow = duration >= self.slow_call_seconds
+        if probe:
+            cache.delete(f'{self.key}:probe')
+            if failed or slow:
+                self._open(reopen=True)
+            else:
+                self.reset()
+                self._transition(CLOSED)
+            return
+
+        bucket = int(time.time() // self.bucket_seconds)
+        self._incr(f'{self.key}:calls:{bucket}', self.bucket_ttl)
+        if failed:
+            self._incr(f'{self.key}:failures:{bucket}', self.bucket_ttl)
+        if slow:
+            self._incr(f'{self.key}:slow:{bucket}', self.bucket_ttl)
+        if not (failed or slow):
+            return
+
+        calls, failures, slow_calls = self._window(bucket)
+        if calls >= self.minimum_calls and (
+            failures / calls >= self.failure_rate or slow_calls / calls >= self.slow_call_rate
+        ):
+            self._open()
+
+    def _open(self, reopen=False):
+        open_until = time.time() + self.open_seconds
+        if reopen:
+            cache.set(self.key, open_until, timeout=None)
+        elif not cache.add(self.key, open_until, timeout=None):
+            return  # Another worker opened it first
+        self._transition(OPEN)
+
+    def _transition(self, state):
+        self._incr(f'{self.key}:transitions:{state}', None)
+        log = logger.info if state == CLOSED else logger.warning
+        log("Circuit breaker '%s' is now %s", self.name, state, extra={'breaker': self.name, 'state': state})
+
+    def _window_keys(self, bucket=None):
+        bucket = bucket if bucket is not None else int(time.time() // self.bucket_seconds)
+        return [
+            f'{self.key}:{kind}:{b}'
+            for b in range(bucket - WINDOW_BUCKETS + 1, bucket + 1)
+            for kind in ('calls', 'failures', 'slow')
+        ]
+
+    def _window(self, bucket=None):
+        """``(calls, failures, slow_calls)`` over the rolling window"""
+        counts = cache.get_many(self._window_keys(bucket))
+        totals = {'calls': 0, 'failures': 0, 'slow': 0}
+        for key, value in counts.items():
+            totals[key.split(':')[2]] += value
+        return totals['calls'], totals['failures'], totals['slow']
+
+    def _incr(self, key, timeout):
+        """Increment a counter, creating it with ``timeout`` if needed"""
+        try:
+            cache.incr(key)
+        except ValueError:
+            if not cache.add(key, 1, timeout=timeout):
+                cache.incr(key)
+
+
+zoom_breaker = CircuitBreaker('zoom', 'Zoom is temporarily unavailable')
+bkash_breaker = CircuitBreaker('bkash', 'Payment is temporarily unavailable. Please try again in a few minutes.')
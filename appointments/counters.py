@@ -0,0 +1,161 @@
+"""
+Incrementally maintained appointment counters
+
+Every appointment contributes 1 to four counter rows:
+
+* ``AppointmentCounter`` (doctor, date, status): a day's counts
+* ``HourlyAppointmentCounter`` (doctor, date, hour, status): the hourly
+  load, for capacity checks and today's hourly stats
+* ``AppointmentTotal`` (doctor, status) and the overall ``AppointmentTotal``
+  of its status: all-time totals
+
+Signal handlers and the transition helpers keep the rows current with
+atomic F() increments, so dashboards and the home page read a handful of
+counter rows instead of counting the Appointment table, however long its
+history.
+"""
+from collections import Counter
+from datetime import datetime
+
+from django.db import IntegrityError, transaction
+from django.db.models import F, Sum
+
+from .models import Appointment, AppointmentCounter, AppointmentTotal, HourlyAppointmentCounter
+
+
+BOOKED_STATUSES = ['pending', 'confirmed']
+
+# Booked appointments a doctor takes per hour
+HOURLY_CAPACITY = 20
+
+
+def counter_key(doctor_id, appointment_date, appointment_time, status):
+    """
+    Build the counter key for an appointment's state
+
+    Returns:
+        tuple: ``(doctor_id, date, hour, status)`` or None when incomplete
+    """
+    if not (doctor_id and appointment_date and appointment_time and status):
+        return None
+    if isinstance(appointment_date, str):
+        appointment_date = datetime.strptime(appointment_date, '%Y-%m-%d').date()
+    if isinstance(appointment_time, str):
+        hour = int(appointment_time.split(':')[0])
+    else:
+        hour = appointment_time.hour
+    return (doctor_id, appointment_date, hour, status)
+
+
+def _rows(key):
+    """``(model, lookup)`` of each counter row an appointment in state ``key`` counts in"""
+    doctor_id, day, hour, status = key
+    return [
+        (HourlyAppointmentCounter, (('date', day), ('doctor_id', doctor_id), ('hour', hour), ('status', status))),
+        (AppointmentCounter, (('date', day), ('doctor_id', doctor_id), ('status', status))),
+        (AppointmentTotal, (('doctor_id', doctor_id), ('status', status))),
+        (AppointmentTotal, (('doctor_id', None), ('status', status))),
+    ]
+
+
+def _add(model, lookup, delta):
+    """Atomically add ``delta`` to the ``model`` row matching ``lookup``"""
+    counters = model.objects.filter(**lookup)
+    if counters.update(count=F('count') + delta) or delta < 0:
+        # A missing row cannot be decremented; reconciliation repairs any drift
+        return
+    try:
+        with transaction.atomic():
+            model.objects.create(count=delta, **lookup)
+    except IntegrityError:
+        # Another worker created the row first
+        counters.update(count=F('count') + delta)
+
+
+def apply_deltas(deltas):
+    """
+    Apply a mapping of counter key -> delta
+
+    Deltas are summed per counter row first, so a change that stays within
+    a day (or a bulk change of many appointments) writes each row once.
+    """
+    rows = Counter()
+    for key, delta in deltas.items():
+        if key is not None and delta:
+            for model, lookup in _rows(key):
+                rows[(model, lookup)] += delta
+    # A fixed order, so concurrent transactions lock rows in the same order
+    for (model, lookup), delta in sorted(rows.items(), key=lambda item: (item[0][0].__name__, str(item[0][1]))):
+        if delta:
+            _add(model, dict(lookup), delta)
+
+
+def adjust(key, delta):
+    """Atomically add ``delta`` to the counter rows of ``key``"""
+    apply_deltas({key: delta})
+
+
+def record_change(old_key, new_key):
+    """Move one appointment from ``old_key`` to ``new_key``"""
+    if old_key == new_key:
+        return
+    deltas = Counter()
+    deltas[old_key] -= 1
+    deltas[new_key] += 1
+    apply_deltas(deltas)
+
+
+def compute_counts(queryset=None):
+    """
+    Count appointments per counter key straight from the Appointment table
+
+    Returns:
+        Counter: counter key -> count
+    """
+    queryset = Appointment.objects.all() if queryset is None else queryset
+    counts = Counter()
+    rows = queryset.values_list('doctor_id', 'appointment_date', 'appointment_time', 'status').order_by()
+    for doctor_id, day, time, status in rows.iterator(chunk_size=5000):
+        counts[counter_key(doctor_id, day, time, status)] += 1
+    return counts
+
+
+def status_counts(doctor=None, date=None):
+    """
+    Get appointment counts by status
+
+    Without a date these are the all-time totals, one row per status.
+
+    Args:
+        doctor: Optional Doctor instance or id to restrict to
+        date: Optional date to restrict to
+
+    Returns:
+        dict: status -> count (missing statuses are 0)
+    """
+    if date is None:
+        # doctor=None selects the overall rows
+        counters = AppointmentTotal.objects.filter(doctor=doctor)
+    else:
+        counters = AppointmentCounter.objects.filter(date=date)
+        if doctor is not None:
+            counters = counters.filter(doctor=doctor)
+    totals = {status: 0 for status, _ in Appointment.STATUS_CHOICES}
+    for row in counters.values('status').annotate(total=Sum('count')).order_by():
+        totals[row['status']] = row['total'] or 0
+    return totals
+
+
+def hourly_counts(doctor, date, statuses=None):
+    """
+    Get a doctor's appointment counts per hour for one day
+
+    Returns:
+        dict: hour -> count
+    """
+    counters = HourlyAppointmentCounter.objects.filter(doctor=doctor, date=date)
+    counters = counters.filter(status__in=statuses or BOOKED_STATUSES)
+    hours = {}
+    for row in counters.values('hour').annotate(total=Sum('count')).order_by():
+        hours[row['hour']] = row['total'] or 0
+    return hours
@@ -0,0 +1,154 @@
+"""
+In-process publish/subscribe for live dashboard updates
+
+Signal handlers publish small JSON events to a topic (``doctor:<id>``)
+once the surrounding transaction commits; the server-sent events view in
+``views.doctor_events`` subscribes to its doctor's topic and streams them.
+
+Publishers run in ordinary sync code and subscribers are asyncio tasks, so
+events are handed to each subscriber's event loop with
+``call_soon_threadsafe``. Each topic keeps a short history so a browser
+that reconnects with ``Last-Event-ID`` gets the events it missed.
+
+The broker lives in one process: events published in one worker process
+never reach subscribers in another. Run the ASGI server with a single
+worker process for live appointment and payment events. With more workers
+the dashboard's totals still catch up, as the stream re-sends them from the
+shared counters on every heartbeat, but individual events are missed.
+"""
+import asyncio
+import itertools
+import json
+import threading
+import uuid
+from collections import defaultdict, deque
+
+
+class Event:
+    def __init__(self, event_id, event_type, data, boot):
+        self.id = event_id
+        self.type = event_type
+        self.data = data
+        self.boot = boot
+
+    def encode(self):
+        """Format the event for a ``text/event-stream`` response"""
+        payload = json.dumps(self.data, separators=(',', ':'))
+        return f'id: {self.boot}-{self.id}\nevent: {self.type}\ndata: {payload}\n\n'
+
+
+class Subscription:
+    """A subscriber's queue, bound to the event loop that reads it"""
+
+    def __init__(self, topic, maxsize=100):
+        self.topic = topic
+        self.loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue(maxsize=maxsize)
+        # Set when events were lost; the client must reload instead of patching
+        self.overflowed = False
+
+    def _put(self, event):
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            self.overflowed = True
+
+    def deliver(self, event):
+        try:
+            self.loop.call_soon_threadsafe(self._put, event)
+        except RuntimeError:
+            # The subscriber's loop has closed; it is about to unsubscribe
+            pass
+
+    async def get(self, timeout):
+        """Wait up to ``timeout`` seconds for the next event; None on timeout"""
+        try:
+            return await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+    def get_nowait(self):
+        try:
+            return self.queue.get_nowait()
+        except asyncio.QueueEmpty:
+            return None
+
+
+class Broker:
+    def __init__(self, history=100):
+        self._lock = threading.Lock()
+        self._ids = itertools.count(1)
+        # Event ids restart with the process; the boot token tells a
+        # reconnecting client's Last-Event-ID from a previous process apart
+        self.boot = uuid.uuid4().hex[:8]
+        self._subscribers = defaultdict(set)
+        self._history = defaultdict(lambda: deque(maxlen=history))
+        # Per topic, the id of the newest event dropped from the history
+        self._evicted = {}
+
+    def publish(self, topic, event_type, data):
+        with self._lock:
+            event = Event(next(self._ids), event_type, data, self.boot)
+            history = self._history[topic]
+            if len(history) == history.maxlen:
+                self._evicted[topic] = history[0].id
+            history.append(event)
+            subscribers = list(self._subscribers.get(topic, ()))
+        for subscription in subscribers:
+            subscription.deliver(event)
+        return event
+
+    def parse_event_id(self, value):
+        """
+        Turn a ``Last-Event-ID`` header into an event id of this process
+
+        Returns:
+            int: The id, 0 for an id from another process (replay is
+            impossible), or None when there is no usable header
+        """
+        boot, _, number = (value or '').partition('-')
+        if not number.isdigit():
+            return None
+        return int(number) if boot == self.boot else 0
+
+    def subscribe(self, topic, last_event_id=None):
+        """
+        Subscribe from inside a running event loop
+
+        With ``last_event_id``, events published after it are queued first.
+        If some of them are no longer in the history the subscription is
+        marked overflowed so the client resynchronises.
+
+        Returns:
+            Subscription
+        """
+        subscription = Subscription(topic)
+        with self._lock:
+            self._subscribers[topic].add(subscription)
+            if last_event_id is not None:
+                if last_event_id == 0 or last_event_id < self._evicted.get(topic, 0):
+                    subscription.overflowed = True
+                else:
+                    for event in self._history.get(topic, ()):
+                        if event.id > last_event_id:
+                            subscription._put(event)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            subscribers = self._subscribers.get(subscription.topic)
+            if subscribers is not None:
+                subscribers.discard(subscription)
+                if not subscribers:
+                    del self._subscribers[subscription.topic]
+
+    def subscriber_count(self, topic):
+        with self._lock:
+            return len(self._subscribers.get(topic, ()))
+
+
+broker = Broker()
+
+
+def doctor_topic(doctor_id):
+    return f'doctor:{doctor_id}'
@@ -2,6 +2,8 @@ from django import forms
 from django.contrib.auth.forms import UserCreationForm
 from django.contrib.auth.models import User
 from .models import Patient, Appointment, Doctor, TimeSlot
+from .counters import HOURLY_CAPACITY
+from . import metrics
 from datetime import datetime, timedelta
 
 
@@ -169,10 +171,11 @@ class AppointmentForm(forms.ModelForm):
             if self.instance.pk:
                 hourly_appointments = hourly_appointments.exclude(pk=self.instance.pk)
             
-            if hourly_appointments.count() >= 20:
+            if hourly_appointments.count() >= HOURLY_CAPACITY:
+                metrics.HOURLY_LIMIT_REJECTIONS.labels('booking').inc()
                 raise forms.ValidationError(
                     f"⚠️ ডাক্তার {doctor.name} এর {hour_start.strftime('%I:%M %p')} - {hour_end.strftime('%I:%M %p')} "
-                    f"এর মধ্যে ইতিমধ্যে 20টি appointment বুক হয়ে গেছে। "
+                    f"এর মধ্যে ইতিমধ্যে {HOURLY_CAPACITY}টি appointment বুক হয়ে গেছে। "
                     f"অন্য সময় বেছে নিন বা পরবর্তী ঘণ্টার জন্য চেষ্টা করুন।"
                 )
         
@@ -219,6 +222,22 @@ class PatientProfileForm(forms.ModelForm):
         return patient
 
 
+class RescheduleForm(forms.Form):
+    """Form for moving an appointment to another date and time"""
+    appointment_date = forms.DateField(
+        widget=forms.DateInput(attrs={'class': 'form-control', 'type': 'date', 'min': datetime.now().strftime('%Y-%m-%d')})
+    )
+    appointment_time = forms.TimeField(widget=forms.TimeInput(attrs={'class': 'form-control', 'type': 'time'}))
+
+    def clean_appointment_date(self):
+        appointment_date = self.cleaned_data.get('appointment_date')
+        if appointment_date < datetime.now().date():
+            raise forms.ValidationError("Appointment date cannot be in the past.")
+        if appointment_date > datetime.now().date() + timedelta(days=30):
+            raise forms.ValidationError("Appointments can only be booked up to 30 days in advance.")
+        return appointment_date
+
+
 class TimeSlotForm(forms.ModelForm):
     """Form for creating/editing doctor time slots"""
     class Meta:
@@ -0,0 +1,22 @@
+"""
+Shared setup for outgoing HTTP calls to the Zoom and bKash APIs
+"""
+from functools import lru_cache
+
+import httpx
+
+
+@lru_cache(maxsize=None)
+def ssl_context():
+    """
+    TLS context for outgoing API calls
+
+    httpx loads the CA bundle for every client it creates, which blocks the
+    event loop for ~30 ms; sharing one context makes new clients cheap.
+    """
+    return httpx.create_ssl_context()
+
+
+def async_client(timeout):
+    """A new ``httpx.AsyncClient`` on the shared TLS context"""
+    return httpx.AsyncClient(timeout=timeout, verify=ssl_context())
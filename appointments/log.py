@@ -0,0 +1,161 @@
+"""
+Structured JSON logging off the request thread
+
+``QueueLogHandler`` only puts records on an in-memory queue; a background
+``QueueListener`` thread formats them as one JSON object per line and
+writes them to stderr, so a slow terminal or log collector never holds up a
+request. When the queue is full, records are dropped and counted rather
+than blocking.
+
+``RequestLogMiddleware`` gives every request an ID (the incoming
+X-Request-ID header, or a new one), echoes it in the response and logs one
+line per request with its view name and duration. Every record logged
+while the request is handled carries ``request_id`` and ``view``, including
+those from async views' worker threads.
+"""
+import copy
+import json
+import logging
+import queue
+import time
+import uuid
+from contextvars import ContextVar
+from logging.handlers import QueueHandler, QueueListener
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+
+
+logger = logging.getLogger('appointments.requests')
+
+# The request being handled; sync_to_async copies the context, so async
+# views' worker threads see it too
+current_request = ContextVar('current_request', default=None)
+
+# Attributes every LogRecord has; anything else was passed with ``extra``
+RECORD_ATTRIBUTES = set(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime'}
+
+
+def request_fields(request):
+    """``request_id`` and, once the URL was resolved, ``view`` of a request"""
+    fields = {'request_id': request.id}
+    match = getattr(request, 'resolver_match', None)
+    if match is not None:
+        fields['view'] = match.view_name
+    return fields
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per record, including fields passed with ``extra``"""
+
+    def format(self, record):
+        entry = {
+            'time': self.formatTime(record, '%Y-%m-%dT%H:%M:%S') + f'.{int(record.msecs):03d}',
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in RECORD_ATTRIBUTES and not key.startswith('_'):
+                entry[key] = value
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry['exception'] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class QueueLogHandler(QueueHandler):
+    """
+    Queue records for a background thread that writes them as JSON to stderr
+
+    Args:
+        queue_size: Records held before new ones are dropped
+    """
+
+    def __init__(self, queue_size=10000):
+        super().__init__(queue.Queue(queue_size))
+        self.dropped = 0
+        target = logging.StreamHandler()
+        target.setFormatter(JsonFormatter())
+        self.listener = QueueListener(self.queue, target)
+        self.listener.start()
+
+    def prepare(self, record):
+        """Resolve the message, traceback and request context in the calling thread"""
+        record = copy.copy(record)
+        record.msg, record.args = record.getMessage(), None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        request = current_request.get()
+        if request is not None:
+            for key, value in request_fields(request).items():
+                record.__dict__.setdefault(key, value)
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+    def close(self):
+        """Write out the queued records and stop the writer thread (on logging.shutdown)"""
+        listener, self.listener = self.listener, None
+        if listener is not None:
+            try:
+                listener.stop()
+            except queue.Full:
+                pass  # The writer is stuck; its daemon thread ends with the process
+        super().close()
+
+
+class RequestLogMiddleware:
+    """Tag log records with a request ID and view name, and log each request"""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        token, started = self.start(request)
+        try:
+            response = self.get_response(request)
+        finally:
+            current_request.reset(token)
+        return self.finish(request, response, started)
+
+    async def __acall__(self, request):
+        token, started = self.start(request)
+        try:
+            response = await self.get_response(request)
+        finally:
+            current_request.reset(token)
+        return self.finish(request, response, started)
+
+    @staticmethod
+    def start(request):
+        request.id = request.headers.get('X-Request-ID', '')[:64] or uuid.uuid4().hex
+        return current_request.set(request), time.perf_counter()
+
+    @staticmethod
+    def finish(request, response, started):
+        response['X-Request-ID'] = request.id
+        logger.info(
+            '%s %s %s', request.method, request.path, response.status_code,
+            extra={
+                **request_fields(request),
+                'method': request.method,
+                'path': request.path,
+                'status': response.status_code,
+                'duration_ms': round((time.perf_counter() - started) * 1000, 1),
+            },
+        )
+        return response
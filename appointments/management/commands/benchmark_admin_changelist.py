@@ -0,0 +1,122 @@
+"""
+Management command to benchmark admin changelist rendering over large tables
+"""
+import statistics
+import time
+from datetime import time as dt_time, timedelta
+
+from django.contrib import admin
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.core.paginator import Paginator
+from django.db import connection, transaction
+from django.test import RequestFactory
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from appointments.models import Appointment, Doctor, Patient, Payment
+
+
+# The changelist options this project used before the admin was tuned
+LEGACY_OPTIONS = {
+    'list_select_related': False,
+    'paginator': Paginator,
+    'show_full_result_count': True,
+    'date_hierarchy': None,
+}
+
+
+class Command(BaseCommand):
+    help = 'Benchmark AppointmentAdmin and PaymentAdmin changelist render time (seeded data is rolled back)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=50000, help='Appointments (and payments) to seed (default: 50000)')
+        parser.add_argument('--runs', type=int, default=5, help='Timed renders per scenario (default: 5)')
+
+    def handle(self, *args, **options):
+        factory = RequestFactory()
+        with transaction.atomic():
+            self.stdout.write(f'Seeding {options["rows"]} appointments and payments...')
+            superuser, sample = self.seed(options['rows'])
+
+            scenarios = [
+                ('appointments: first page', Appointment, {}),
+                ('appointments: search', Appointment, {'q': sample.patient.user.first_name}),
+                ('appointments: date drilldown', Appointment, {
+                    'appointment_date__year': sample.appointment_date.year,
+                    'appointment_date__month': sample.appointment_date.month,
+                }),
+                ('payments: first page', Payment, {}),
+            ]
+
+            header = f'{"Scenario":<32}{"Config":<10}{"Queries":>9}{"Median ms":>12}'
+            self.stdout.write('\n' + header)
+            self.stdout.write('-' * len(header))
+            for label, model, params in scenarios:
+                model_admin = admin.site._registry[model]
+                for config in ('legacy', 'tuned'):
+                    saved = {name: getattr(model_admin, name) for name in LEGACY_OPTIONS}
+                    if config == 'legacy':
+                        for name, value in LEGACY_OPTIONS.items():
+                            setattr(model_admin, name, value)
+                    try:
+                        queries, median = self.measure(factory, model_admin, superuser, params, options['runs'])
+                    finally:
+                        for name, value in saved.items():
+                            setattr(model_admin, name, value)
+                    self.stdout.write(f'{label:<32}{config:<10}{queries:>9}{median:>12.1f}')
+
+            transaction.set_rollback(True)
+
+        self.stdout.write(self.style.SUCCESS('\n✓ Benchmark finished (seeded data rolled back)'))
+
+    def measure(self, factory, model_admin, user, params, runs):
+        """Render the changelist ``runs`` times; return query count and median time"""
+        timings = []
+        for _ in range(runs):
+            request = factory.get('/admin/', params)
+            request.user = user
+            with CaptureQueriesContext(connection) as queries:
+                began = time.perf_counter()
+                response = model_admin.changelist_view(request)
+                response.render()
+                timings.append((time.perf_counter() - began) * 1000)
+        return len(queries), statistics.median(timings)
+
+    def seed(self, rows):
+        """Create a superuser plus patients, doctors, appointments and payments"""
+        stamp = int(time.time())
+        superuser = User.objects.create_superuser(f'bench_admin_{stamp}', f'admin{stamp}@example.com', None)
+        users = User.objects.bulk_create([
+            User(username=f'bench_patient_{stamp}_{i}', first_name=f'Patient{i}', last_name='Bench')
+            for i in range(200)
+        ])
+        patients = Patient.objects.bulk_create([Patient(user=user, phone='') for user in users])
+        doctors = Doctor.objects.bulk_create([
+            Doctor(name=f'Bench Doctor {i}', specialization='Benchmark',
+                   email=f'bench{i}.{stamp}@example.com', phone='')
+            for i in range(50)
+        ])
+
+        today = timezone.localdate()
+        appointments = Appointment.objects.bulk_create([
+            Appointment(
+                patient=patients[i % len(patients)],
+                doctor=doctors[i % len(doctors)],
+                appointment_date=today - timedelta(days=i % 1000),
+                appointment_time=dt_time(8 + i % 12),
+                reason='benchmark',
+                status=('pending', 'confirmed', 'completed', 'cancelled')[i % 4],
+                amount=500,
+            )
+            for i in range(rows)
+        ], batch_size=5000)
+        Payment.objects.bulk_create([
+            Payment(appointment=appointment, amount=500, status='completed',
+                    transaction_id=f'BENCH{stamp}{appointment.pk}')
+            for appointment in appointments
+        ], batch_size=5000)
+
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+        return superuser, Appointment.objects.select_related('patient__user').get(pk=appointments[0].pk)
@@ -0,0 +1,195 @@
+"""
+Management command to compare WSGI and ASGI concurrency on the payment
+callback while the fake gateway (see ``fake_gateway_server``) adds latency
+
+Each callback runs the real integration path: bKash grant and execute,
+then Zoom token and meeting creation, i.e. four gateway round trips.
+"""
+import asyncio
+import os
+import shutil
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import date, time as dt_time, timedelta
+
+import httpx
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+
+from appointments.models import Appointment, Doctor, Patient, Payment
+
+from .fake_gateway_server import FakeGatewayServer
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+class Command(BaseCommand):
+    help = 'Benchmark the payment callback under gunicorn (WSGI) and uvicorn (ASGI) with a slow simulated gateway'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=200, help='Callbacks per server (default: 200)')
+        parser.add_argument('--concurrency', type=int, default=50, help='Concurrent clients (default: 50)')
+        parser.add_argument('--latency-ms', type=int, default=200,
+                            help='Simulated gateway latency per API call (default: 200)')
+        parser.add_argument('--wsgi-workers', type=int, default=4, help='gunicorn sync workers (default: 4)')
+        parser.add_argument('--prepare', action='store_true', help='Internal: migrate and seed DATABASE_URL')
+
+    def handle(self, *args, **options):
+        if options['prepare']:
+            call_command('migrate', verbosity=0)
+            self.seed(options['requests'])
+            return
+
+        workdir = tempfile.mkdtemp(prefix='bench_asgi_')
+        gateway = FakeGatewayServer(('127.0.0.1', 0), latency=options['latency_ms'] / 1000)
+        threading.Thread(target=gateway.serve_forever, daemon=True).start()
+        gateway_url = gateway.url
+
+        try:
+            seeded = os.path.join(workdir, 'seed.sqlite3')
+            self.stdout.write('Seeding benchmark database...')
+            subprocess.run(
+                [sys.executable, 'manage.py', 'benchmark_asgi_wsgi', '--prepare',
+                 '--requests', str(options['requests'])],
+                cwd=settings.BASE_DIR, env=self.server_env(seeded, gateway_url), check=True,
+            )
+
+            results = {}
+            for mode in ('wsgi', 'asgi'):
+                database = os.path.join(workdir, f'{mode}.sqlite3')
+                shutil.copy(seeded, database)
+                for n in range(options['requests']):
+                    gateway.add_payment(f'BENCH_{n}', amount=500)
+                self.stdout.write(f'Running {mode.upper()} server...')
+                results[mode] = self.run_server(mode, database, gateway_url, workdir, options)
+        finally:
+            gateway.shutdown()
+            gateway.server_close()
+            shutil.rmtree(workdir, ignore_errors=True)
+
+        self.stdout.write(f'\nRequests: {options["requests"]}  concurrency: {options["concurrency"]}  '
+                          f'gateway latency: {options["latency_ms"]} ms per call')
+        for mode, label in (('wsgi', f'WSGI (gunicorn, {options["wsgi_workers"]} sync workers)'),
+                            ('asgi', 'ASGI (uvicorn, 1 worker)')):
+            result = results[mode]
+            self.stdout.write(
+                f'{label:<36} {result["throughput"]:7.1f} req/s  '
+                f'p50: {result["p50"]:7.0f} ms  p95: {result["p95"]:7.0f} ms  errors: {result["errors"]}'
+            )
+
+        speedup = results['asgi']['throughput'] / results['wsgi']['throughput']
+        style = self.style.SUCCESS if speedup > 1 else self.style.WARNING
+        self.stdout.write(style(f'✓ ASGI throughput is {speedup:.1f}x WSGI'))
+
+    def server_env(self, database, gateway_url):
+        env = dict(os.environ)
+        env.update({
+            'DATABASE_URL': f'sqlite:///{database}',
+            'ZOOM_ACCOUNT_ID': 'bench',
+            'ZOOM_CLIENT_ID': 'bench',
+            'ZOOM_CLIENT_SECRET': 'bench',
+            'ZOOM_BASE_URL': f'{gateway_url}/zoom/v2',
+            'ZOOM_TOKEN_URL': f'{gateway_url}/zoom/oauth/token',
+            'BKASH_APP_KEY': 'bench',
+            'BKASH_APP_SECRET': 'bench',
+            'BKASH_USERNAME': 'bench',
+            'BKASH_PASSWORD': 'bench',
+            'BKASH_BASE_URL': f'{gateway_url}/bkash',
+            'BKASH_TEST_MODE': 'False',
+        })
+        return env
+
+    def run_server(self, mode, database, gateway_url, workdir, options):
+        """Start one server on a free port, drive the load against it and stop it"""
+        port = free_port()
+        if mode == 'wsgi':
+            command = [sys.executable, '-m', 'gunicorn', 'appointment_system.wsgi:application',
+                       '--workers', str(options['wsgi_workers']), '--bind', f'127.0.0.1:{port}',
+                       '--log-level', 'warning']
+        else:
+            command = [sys.executable, '-m', 'uvicorn', 'appointment_system.asgi:application',
+                       '--port', str(port), '--workers', '1', '--log-level', 'warning']
+
+        log_path = os.path.join(workdir, f'{mode}.log')
+        with open(log_path, 'w') as log:
+            server = subprocess.Popen(
+                command, cwd=settings.BASE_DIR, env=self.server_env(database, gateway_url),
+                stdout=subprocess.DEVNULL, stderr=log,
+            )
+            try:
+                base_url = f'http://127.0.0.1:{port}'
+                self.wait_until_up(server, base_url, log_path)
+                return asyncio.run(self.drive(base_url, options['requests'], options['concurrency']))
+            finally:
+                server.terminate()
+                server.wait(timeout=30)
+
+    def wait_until_up(self, server, base_url, log_path, timeout=30):
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if server.poll() is not None:
+                with open(log_path) as log:
+                    raise CommandError(f'Server exited during startup:\n{log.read()}')
+            try:
+                httpx.get(f'{base_url}/', timeout=1)
+                return
+            except httpx.TransportError:
+                time.sleep(0.2)
+        raise CommandError(f'Server did not start within {timeout} s')
+
+    async def drive(self, base_url, total, concurrency):
+        """Send ``total`` success callbacks, ``concurrency`` at a time"""
+        semaphore = asyncio.Semaphore(concurrency)
+        timings = []
+        errors = 0
+
+        async def callback(client, n):
+            nonlocal errors
+            async with semaphore:
+                began = time.perf_counter()
+                response = await client.get('/payment/callback/', params={'paymentID': f'BENCH_{n}', 'status': 'success'})
+                timings.append((time.perf_counter() - began) * 1000)
+                if response.status_code != 302 or '/payment/success/' not in response.headers.get('Location', ''):
+                    errors += 1
+
+        limits = httpx.Limits(max_connections=concurrency)
+        async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=120) as client:
+            began = time.perf_counter()
+            await asyncio.gather(*(callback(client, n) for n in range(total)))
+            elapsed = time.perf_counter() - began
+
+        timings.sort()
+        return {
+            'throughput': total / elapsed,
+            'p50': statistics.median(timings),
+            'p95': timings[min(len(timings) - 1, int(len(timings) * 0.95))],
+            'errors': errors,
+        }
+
+    def seed(self, total):
+        """One pending appointment with a pending bKash payment per callback"""
+        user = User.objects.create_user(username='bench_patient', password=None, first_name='Bench')
+        patient = Patient.objects.create(user=user, phone='')
+        doctor = Doctor.objects.create(name='Bench Doctor', specialization='Benchmark',
+                                       email='bench@example.com', phone='')
+        start = date.today() + timedelta(days=1)
+        appointments = Appointment.objects.bulk_create([
+            Appointment(patient=patient, doctor=doctor, appointment_date=start + timedelta(days=n // 8),
+                        appointment_time=dt_time(9 + n % 8), reason='Benchmark', amount=500)
+            for n in range(total)
+        ])
+        Payment.objects.bulk_create([
+            Payment(appointment=appointment, amount=500, payment_method='bkash', payment_id=f'BENCH_{n}')
+            for n, appointment in enumerate(appointments)
+        ])
@@ -0,0 +1,109 @@
+"""
+Management command to benchmark database connection setup per request
+
+Requests go through the WSGI handler, so Django opens, health-checks and
+closes connections exactly as it does under gunicorn. Run it against the
+production database (DATABASE_URL) to see what a new connection costs
+there; on the local SQLite file connecting is nearly free.
+"""
+import logging
+import statistics
+import time
+
+from django.conf import settings
+from django.core.handlers.wsgi import WSGIHandler
+from django.core.management.base import BaseCommand
+from django.db import connections
+from django.test import RequestFactory
+from django.test.utils import override_settings
+
+
+class Command(BaseCommand):
+    help = 'Benchmark connection setup cost per request with and without persistent connections and health checks'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=200, help='Requests per mode (default: 200)')
+        parser.add_argument('--path', default='/doctors/', help='Page to request (default: /doctors/)')
+
+    def handle(self, *args, **options):
+        modes = [
+            ('new per request', {'CONN_MAX_AGE': 0, 'CONN_HEALTH_CHECKS': False}),
+            ('persistent', {'CONN_MAX_AGE': 600, 'CONN_HEALTH_CHECKS': False}),
+            ('persistent + checks', {'CONN_MAX_AGE': 600, 'CONN_HEALTH_CHECKS': True}),
+            ('configured', {}),
+        ]
+        handler = WSGIHandler()
+        factory = RequestFactory()
+
+        header = f'{"Mode":<22}{"Connects":>10}{"Connect ms/req":>16}{"Check ms/req":>14}{"Median req ms":>15}'
+        self.stdout.write(f'{options["requests"]} requests to {options["path"]} per mode\n')
+        self.stdout.write(header)
+        self.stdout.write('-' * len(header))
+        # No request log line per benchmark request
+        logging.disable(logging.INFO)
+        try:
+            with override_settings(ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver']):
+                for label, overrides in modes:
+                    connects, connect_ms, check_ms, median = self.measure(
+                        handler, factory, options['path'], options['requests'], overrides
+                    )
+                    requests = options['requests']
+                    self.stdout.write(
+                        f'{label:<22}{connects:>10}{connect_ms / requests:>16.3f}'
+                        f'{check_ms / requests:>14.3f}{median:>15.2f}'
+                    )
+        finally:
+            logging.disable(logging.NOTSET)
+
+        self.stdout.write(self.style.SUCCESS('\n✓ Benchmark finished'))
+
+    def measure(self, handler, factory, path, requests, overrides):
+        """
+        Serve ``requests`` requests with the connection settings ``overrides``
+
+        Returns:
+            tuple: ``(connects, connect_ms, check_ms, median_request_ms)``
+        """
+        spent = {'connect': 0.0, 'check': 0.0}
+        connects = 0
+        saved = {}
+        for connection in connections.all():
+            connection.close()
+            saved[connection.alias] = {key: connection.settings_dict[key] for key in overrides}
+            connection.settings_dict.update(overrides)
+            connection.connect = self.timed(connection.connect, spent, 'connect')
+            connection.close_if_health_check_failed = self.timed(
+                connection.close_if_health_check_failed, spent, 'check'
+            )
+
+        def start_response(status, headers):
+            pass
+
+        timings = []
+        try:
+            for _ in range(requests):
+                began = time.perf_counter()
+                response = handler(factory.get(path).environ, start_response)
+                # Sends request_finished, which closes connections past CONN_MAX_AGE
+                response.close()
+                timings.append((time.perf_counter() - began) * 1000)
+        finally:
+            for connection in connections.all():
+                connects += connection.connect.calls
+                del connection.connect, connection.close_if_health_check_failed
+                connection.close()
+                connection.settings_dict.update(saved[connection.alias])
+        return connects, spent['connect'] * 1000, spent['check'] * 1000, statistics.median(timings)
+
+    @staticmethod
+    def timed(method, spent, name):
+        """``method`` adding its run time to ``spent[name]`` and counting calls"""
+        def wrapper(*args, **kwargs):
+            wrapper.calls += 1
+            began = time.perf_counter()
+            try:
+                return method(*args, **kwargs)
+            finally:
+                spent[name] += time.perf_counter() - began
+        wrapper.calls = 0
+        return wrapper
@@ -0,0 +1,100 @@
+"""
+Management command to benchmark the cross-doctor earliest slot search
+"""
+import random
+import statistics
+import time
+from datetime import time as dt_time, timedelta
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from appointments.availability import earliest_slots
+from appointments.models import Appointment, Doctor, Patient, TimeSlot
+
+
+class Command(BaseCommand):
+    help = 'Benchmark earliest slot search across thousands of doctors (seeded data is rolled back)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--doctors', type=int, default=2000, help='Doctors to seed (default: 2000)')
+        parser.add_argument('--slots-per-day', type=int, default=8, help='Hourly slots per weekday (default: 8)')
+        parser.add_argument('--booked', type=float, default=0.6, help='Fraction of slots already booked (default: 0.6)')
+        parser.add_argument('--days', type=int, default=7, help='Search window in days (default: 7)')
+        parser.add_argument('--k', type=int, default=10, help='Slots to return (default: 10)')
+        parser.add_argument('--runs', type=int, default=20, help='Timed runs (default: 20)')
+        parser.add_argument('--budget-ms', type=float, default=250.0, help='p95 latency budget in ms (default: 250)')
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            start = timezone.localdate() + timedelta(days=1)
+            self.stdout.write('Seeding benchmark data...')
+            self.seed(options, start)
+
+            with CaptureQueriesContext(connection) as queries:
+                earliest_slots('Benchmark', start, options['days'], k=options['k'])
+
+            timings = []
+            for _ in range(options['runs']):
+                began = time.perf_counter()
+                results = earliest_slots('Benchmark', start, options['days'], k=options['k'])
+                timings.append((time.perf_counter() - began) * 1000)
+
+            transaction.set_rollback(True)
+
+        timings.sort()
+        p95 = timings[min(len(timings) - 1, int(len(timings) * 0.95))]
+        self.stdout.write(f'\nDoctors: {options["doctors"]}  window: {options["days"]} day(s)  k: {options["k"]}')
+        self.stdout.write(f'Queries per search: {len(queries)}')
+        self.stdout.write(f'Results returned:   {len(results)}')
+        self.stdout.write(f'Latency p50: {statistics.median(timings):.1f} ms  p95: {p95:.1f} ms  '
+                          f'max: {timings[-1]:.1f} ms')
+
+        if p95 <= options['budget_ms']:
+            self.stdout.write(self.style.SUCCESS(f'✓ p95 within {options["budget_ms"]:.0f} ms budget'))
+        else:
+            self.stdout.write(self.style.ERROR(f'✗ p95 exceeds {options["budget_ms"]:.0f} ms budget'))
+
+    def seed(self, options, start):
+        """Create doctors with weekly slots and a random share of booked appointments"""
+        stamp = int(time.time())
+        user = User.objects.create_user(username=f'bench_patient_{stamp}', password=None)
+        patient = Patient.objects.create(user=user, phone='')
+        doctors = Doctor.objects.bulk_create([
+            Doctor(
+                name=f'Bench Doctor {i}',
+                specialization='Benchmark',
+                email=f'bench{i}.{stamp}@example.com',
+                phone='',
+            )
+            for i in range(options['doctors'])
+        ])
+
+        slot_times = [dt_time(8 + hour % 12) for hour in range(options['slots_per_day'])]
+        TimeSlot.objects.bulk_create([
+            TimeSlot(doctor=doctor, weekday=weekday, start_time=slot_time,
+                     end_time=dt_time(slot_time.hour, 59))
+            for doctor in doctors
+            for weekday in range(7)
+            for slot_time in slot_times
+        ], batch_size=5000)
+
+        rng = random.Random(42)
+        Appointment.objects.bulk_create([
+            Appointment(
+                patient=patient,
+                doctor=doctor,
+                appointment_date=start + timedelta(days=offset),
+                appointment_time=slot_time,
+                reason='benchmark',
+                status='confirmed',
+                amount=doctor.consultation_fee,
+            )
+            for doctor in doctors
+            for offset in range(options['days'])
+            for slot_time in slot_times
+            if rng.random() < options['booked']
+        ], batch_size=5000)
@@ -0,0 +1,157 @@
+"""
+Management command to benchmark partition pruning on the appointment table
+
+Seeds a multi-year dataset inside a transaction, runs the queries behind
+doctor_dashboard and get_available_slots with EXPLAIN (ANALYZE, BUFFERS)
+against the real (partitioned) table and an unpartitioned copy, then rolls
+everything back.
+"""
+import json
+import time
+from datetime import date, timedelta
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+from appointments import partitioning
+from appointments.models import Appointment, Doctor, Patient
+
+
+FLAT_TABLE = 'appointments_appointment_flat'
+
+
+class Command(BaseCommand):
+    help = 'Benchmark partition pruning for dashboard and slot queries over a multi-year dataset (PostgreSQL only)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--years', type=int, default=3, help='Years of history to seed (default: 3)')
+        parser.add_argument('--doctors', type=int, default=20, help='Doctors to seed (default: 20)')
+        parser.add_argument('--per-day', type=int, default=20, help='Appointments per doctor per day (default: 20)')
+        parser.add_argument('--runs', type=int, default=5, help='Timed runs per query (default: 5)')
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'postgresql':
+            raise CommandError(f'This benchmark requires PostgreSQL (current backend: {connection.vendor})')
+
+        partitioned = partitioning.is_partitioned()
+        if not partitioned:
+            self.stdout.write(self.style.WARNING(
+                'Appointment table is not partitioned; run `partition_appointments --convert` '
+                'to compare. Results below show the unpartitioned baseline only.'
+            ))
+
+        with transaction.atomic():
+            today = date.today()
+            start = today - timedelta(days=365 * options['years'])
+            end = today + timedelta(days=30)
+
+            if partitioned:
+                months = (end.year - start.year) * 12 + end.month - start.month
+                partitioning.ensure_partitions(start, months)
+
+            doctors = self.seed(start, end, options['doctors'], options['per_day'])
+            self.create_flat_copy()
+
+            doctor = doctors[0]
+            queries = self.build_queries(doctor, today)
+
+            self.stdout.write(f'\nSeeded {options["years"]} year(s) x {options["doctors"]} doctor(s) '
+                              f'x {options["per_day"]}/day\n')
+            header = f'{"Query":<28}{"Table":<14}{"Scanned":>9}{"Avg ms":>10}'
+            self.stdout.write(header)
+            self.stdout.write('-' * len(header))
+            for label, queryset in queries:
+                sql, params = queryset.query.sql_with_params()
+                for table_label, table_sql in (('partitioned' if partitioned else 'live', sql),
+                                               ('flat copy', self.flat_sql(sql))):
+                    relations, avg_ms = self.explain(table_sql, params, options['runs'])
+                    self.stdout.write(f'{label:<28}{table_label:<14}{len(relations):>9}{avg_ms:>10.2f}')
+
+            transaction.set_rollback(True)
+
+        self.stdout.write(self.style.SUCCESS('\n✓ Benchmark finished (seeded data rolled back)'))
+
+    def seed(self, start, end, doctor_count, per_day):
+        """Insert benchmark doctors, one patient and appointments with generate_series"""
+        user = User.objects.create_user(username=f'bench_patient_{int(time.time())}', password=None)
+        patient = Patient.objects.create(user=user, phone='')
+        doctors = Doctor.objects.bulk_create([
+            Doctor(
+                name=f'Bench Doctor {i}',
+                specialization='Benchmark',
+                email=f'bench{i}.{int(time.time())}@example.com',
+                phone='',
+            )
+            for i in range(doctor_count)
+        ])
+
+        quote = connection.ops.quote_name
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"INSERT INTO {quote(Appointment._meta.db_table)} "
+                "(patient_id, doctor_id, appointment_date, appointment_time, reason, symptoms, "
+                "status, payment_status, amount, created_at, updated_at) "
+                "SELECT %s, doc, d::date, make_time(8 + n %% 12, (n * 7) %% 60, 0), 'benchmark', '', "
+                "(ARRAY['pending', 'confirmed', 'completed', 'cancelled'])[1 + n %% 4], 'paid', 500, now(), now() "
+                "FROM generate_series(%s::date, %s::date, interval '1 day') d, "
+                "unnest(%s::bigint[]) doc, generate_series(1, %s) n",
+                [patient.id, start, end, [d.id for d in doctors], per_day],
+            )
+            cursor.execute(f"ANALYZE {quote(Appointment._meta.db_table)}")
+        return doctors
+
+    def create_flat_copy(self):
+        """Unpartitioned copy with the same indexes, for comparison"""
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"CREATE TEMP TABLE {FLAT_TABLE} ON COMMIT DROP AS "
+                f"SELECT * FROM {connection.ops.quote_name(Appointment._meta.db_table)}"
+            )
+            cursor.execute(f"CREATE INDEX ON {FLAT_TABLE} (doctor_id, appointment_date)")
+            cursor.execute(f"ANALYZE {FLAT_TABLE}")
+
+    def flat_sql(self, sql):
+        return sql.replace(connection.ops.quote_name(Appointment._meta.db_table), FLAT_TABLE)
+
+    def build_queries(self, doctor, today):
+        """The appointment filters used by doctor_dashboard and get_available_slots"""
+        all_appointments = Appointment.objects.filter(doctor=doctor)
+        next_week = today + timedelta(days=7)
+        return [
+            ('dashboard: today', all_appointments.filter(appointment_date=today)),
+            ('dashboard: upcoming', all_appointments.filter(
+                appointment_date__gte=today,
+                status__in=['pending', 'confirmed'],
+            ).exclude(appointment_date=today).order_by('appointment_date', 'appointment_time')[:10]),
+            ('dashboard: hourly window', all_appointments.filter(
+                appointment_date=today,
+                appointment_time__gte='10:00',
+                appointment_time__lt='11:00',
+                status__in=['pending', 'confirmed'],
+            )),
+            ('get_available_slots', all_appointments.filter(
+                appointment_date=next_week,
+                status__in=['pending', 'confirmed'],
+            ).values_list('appointment_time', flat=True)),
+        ]
+
+    def explain(self, sql, params, runs):
+        """Run EXPLAIN ANALYZE ``runs`` times; return scanned relations and mean execution time"""
+        relations = set()
+        total = 0.0
+        with connection.cursor() as cursor:
+            for _ in range(runs):
+                cursor.execute('EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) ' + sql, params)
+                plan = cursor.fetchone()[0]
+                if isinstance(plan, str):
+                    plan = json.loads(plan)
+                total += plan[0]['Execution Time']
+                self.collect_relations(plan[0]['Plan'], relations)
+        return relations, total / runs
+
+    def collect_relations(self, node, relations):
+        if 'Relation Name' in node:
+            relations.add(node['Relation Name'])
+        for child in node.get('Plans', []):
+            self.collect_relations(child, relations)
@@ -0,0 +1,235 @@
+"""
+Management command to run a local in-memory cache server speaking the memcached protocol
+
+A stand-in for memcached in development and tests, so several runserver or
+worker processes can share one cache (circuit breakers, cache generations,
+recompute locks). Point the app at it with::
+
+    CACHE_URL=memcached://127.0.0.1:11211
+"""
+import socketserver
+import threading
+import time
+
+from django.core.management.base import BaseCommand
+
+
+# memcached treats expiry times above 30 days as absolute Unix timestamps
+RELATIVE_EXPIRY_LIMIT = 60 * 60 * 24 * 30
+
+
+class MemcachedHandler(socketserver.StreamRequestHandler):
+    """Speaks the memcached text protocol"""
+
+    def reply(self, line, noreply=False):
+        if not noreply:
+            self.wfile.write(line + b'\r\n')
+
+    def handle(self):
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            parts = line.split()
+            if not parts:
+                self.reply(b'ERROR')
+                continue
+            command, args = parts[0].lower().decode('ascii', 'replace'), parts[1:]
+            if command == 'quit':
+                return
+            handler = getattr(self, f'do_{command}', None)
+            if handler is None:
+                self.reply(b'ERROR')
+                continue
+            try:
+                handler(args)
+            except (IndexError, ValueError):
+                self.reply(b'CLIENT_ERROR bad command line format')
+
+    def do_get(self, keys, with_cas=False):
+        for key, (flags, value, cas) in self.server.store.get_many(keys).items():
+            header = b'VALUE %s %d %d' % (key, flags, len(value))
+            self.reply(header + (b' %d' % cas if with_cas else b''))
+            self.reply(value)
+        self.reply(b'END')
+
+    def do_gets(self, keys):
+        self.do_get(keys, with_cas=True)
+
+    def _store(self, mode, args):
+        key, flags, exptime, size = args[0], int(args[1]), int(args[2]), int(args[3])
+        cas = int(args[4]) if mode == 'cas' else None
+        noreply = args[-1] == b'noreply'
+        value = self.rfile.read(size + 2)[:size]
+        self.reply(self.server.store.store(mode, key, flags, exptime, value, cas), noreply)
+
+    def do_set(self, args):
+        self._store('set', args)
+
+    def do_add(self, args):
+        self._store('add', args)
+
+    def do_replace(self, args):
+        self._store('replace', args)
+
+    def do_append(self, args):
+        self._store('append', args)
+
+    def do_prepend(self, args):
+        self._store('prepend', args)
+
+    def do_cas(self, args):
+        self._store('cas', args)
+
+    def do_delete(self, args):
+        deleted = self.server.store.delete(args[0])
+        self.reply(b'DELETED' if deleted else b'NOT_FOUND', args[-1] == b'noreply')
+
+    def do_incr(self, args, sign=1):
+        result = self.server.store.incr(args[0], sign * int(args[1]))
+        self.reply(result, args[-1] == b'noreply')
+
+    def do_decr(self, args):
+        self.do_incr(args, sign=-1)
+
+    def do_touch(self, args):
+        touched = self.server.store.touch(args[0], int(args[1]))
+        self.reply(b'TOUCHED' if touched else b'NOT_FOUND', args[-1] == b'noreply')
+
+    def do_flush_all(self, args):
+        self.server.store.flush()
+        self.reply(b'OK', bool(args) and args[-1] == b'noreply')
+
+    def do_version(self, args):
+        self.reply(b'VERSION 1.6.0-appointments')
+
+    def do_stats(self, args):
+        for name, value in self.server.store.stats().items():
+            self.reply(f'STAT {name} {value}'.encode())
+        self.reply(b'END')
+
+
+class MemoryStore:
+    """Thread-safe key -> (flags, value, expires_at, cas) map"""
+
+    def __init__(self):
+        self.items = {}
+        self.lock = threading.Lock()
+        self.cas_counter = 0
+        self.hits = self.misses = 0
+
+    @staticmethod
+    def expires_at(exptime):
+        if exptime == 0:
+            return 0  # Never expires
+        if exptime < 0:
+            return -1  # Already expired
+        return exptime if exptime > RELATIVE_EXPIRY_LIMIT else time.time() + exptime
+
+    def _live(self, key):
+        item = self.items.get(key)
+        if item and item[2] and item[2] <= time.time():
+            del self.items[key]
+            return None
+        return item
+
+    def _put(self, key, flags, value, expires_at):
+        self.cas_counter += 1
+        self.items[key] = (flags, value, expires_at, self.cas_counter)
+
+    def get_many(self, keys):
+        with self.lock:
+            found = {}
+            for key in keys:
+                item = self._live(key)
+                if item:
+                    found[key] = (item[0], item[1], item[3])
+            self.hits += len(found)
+            self.misses += len(keys) - len(found)
+            return found
+
+    def store(self, mode, key, flags, exptime, value, cas=None):
+        with self.lock:
+            item = self._live(key)
+            if mode == 'add' and item:
+                return b'NOT_STORED'
+            if mode in ('replace', 'append', 'prepend') and not item:
+                return b'NOT_STORED'
+            if mode == 'cas':
+                if not item:
+                    return b'NOT_FOUND'
+                if item[3] != cas:
+                    return b'EXISTS'
+            if mode == 'append':
+                flags, value, expires_at = item[0], item[1] + value, item[2]
+            elif mode == 'prepend':
+                flags, value, expires_at = item[0], value + item[1], item[2]
+            else:
+                expires_at = self.expires_at(exptime)
+            self._put(key, flags, value, expires_at)
+            return b'STORED'
+
+    def delete(self, key):
+        with self.lock:
+            return self._live(key) is not None and self.items.pop(key) is not None
+
+    def incr(self, key, delta):
+        with self.lock:
+            item = self._live(key)
+            if not item:
+                return b'NOT_FOUND'
+            if not item[1].isdigit():
+                return b'CLIENT_ERROR cannot increment or decrement non-numeric value'
+            value = max(0, int(item[1]) + delta) % 2 ** 64
+            self._put(key, item[0], str(value).encode(), item[2])
+            return str(value).encode()
+
+    def touch(self, key, exptime):
+        with self.lock:
+            item = self._live(key)
+            if not item:
+                return False
+            self.items[key] = (item[0], item[1], self.expires_at(exptime), item[3])
+            return True
+
+    def flush(self):
+        with self.lock:
+            self.items.clear()
+
+    def stats(self):
+        with self.lock:
+            return {
+                'curr_items': len(self.items),
+                'bytes': sum(len(item[1]) for item in self.items.values()),
+                'get_hits': self.hits,
+                'get_misses': self.misses,
+            }
+
+
+class CacheServer(socketserver.ThreadingTCPServer):
+    allow_reuse_address = True
+    daemon_threads = True
+
+    def __init__(self, address):
+        super().__init__(address, MemcachedHandler)
+        self.store = MemoryStore()
+
+
+class Command(BaseCommand):
+    help = 'Run a local in-memory cache server speaking the memcached protocol'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--host', default='127.0.0.1', help='Address to listen on (default: 127.0.0.1)')
+        parser.add_argument('--port', type=int, default=11211, help='Port to listen on (default: 11211)')
+
+    def handle(self, *args, **options):
+        server = CacheServer((options['host'], options['port']))
+        self.stdout.write(self.style.SUCCESS(f'🗄️ Cache server listening on {options["host"]}:{options["port"]}'))
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
+        stats = server.store.stats()
+        self.stdout.write(f'✓ {stats["curr_items"]} item(s), {stats["get_hits"]} hit(s), {stats["get_misses"]} miss(es)')
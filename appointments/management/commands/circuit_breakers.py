@@ -0,0 +1,36 @@
+"""
+Management command to show or reset the Zoom and bKash circuit breakers
+"""
+import json
+
+from django.core.management.base import BaseCommand
+
+from appointments.circuit_breaker import BREAKERS, CLOSED, OPEN
+
+
+class Command(BaseCommand):
+    help = 'Show circuit breaker state and metrics, or reset a breaker'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--reset', metavar='NAME', choices=sorted(BREAKERS), help='Close this breaker')
+        parser.add_argument('--json', action='store_true', help='Print metrics as JSON')
+
+    def handle(self, *args, **options):
+        if options['reset']:
+            BREAKERS[options['reset']].reset()
+            self.stdout.write(self.style.SUCCESS(f'✓ Circuit breaker {options["reset"]!r} reset to closed'))
+            return
+
+        stats = [breaker.stats() for breaker in BREAKERS.values()]
+        if options['json']:
+            self.stdout.write(json.dumps(stats, indent=2))
+            return
+
+        for item in stats:
+            style = {CLOSED: self.style.SUCCESS, OPEN: self.style.ERROR}.get(item['state'], self.style.WARNING)
+            self.stdout.write(style(f'⚡ {item["name"]}: {item["state"]}'))
+            self.stdout.write(f'   window: {item["window_calls"]} call(s), {item["window_failures"]} failed, '
+                              f'{item["window_slow_calls"]} slow')
+            self.stdout.write(f'   rejected while open: {item["rejected"]}')
+            transitions = ', '.join(f'{state} {count}' for state, count in item['transitions'].items())
+            self.stdout.write(f'   transitions: {transitions}')
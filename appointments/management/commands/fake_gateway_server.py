@@ -0,0 +1,331 @@
+"""
+Management command to run a local stand-in for the Zoom and bKash APIs
+
+Serves the Zoom Server-to-Server OAuth token and meetings endpoints under
+``/zoom`` and the bKash tokenized checkout endpoints under ``/bkash``, with
+configurable latency, error rate and rate limiting, so the real integration
+code paths can be exercised and load-tested offline. Point the app at it
+with::
+
+    ZOOM_BASE_URL=http://localhost:8090/zoom/v2
+    ZOOM_TOKEN_URL=http://localhost:8090/zoom/oauth/token
+    BKASH_BASE_URL=http://localhost:8090/bkash
+    BKASH_TEST_MODE=False
+
+(plus any non-empty ZOOM_* / BKASH_* credentials).
+"""
+import json
+import random
+import threading
+import time
+import uuid
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlencode, urlsplit
+
+from django.core.management.base import BaseCommand
+
+
+class GatewayHandler(BaseHTTPRequestHandler):
+    """Routes requests to the fake Zoom and bKash endpoints"""
+
+    def do_GET(self):
+        self.dispatch('GET')
+
+    def do_POST(self):
+        self.dispatch('POST')
+
+    def do_PATCH(self):
+        self.dispatch('PATCH')
+
+    def do_DELETE(self):
+        self.dispatch('DELETE')
+
+    def dispatch(self, method):
+        length = int(self.headers.get('Content-Length') or 0)
+        body = self.rfile.read(length) if length else b''
+        path = urlsplit(self.path).path.rstrip('/')
+        server = self.server
+        server.count(f'{method} {path}')
+
+        if not server.allow_request():
+            self.send_json(429, {'code': 429, 'message': 'You have exceeded the rate limit'},
+                           headers={'Retry-After': '1'})
+            return
+
+        time.sleep(server.delay())
+        if random.random() < server.error_rate:
+            self.send_json(500, {'code': 500, 'message': 'Injected gateway fault'})
+            return
+
+        if path.startswith('/zoom/'):
+            status, payload = server.zoom(method, path[len('/zoom'):], self.headers, body)
+        elif path.startswith('/bkash/'):
+            status, payload = server.bkash(method, path[len('/bkash'):], self.headers, body)
+        else:
+            status, payload = 404, {'message': 'Not found'}
+
+        if status == 302:
+            self.send_response(302)
+            self.send_header('Location', payload)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+        else:
+            self.send_json(status, payload)
+
+    def send_json(self, status, payload, headers=None):
+        data = json.dumps(payload).encode() if payload is not None else b''
+        self.send_response(status)
+        if data:
+            self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        if self.server.stdout is not None:
+            self.server.stdout.write(format % args)
+
+
+class FakeGatewayServer(ThreadingHTTPServer):
+    """
+    Threaded HTTP server holding fake Zoom meetings and bKash payments in memory
+
+    Args:
+        address: ``(host, port)`` to listen on
+        latency: Seconds added to every response
+        jitter: Up to this many extra seconds, chosen at random per request
+        error_rate: Fraction of requests answered with HTTP 500
+        rate_limit: Requests per second before answering 429 (0 disables)
+        stdout: Stream for a line per request, or None for silence
+    """
+    allow_reuse_address = True
+    daemon_threads = True
+    request_queue_size = 128
+
+    def __init__(self, address, latency=0.0, jitter=0.0, error_rate=0.0, rate_limit=0, stdout=None):
+        super().__init__(address, GatewayHandler)
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.rate_limit = rate_limit
+        self.stdout = stdout
+        self.requests = Counter()
+        self.meetings = {}
+        self.payments = {}
+        self._lock = threading.Lock()
+        self._window = (0, 0)
+        self._next_meeting_id = 80000000000
+
+    @property
+    def url(self):
+        host, port = self.server_address[:2]
+        return f'http://{host}:{port}'
+
+    def count(self, key):
+        with self._lock:
+            self.requests[key] += 1
+
+    def delay(self):
+        return self.latency + random.uniform(0, self.jitter)
+
+    def allow_request(self):
+        """Fixed one-second window of ``rate_limit`` requests"""
+        if not self.rate_limit:
+            return True
+        second = int(time.monotonic())
+        with self._lock:
+            window, used = self._window
+            if window != second:
+                window, used = second, 0
+            self._window = (window, used + 1)
+            return used < self.rate_limit
+
+    def add_payment(self, payment_id, amount, callback_url='', currency='BDT', intent='sale',
+                    merchant_invoice_number=None):
+        """Register an initiated checkout, as the create endpoint does"""
+        payment = {
+            'paymentID': payment_id,
+            'amount': str(amount),
+            'currency': currency,
+            'intent': intent,
+            'merchantInvoiceNumber': merchant_invoice_number,
+            'callbackURL': callback_url,
+            'transactionStatus': 'Initiated',
+        }
+        with self._lock:
+            self.payments[payment_id] = payment
+        return payment
+
+    def zoom(self, method, path, headers, body):
+        if path == '/oauth/token' and method == 'POST':
+            if not headers.get('Authorization', '').startswith('Basic '):
+                return 401, {'reason': 'Invalid client_id or client_secret', 'error': 'invalid_client'}
+            return 200, {
+                'access_token': f'fake-zoom-{uuid.uuid4().hex}',
+                'token_type': 'bearer',
+                'expires_in': 3599,
+                'scope': 'meeting:write:admin',
+            }
+
+        if not headers.get('Authorization', '').startswith('Bearer '):
+            return 401, {'code': 124, 'message': 'Invalid access token.'}
+
+        if path == '/v2/users/me/meetings' and method == 'POST':
+            data = json.loads(body or b'{}')
+            with self._lock:
+                self._next_meeting_id += 1
+                meeting_id = self._next_meeting_id
+                meeting = {
+                    'id': meeting_id,
+                    'topic': data.get('topic', ''),
+                    'start_time': data.get('start_time'),
+                    'duration': data.get('duration', 60),
+                    'agenda': data.get('agenda', ''),
+                    'password': uuid.uuid4().hex[:6],
+                    'join_url': f'https://zoom.example.com/j/{meeting_id}',
+                    'start_url': f'https://zoom.example.com/s/{meeting_id}',
+                }
+                self.meetings[meeting_id] = meeting
+            return 201, meeting
+
+        if path.startswith('/v2/meetings/'):
+            try:
+                meeting_id = int(path.rsplit('/', 1)[1])
+            except ValueError:
+                return 404, {'code': 3001, 'message': 'Meeting does not exist.'}
+            with self._lock:
+                meeting = self.meetings.get(meeting_id)
+                if meeting is None:
+                    return 404, {'code': 3001, 'message': f'Meeting does not exist: {meeting_id}.'}
+                if method == 'GET':
+                    return 200, meeting
+                if method == 'PATCH':
+                    meeting.update(json.loads(body or b'{}'))
+                    return 204, None
+                if method == 'DELETE':
+                    del self.meetings[meeting_id]
+                    return 204, None
+
+        return 404, {'code': 404, 'message': 'Not found'}
+
+    def bkash(self, method, path, headers, body):
+        if path.startswith('/checkout/') and method == 'GET':
+            # Stands in for the bKash payment page: the customer approves at once
+            with self._lock:
+                payment = self.payments.get(path.rsplit('/', 1)[1])
+            if payment is None:
+                return 404, {'statusCode': '2056', 'statusMessage': 'Invalid Payment State'}
+            query = urlencode({'paymentID': payment['paymentID'], 'status': 'success'})
+            return 302, f"{payment['callbackURL']}?{query}"
+
+        if method != 'POST':
+            return 404, {'statusCode': '9999', 'statusMessage': 'System Error'}
+        data = json.loads(body or b'{}')
+
+        if path == '/tokenized/checkout/token/grant':
+            if not (headers.get('username') and headers.get('password') and data.get('app_key')):
+                return 200, {'statusCode': '2001', 'statusMessage': 'Invalid App Key'}
+            return 200, {
+                'statusCode': '0000',
+                'statusMessage': 'Successful',
+                'id_token': f'fake-bkash-{uuid.uuid4().hex}',
+                'token_type': 'Bearer',
+                'expires_in': 3600,
+                'refresh_token': uuid.uuid4().hex,
+            }
+
+        if not (headers.get('Authorization') and headers.get('X-APP-Key')):
+            return 200, {'statusCode': '2001', 'statusMessage': 'Invalid App Key'}
+
+        if path == '/tokenized/checkout/create':
+            payment = self.add_payment(
+                f'TR0011{uuid.uuid4().hex[:14].upper()}',
+                amount=data.get('amount'),
+                callback_url=data.get('callbackURL'),
+                currency=data.get('currency', 'BDT'),
+                intent=data.get('intent', 'sale'),
+                merchant_invoice_number=data.get('merchantInvoiceNumber'),
+            )
+            payment_id = payment['paymentID']
+            return 200, {
+                'statusCode': '0000',
+                'statusMessage': 'Successful',
+                'paymentID': payment_id,
+                'bkashURL': f'{self.url}/bkash/checkout/{payment_id}',
+                'callbackURL': payment['callbackURL'],
+                'amount': payment['amount'],
+                'transactionStatus': 'Initiated',
+            }
+
+        with self._lock:
+            payment = self.payments.get(data.get('paymentID'))
+            if payment is None:
+                return 200, {'statusCode': '2056', 'statusMessage': 'Invalid Payment State'}
+
+            if path == '/tokenized/checkout/execute':
+                if payment['transactionStatus'] != 'Initiated':
+                    return 200, {'statusCode': '2062', 'statusMessage': 'The payment has already been completed'}
+                payment['transactionStatus'] = 'Completed'
+                payment['trxID'] = uuid.uuid4().hex[:10].upper()
+                return 200, dict(payment, statusCode='0000', statusMessage='Successful',
+                                 customerMsisdn='01770618575')
+
+            if path == '/tokenized/checkout/payment/status':
+                return 200, dict(payment, statusCode='0000', statusMessage='Successful')
+
+            if path == '/tokenized/checkout/payment/refund':
+                if payment['transactionStatus'] != 'Completed' or data.get('trxID') != payment.get('trxID'):
+                    return 200, {'statusCode': '2071', 'statusMessage': 'Refund not allowed'}
+                payment['transactionStatus'] = 'Refunded'
+                return 200, {
+                    'statusCode': '0000',
+                    'statusMessage': 'Successful',
+                    'originalTrxID': payment['trxID'],
+                    'refundTrxID': uuid.uuid4().hex[:10].upper(),
+                    'transactionStatus': 'Completed',
+                    'amount': data.get('amount'),
+                    'currency': payment['currency'],
+                }
+
+        return 404, {'statusCode': '9999', 'statusMessage': 'System Error'}
+
+
+class Command(BaseCommand):
+    help = 'Run a local fake Zoom and bKash API server with injectable latency and faults'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--host', default='localhost', help='Address to listen on (default: localhost)')
+        parser.add_argument('--port', type=int, default=8090, help='Port to listen on (default: 8090)')
+        parser.add_argument('--latency-ms', type=int, default=0, help='Latency added to every response (default: 0)')
+        parser.add_argument('--jitter-ms', type=int, default=0, help='Random extra latency up to this (default: 0)')
+        parser.add_argument('--error-rate', type=float, default=0.0,
+                            help='Fraction of requests answered with HTTP 500 (default: 0)')
+        parser.add_argument('--rate-limit', type=int, default=0,
+                            help='Requests per second before answering 429 (default: 0, unlimited)')
+        parser.add_argument('--quiet', action='store_true', help='Do not log every request')
+
+    def handle(self, *args, **options):
+        server = FakeGatewayServer(
+            (options['host'], options['port']),
+            latency=options['latency_ms'] / 1000,
+            jitter=options['jitter_ms'] / 1000,
+            error_rate=options['error_rate'],
+            rate_limit=options['rate_limit'],
+            stdout=None if options['quiet'] else self.stdout,
+        )
+        self.stdout.write(self.style.SUCCESS(f'🧪 Fake Zoom/bKash gateway listening on {server.url}'))
+        self.stdout.write(f'   ZOOM_BASE_URL={server.url}/zoom/v2')
+        self.stdout.write(f'   ZOOM_TOKEN_URL={server.url}/zoom/oauth/token')
+        self.stdout.write(f'   BKASH_BASE_URL={server.url}/bkash')
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
+        self.stdout.write(f'✓ Served {sum(server.requests.values())} request(s)')
+        for endpoint, count in server.requests.most_common():
+            self.stdout.write(f'   {count:6d}  {endpoint}')
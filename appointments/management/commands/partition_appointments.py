@@ -0,0 +1,95 @@
+"""
+Management command to manage monthly partitions of the appointment table
+"""
+from datetime import date, datetime
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from appointments import partitioning
+
+
+class Command(BaseCommand):
+    help = 'Convert the appointment table to monthly partitions and maintain them (PostgreSQL only)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--convert',
+            action='store_true',
+            help='Rebuild the appointment table as a partitioned table (one-time, run after migrate)',
+        )
+        parser.add_argument(
+            '--ahead',
+            type=int,
+            default=3,
+            help='Number of future months to create partitions for (default: 3)',
+        )
+        parser.add_argument(
+            '--detach-before',
+            help='Detach partitions for months ending on or before this date (YYYY-MM-DD)',
+        )
+        parser.add_argument(
+            '--archive-schema',
+            help='Move detached partitions into this schema instead of leaving them in public',
+        )
+        parser.add_argument(
+            '--drop',
+            action='store_true',
+            help='Drop detached partitions instead of keeping them',
+        )
+        parser.add_argument(
+            '--list',
+            action='store_true',
+            help='List attached monthly partitions',
+        )
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'postgresql':
+            raise CommandError(f'Partitioning requires PostgreSQL (current backend: {connection.vendor})')
+
+        try:
+            if options['convert']:
+                self.convert(options['ahead'])
+            elif not partitioning.is_partitioned():
+                raise CommandError('Appointment table is not partitioned yet. Run with --convert first.')
+            else:
+                names = partitioning.ensure_partitions(date.today(), options['ahead'])
+                self.stdout.write(self.style.SUCCESS(
+                    f'✓ Partitions ready through {names[-1]} ({len(names)} month(s) checked)'
+                ))
+
+            if options['detach_before']:
+                self.detach(options['detach_before'], options['archive_schema'], options['drop'])
+
+            if options['list']:
+                for name, month in partitioning.list_partitions():
+                    self.stdout.write(f'  {name}  {month:%Y-%m}')
+        except RuntimeError as e:
+            raise CommandError(str(e))
+
+    def convert(self, months_ahead):
+        """Convert the plain table into a partitioned one"""
+        self.stdout.write('Converting appointment table to monthly partitions...')
+        result = partitioning.convert_to_partitioned(months_ahead=months_ahead)
+        for constraint in result['dropped_constraints']:
+            self.stdout.write(self.style.WARNING(f'  Dropped foreign key {constraint}'))
+        self.stdout.write(self.style.SUCCESS(
+            f'✓ Created {len(result["partitions"])} monthly partition(s) plus a default partition'
+        ))
+
+    def detach(self, value, archive_schema, drop):
+        """Detach (and optionally archive or drop) old partitions"""
+        try:
+            before = datetime.strptime(value, '%Y-%m-%d').date()
+        except ValueError:
+            raise CommandError('--detach-before must be a date in YYYY-MM-DD format')
+
+        detached = partitioning.detach_partitions(before, archive_schema=archive_schema, drop=drop)
+        if not detached:
+            self.stdout.write(self.style.WARNING('No partitions to detach'))
+            return
+
+        action = 'Dropped' if drop else f'Archived to {archive_schema}' if archive_schema else 'Detached'
+        for name in detached:
+            self.stdout.write(f'  {action}: {name}')
+        self.stdout.write(self.style.SUCCESS(f'✓ {len(detached)} partition(s) detached'))
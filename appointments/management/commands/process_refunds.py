@@ -0,0 +1,34 @@
+"""
+Management command to drain the refund queue
+"""
+import time
+
+from django.core.management.base import BaseCommand
+
+from appointments.refunds import process_batch
+
+
+class Command(BaseCommand):
+    help = 'Send queued refunds for cancelled paid appointments to bKash in concurrent batches'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, help='Refunds per batch (default: REFUND_BATCH_SIZE)')
+        parser.add_argument('--workers', type=int, help='Concurrent bKash requests (default: REFUND_WORKERS)')
+        parser.add_argument('--max-attempts', type=int, help='Give up after this many attempts (default: REFUND_MAX_ATTEMPTS)')
+        parser.add_argument('--loop', action='store_true', help='Keep polling the queue instead of exiting when it is empty')
+        parser.add_argument('--interval', type=float, default=5.0, help='Seconds to sleep between polls with --loop (default: 5)')
+
+    def handle(self, *args, **options):
+        total_refunded = total_failed = 0
+        while True:
+            refunded, failed = process_batch(options['batch_size'], options['max_attempts'], options['workers'])
+            total_refunded += refunded
+            total_failed += failed
+            if refunded or failed:
+                self.stdout.write(f'💸 Batch: {refunded} refunded, {failed} failed')
+            elif options['loop']:
+                time.sleep(options['interval'])
+            else:
+                break
+
+        self.stdout.write(self.style.SUCCESS(f'✓ {total_refunded} refund(s) processed, {total_failed} failed'))
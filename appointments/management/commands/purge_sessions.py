@@ -0,0 +1,45 @@
+"""
+Management command to delete expired sessions in small chunks
+
+Unlike ``clearsessions``, which removes every expired row in one DELETE,
+each chunk is its own short statement, so a large backlog never holds
+long locks on the session table that logged-in requests read.
+"""
+import time
+from importlib import import_module
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+
+class Command(BaseCommand):
+    help = 'Delete expired sessions from the database in chunks'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=1000, help='Sessions deleted per statement (default: 1000)')
+        parser.add_argument('--sleep', type=float, default=0.0, help='Seconds to pause between chunks (default: 0)')
+        parser.add_argument('--limit', type=int, help='Stop after deleting this many sessions (default: all)')
+
+    def handle(self, *args, **options):
+        store = import_module(settings.SESSION_ENGINE).SessionStore
+        if not hasattr(store, 'get_model_class'):
+            self.stdout.write(f'Sessions are not stored in the database ({settings.SESSION_ENGINE}); nothing to purge')
+            return
+
+        expired = store.get_model_class().objects.filter(expire_date__lt=timezone.now())
+        deleted = 0
+        while options['limit'] is None or deleted < options['limit']:
+            size = options['chunk_size']
+            if options['limit'] is not None:
+                size = min(size, options['limit'] - deleted)
+            keys = list(expired.order_by('expire_date').values_list('pk', flat=True)[:size])
+            if not keys:
+                break
+            count, _ = expired.filter(pk__in=keys).delete()
+            deleted += count
+            self.stdout.write(f'🧹 Deleted {deleted} expired session(s) so far')
+            if options['sleep']:
+                time.sleep(options['sleep'])
+
+        self.stdout.write(self.style.SUCCESS(f'✓ {deleted} expired session(s) purged'))
@@ -0,0 +1,115 @@
+"""
+Management command to repair drift in the denormalized appointment counters
+
+Hourly and daily counters are recounted within ``--days`` of today (or for
+all dates); the all-time totals are always recounted, with one grouped
+query over all appointments.
+"""
+from collections import Counter
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count
+from django.utils import timezone
+
+from appointments import caching, counters
+from appointments.models import Appointment, AppointmentCounter, AppointmentTotal, HourlyAppointmentCounter
+
+
+class Command(BaseCommand):
+    help = 'Recount appointments and fix drift in the appointment counters'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days',
+            type=int,
+            help='Only reconcile hourly and daily counters within this many days of today (default: all)',
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Report drift without fixing it',
+        )
+
+    def handle(self, *args, **options):
+        appointments = Appointment.objects.all()
+        hourly_rows = HourlyAppointmentCounter.objects.all()
+        daily_rows = AppointmentCounter.objects.all()
+        if options['days'] is not None:
+            today = timezone.localdate()
+            window = (today - timedelta(days=options['days']), today + timedelta(days=options['days']))
+            appointments = appointments.filter(appointment_date__range=window)
+            hourly_rows = hourly_rows.filter(date__range=window)
+            daily_rows = daily_rows.filter(date__range=window)
+
+        with transaction.atomic():
+            hourly = counters.compute_counts(appointments)
+            daily = Counter()
+            for (doctor_id, day, hour, status), count in hourly.items():
+                daily[(doctor_id, day, status)] += count
+            totals = Counter()
+            rows = Appointment.objects.values_list('doctor_id', 'status').annotate(total=Count('pk')).order_by()
+            for doctor_id, status, total in rows:
+                totals[(doctor_id, status)] += total
+                totals[(None, status)] += total
+
+            drifted = set()
+            for label, model, fields, rows, expected in [
+                ('Hourly', HourlyAppointmentCounter, ('doctor_id', 'date', 'hour', 'status'), hourly_rows, hourly),
+                ('Daily', AppointmentCounter, ('doctor_id', 'date', 'status'), daily_rows, daily),
+                ('Totals', AppointmentTotal, ('doctor_id', 'status'), AppointmentTotal.objects.all(), totals),
+            ]:
+                drifted |= self.reconcile(label, model, fields, rows, expected, options['dry_run'])
+
+            if options['dry_run']:
+                transaction.set_rollback(True)
+                return
+
+            # Cached dashboard stats of the repaired doctors are stale
+            for doctor_id in drifted - {None}:
+                caching.invalidate_doctor(doctor_id)
+
+        self.stdout.write(self.style.SUCCESS('✓ Appointment counters reconciled'))
+
+    def reconcile(self, label, model, fields, rows, expected, dry_run):
+        """
+        Make the counter ``rows`` of ``model`` match ``expected``
+
+        Args:
+            fields: Fields forming the counter key, doctor_id first
+            expected: key tuple -> count
+
+        Returns:
+            set: Ids of doctors whose counters were repaired
+        """
+        stored = {tuple(getattr(row, field) for field in fields): row for row in rows.select_for_update()}
+        expected = Counter(expected)
+
+        to_update = []
+        to_delete = []
+        stale = 0
+        drifted = set()
+        for key, row in stored.items():
+            count = expected.pop(key, 0)
+            if count == 0:
+                # Zero rows are harmless leftovers; only non-zero ones are drift
+                to_delete.append(row.pk)
+                if row.count:
+                    stale += 1
+                    drifted.add(row.doctor_id)
+            elif row.count != count:
+                row.count = count
+                to_update.append(row)
+                drifted.add(row.doctor_id)
+        to_create = [model(count=count, **dict(zip(fields, key))) for key, count in expected.items()]
+        drifted.update(row.doctor_id for row in to_create)
+
+        self.stdout.write(
+            f'{label}: {len(to_update)} wrong, {len(to_create)} missing, {stale} stale counter row(s)'
+        )
+        if not dry_run:
+            model.objects.bulk_update(to_update, ['count'], batch_size=1000)
+            model.objects.bulk_create(to_create, batch_size=1000)
+            model.objects.filter(pk__in=to_delete).delete()
+        return drifted
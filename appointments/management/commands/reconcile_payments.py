@@ -0,0 +1,50 @@
+"""
+Management command to resolve stale pending bKash payments (e.g. from cron)
+"""
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from appointments.reconciliation import reconcile
+
+
+class Command(BaseCommand):
+    help = 'Query bKash for stale pending payments and complete or fail them'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--stale-minutes', type=int, default=settings.RECONCILE_STALE_MINUTES,
+                            help='Only payments pending for longer than this (default: %(default)s)')
+        parser.add_argument('--expire-hours', type=int, default=settings.RECONCILE_EXPIRE_HOURS,
+                            help="Fail payments still 'Initiated' after this long (default: %(default)s)")
+        parser.add_argument('--chunk-size', type=int, default=settings.RECONCILE_CHUNK_SIZE,
+                            help='Payments per chunk (default: %(default)s)')
+        parser.add_argument('--workers', type=int, default=settings.RECONCILE_WORKERS,
+                            help='Concurrent bKash queries (default: %(default)s)')
+        parser.add_argument('--rate-limit', type=float, default=settings.RECONCILE_RATE_LIMIT,
+                            help='bKash requests per second, 0 for unlimited (default: %(default)s)')
+        parser.add_argument('--limit', type=int, help='Stop after this many payments')
+
+    def handle(self, *args, **options):
+        def progress(totals):
+            self.stdout.write(f'   {totals["checked"]} checked: {totals["completed"]} completed, '
+                              f'{totals["failed"]} failed, {totals["unresolved"]} still pending')
+
+        self.stdout.write('🔄 Reconciling stale bKash payments...')
+        totals = reconcile(
+            stale_minutes=options['stale_minutes'],
+            expire_hours=options['expire_hours'],
+            chunk_size=options['chunk_size'],
+            workers=options['workers'],
+            rate_limit=options['rate_limit'],
+            limit=options['limit'],
+            progress=progress,
+        )
+
+        rate = totals['checked'] / totals['seconds'] if totals['seconds'] else 0
+        if totals['aborted']:
+            self.stdout.write(self.style.ERROR('⚡ bKash circuit breaker is open, stopped early'))
+        if totals['errors']:
+            self.stdout.write(self.style.WARNING(f'⚠ {totals["errors"]} status queries failed, left pending'))
+        self.stdout.write(self.style.SUCCESS(
+            f'✓ {totals["checked"]} payment(s) checked in {totals["seconds"]:.1f} s ({rate:.1f}/s): '
+            f'{totals["completed"]} completed, {totals["failed"]} failed'
+        ))
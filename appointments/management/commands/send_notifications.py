@@ -0,0 +1,42 @@
+"""
+Management command to drain the email notification outbox
+"""
+import smtplib
+import time
+
+from django.core.management.base import BaseCommand
+
+from appointments.notifications import send_batch
+
+
+class Command(BaseCommand):
+    help = 'Send pending email notifications in batches over one SMTP connection per batch'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, help='Notifications per batch (default: NOTIFICATION_BATCH_SIZE)')
+        parser.add_argument('--max-attempts', type=int, help='Give up after this many attempts (default: NOTIFICATION_MAX_ATTEMPTS)')
+        parser.add_argument('--loop', action='store_true', help='Keep polling the outbox instead of exiting when it is empty')
+        parser.add_argument('--interval', type=float, default=5.0, help='Seconds to sleep between polls with --loop (default: 5)')
+
+    def handle(self, *args, **options):
+        total_sent = total_failed = 0
+        while True:
+            try:
+                sent, failed = send_batch(options['batch_size'], options['max_attempts'])
+            except (smtplib.SMTPException, OSError) as e:
+                self.stdout.write(self.style.ERROR(f'❌ SMTP server unavailable: {e}'))
+                if not options['loop']:
+                    break
+                time.sleep(options['interval'])
+                continue
+
+            total_sent += sent
+            total_failed += failed
+            if sent or failed:
+                self.stdout.write(f'📧 Batch: {sent} sent, {failed} failed')
+            elif options['loop']:
+                time.sleep(options['interval'])
+            else:
+                break
+
+        self.stdout.write(self.style.SUCCESS(f'✓ {total_sent} notification(s) sent, {total_failed} failed'))
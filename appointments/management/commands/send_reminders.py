@@ -0,0 +1,53 @@
+"""
+Management command to dispatch due appointment reminders
+"""
+import time
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from appointments import reminders
+from appointments.models import Appointment
+
+
+class Command(BaseCommand):
+    help = 'Hand due appointment reminders to their email/SMS senders, one time bucket at a time'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, help='Reminders per batch (default: REMINDER_BATCH_SIZE)')
+        parser.add_argument('--loop', action='store_true', help='Keep polling instead of exiting when nothing is due')
+        parser.add_argument('--interval', type=float, default=15.0, help='Seconds to sleep between polls with --loop (default: 15)')
+        parser.add_argument(
+            '--backfill',
+            action='store_true',
+            help='First schedule reminders for upcoming confirmed appointments (e.g. after deploying reminders)',
+        )
+
+    def handle(self, *args, **options):
+        if options['backfill']:
+            self.backfill()
+
+        senders = reminders.get_senders()
+        totals = {'sent': 0, 'skipped': 0, 'failed': 0}
+        while True:
+            counts = reminders.dispatch_due(options['batch_size'], senders=senders)
+            for key, value in counts.items():
+                totals[key] += value
+            if any(counts.values()):
+                self.stdout.write(f'⏰ Batch: {counts["sent"]} sent, {counts["skipped"]} skipped, {counts["failed"]} failed')
+            elif options['loop']:
+                time.sleep(options['interval'])
+            else:
+                break
+
+        self.stdout.write(self.style.SUCCESS(
+            f'✓ {totals["sent"]} reminder(s) sent, {totals["skipped"]} skipped, {totals["failed"]} failed'
+        ))
+
+    def backfill(self):
+        upcoming = Appointment.objects.filter(
+            status='confirmed',
+            appointment_date__gte=timezone.localdate(),
+        )
+        scheduled = sum(reminders.schedule(appointment) for appointment in upcoming.iterator())
+        self.stdout.write(f'📅 Scheduled {scheduled} reminder(s) for upcoming confirmed appointments')
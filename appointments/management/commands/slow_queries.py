@@ -0,0 +1,55 @@
+"""
+Management command to list the slowest queries recorded by the slow-query log
+"""
+from django.core.management.base import BaseCommand
+from django.db.models import F
+
+from appointments.models import SlowQuery
+
+
+ORDERINGS = {
+    'total': '-total_ms',
+    'max': '-max_ms',
+    'calls': '-calls',
+    'avg': F('total_ms') / F('calls'),
+}
+
+
+class Command(BaseCommand):
+    help = 'List slow queries aggregated by SQL fingerprint, worst first (needs SLOW_QUERY_LOG=True)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sort', choices=sorted(ORDERINGS), default='total', help='Rank by total, max or average time, or by calls (default: total)')
+        parser.add_argument('--limit', type=int, default=20, help='Show this many fingerprints (default: 20)')
+        parser.add_argument('--table', help='Only queries on this table, e.g. appointments_appointment')
+        parser.add_argument('--explain', action='store_true', help='Print the sampled EXPLAIN (ANALYZE, BUFFERS) plans')
+        parser.add_argument('--reset', action='store_true', help='Delete all recorded slow queries')
+
+    def handle(self, *args, **options):
+        if options['reset']:
+            deleted, _ = SlowQuery.objects.all().delete()
+            self.stdout.write(self.style.SUCCESS(f'✓ {deleted} slow query fingerprint(s) deleted'))
+            return
+
+        queries = SlowQuery.objects.filter(calls__gt=0)
+        if options['table']:
+            queries = queries.filter(sql__icontains=f'"{options["table"]}"')
+        ordering = ORDERINGS[options['sort']]
+        if options['sort'] == 'avg':
+            ordering = ordering.desc()
+        queries = list(queries.order_by(ordering)[:options['limit']])
+        if not queries:
+            self.stdout.write('No slow queries recorded')
+            return
+
+        for rank, query in enumerate(queries, 1):
+            self.stdout.write(self.style.WARNING(
+                f'🐢 #{rank} {query.fingerprint[:12]}: {query.calls} call(s), total {query.total_ms:.0f} ms, '
+                f'avg {query.avg_ms:.1f} ms, max {query.max_ms:.1f} ms'
+            ))
+            self.stdout.write(f'   at {query.caller or "unknown caller"}' + (f' (view {query.view})' if query.view else ''))
+            self.stdout.write(f'   {query.sql}')
+            if options['explain'] and query.explain:
+                self.stdout.write(f'   plan sampled {query.explained_at:%Y-%m-%d %H:%M}:')
+                for line in query.explain.splitlines():
+                    self.stdout.write(f'     {line}')
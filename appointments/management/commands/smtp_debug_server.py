@@ -0,0 +1,90 @@
+"""
+Management command to run a local SMTP server that prints messages instead of delivering them
+
+A small stand-in for ``python -m smtpd -n -c DebuggingServer``, which was
+removed in Python 3.12. Point the app at it with::
+
+    EMAIL_HOST=localhost EMAIL_PORT=1025 EMAIL_USE_TLS=False
+"""
+import socketserver
+
+from django.core.management.base import BaseCommand
+
+
+class SMTPHandler(socketserver.StreamRequestHandler):
+    """Speaks just enough SMTP for Django's EmailBackend"""
+
+    def reply(self, line):
+        self.wfile.write(f'{line}\r\n'.encode())
+
+    def handle(self):
+        self.reply('220 localhost debugging SMTP server ready')
+        mail_from, recipients = None, []
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            command = line.decode('utf-8', 'replace').strip()
+            verb = command[:4].upper()
+
+            if verb in ('HELO', 'EHLO'):
+                self.reply('250 localhost')
+            elif verb == 'MAIL':
+                mail_from, recipients = command[10:].strip(), []
+                self.reply('250 OK')
+            elif verb == 'RCPT':
+                recipients.append(command[8:].strip())
+                self.reply('250 OK')
+            elif verb == 'DATA':
+                self.reply('354 End data with <CR><LF>.<CR><LF>')
+                lines = []
+                while True:
+                    data = self.rfile.readline()
+                    if not data or data in (b'.\r\n', b'.\n'):
+                        break
+                    lines.append(data[1:] if data.startswith(b'..') else data)
+                self.server.deliver(mail_from, recipients, b''.join(lines))
+                self.reply('250 OK: queued')
+            elif verb in ('RSET', 'NOOP'):
+                self.reply('250 OK')
+            elif verb == 'QUIT':
+                self.reply('221 Bye')
+                return
+            else:
+                self.reply('502 Command not implemented')
+
+
+class DebuggingServer(socketserver.ThreadingTCPServer):
+    allow_reuse_address = True
+    daemon_threads = True
+
+    def __init__(self, address, stdout):
+        super().__init__(address, SMTPHandler)
+        self.stdout = stdout
+        self.received = 0
+
+    def deliver(self, mail_from, recipients, message):
+        self.received += 1
+        self.stdout.write(f'---------- MESSAGE {self.received} FOLLOWS ----------')
+        self.stdout.write(f'From: {mail_from}  To: {", ".join(recipients)}')
+        self.stdout.write(message.decode('utf-8', 'replace').rstrip())
+        self.stdout.write('------------ END MESSAGE ------------')
+
+
+class Command(BaseCommand):
+    help = 'Run a local SMTP server that prints every message it receives'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--host', default='localhost', help='Address to listen on (default: localhost)')
+        parser.add_argument('--port', type=int, default=1025, help='Port to listen on (default: 1025)')
+
+    def handle(self, *args, **options):
+        server = DebuggingServer((options['host'], options['port']), self.stdout)
+        self.stdout.write(self.style.SUCCESS(f'📬 SMTP debugging server listening on {options["host"]}:{options["port"]}'))
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
+        self.stdout.write(f'✓ Received {server.received} message(s)')
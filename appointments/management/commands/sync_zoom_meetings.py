@@ -0,0 +1,34 @@
+"""
+Management command to push queued Zoom meeting updates and deletions
+"""
+import time
+
+from django.core.management.base import BaseCommand
+
+from appointments.zoom_sync import process_batch
+
+
+class Command(BaseCommand):
+    help = 'Apply queued Zoom meeting changes, one API call per meeting however many changes are queued'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, help='Tasks per batch (default: ZOOM_SYNC_BATCH_SIZE)')
+        parser.add_argument('--workers', type=int, help='Concurrent Zoom requests (default: ZOOM_SYNC_WORKERS)')
+        parser.add_argument('--max-attempts', type=int, help='Give up after this many attempts (default: ZOOM_SYNC_MAX_ATTEMPTS)')
+        parser.add_argument('--loop', action='store_true', help='Keep polling the queue instead of exiting when it is empty')
+        parser.add_argument('--interval', type=float, default=5.0, help='Seconds to sleep between polls with --loop (default: 5)')
+
+    def handle(self, *args, **options):
+        total_synced = total_failed = 0
+        while True:
+            synced, failed = process_batch(options['batch_size'], options['max_attempts'], options['workers'])
+            total_synced += synced
+            total_failed += failed
+            if synced or failed:
+                self.stdout.write(f'🎥 Batch: {synced} meeting(s) synced, {failed} failed')
+            elif options['loop']:
+                time.sleep(options['interval'])
+            else:
+                break
+
+        self.stdout.write(self.style.SUCCESS(f'✓ {total_synced} meeting(s) synced, {total_failed} failed'))
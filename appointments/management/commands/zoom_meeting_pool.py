@@ -0,0 +1,28 @@
+"""
+Management command to keep the pre-created Zoom meeting pool filled
+"""
+import time
+
+from django.core.management.base import BaseCommand
+
+from appointments import meeting_pool
+
+
+class Command(BaseCommand):
+    help = 'Pre-create Zoom meetings for upcoming hours with pending appointments and delete unused ones'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days-ahead', type=int, help='Cover appointments this many days ahead (default: ZOOM_POOL_DAYS_AHEAD)')
+        parser.add_argument('--limit', type=int, help='Create at most this many meetings per run (default: ZOOM_POOL_MAX_CREATE)')
+        parser.add_argument('--workers', type=int, help='Concurrent Zoom requests (default: ZOOM_POOL_WORKERS)')
+        parser.add_argument('--loop', action='store_true', help='Keep refilling instead of exiting after one run')
+        parser.add_argument('--interval', type=float, default=60.0, help='Seconds between runs with --loop (default: 60)')
+
+    def handle(self, *args, **options):
+        while True:
+            created = meeting_pool.refill(options['days_ahead'], options['limit'], options['workers'])
+            deleted = meeting_pool.collect_garbage(workers=options['workers'])
+            self.stdout.write(self.style.SUCCESS(f'✓ Zoom meeting pool: {created} created, {deleted} unused deleted'))
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
@@ -0,0 +1,191 @@
+"""
+Pool of pre-created Zoom meetings
+
+The ``zoom_meeting_pool`` command creates meetings ahead of time for the
+upcoming hours that have pending (unpaid) appointments without a meeting,
+one per appointment, and garbage-collects entries whose hour passed unused.
+
+When an appointment is confirmed, ``assign`` claims an available meeting
+and reads its links with a single ``UPDATE ... RETURNING``, then copies them
+onto the appointment, so the patient has a link the moment the payment
+completes, without waiting on Zoom. The meeting's topic, agenda and exact
+start time are patched afterwards by the Zoom sync worker (see
+``zoom_sync``).
+"""
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, time, timedelta
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Case, Count, Q, Value, When
+from django.utils import timezone
+
+from .models import Appointment, PooledMeeting, ZoomSyncTask
+from .zoom_service import ZoomService
+
+
+# Placeholder topic until the meeting is assigned and patched
+POOL_TOPIC = 'Doctor consultation'
+
+
+def slot_hour(appointment_date, appointment_time):
+    """Aware start of the hour an appointment falls in"""
+    return timezone.make_aware(datetime.combine(appointment_date, time(appointment_time.hour)))
+
+
+def _claim(appointment, hour, now):
+    """
+    Claim an available meeting for ``appointment``, one for ``hour`` first
+
+    The meeting is picked by a subquery of the claiming UPDATE, which also
+    returns its links. SQLite runs the statement under its write lock;
+    PostgreSQL skips meetings a concurrent claim has locked, so neither
+    loses the race to another confirmation.
+
+    Returns:
+        tuple: ``(meeting_id, join_url, start_url, password)`` or None
+    """
+    candidates = (
+        PooledMeeting.objects.filter(status='available', start_time__gte=now - timedelta(hours=1))
+        .order_by(Case(When(start_time=hour, then=Value(0)), default=Value(1)), 'start_time', 'pk')
+        .select_for_update(skip_locked=True)
+        .values('pk')[:1]
+    )
+    candidate_sql, candidate_params = candidates.query.sql_with_params()
+    quote = connection.ops.quote_name
+    sql = (
+        f'UPDATE {quote(PooledMeeting._meta.db_table)} '
+        f'SET {quote("status")} = %s, {quote("appointment_id")} = %s, {quote("assigned_at")} = %s '
+        f'WHERE {quote("id")} = ({candidate_sql}) AND {quote("status")} = %s '
+        f'RETURNING {quote("meeting_id")}, {quote("join_url")}, {quote("start_url")}, {quote("password")}'
+    )
+    params = ['assigned', appointment.pk, connection.ops.adapt_datetimefield_value(now), *candidate_params, 'available']
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        return cursor.fetchone()
+
+
+def assign(appointment):
+    """
+    Give a confirmed appointment a meeting from the pool
+
+    A meeting created for the appointment's hour is preferred; otherwise any
+    meeting still ahead is used, its start time being patched anyway.
+
+    Writes the claim, the appointment's links and the patch task: the links
+    are read from the appointment row everywhere (pages, emails, Zoom
+    sync), and SQLite cannot write two tables in one statement.
+
+    Returns:
+        bool: Whether a meeting was assigned; False if the pool is empty
+    """
+    with transaction.atomic():
+        claimed = _claim(appointment, slot_hour(appointment.appointment_date, appointment.appointment_time), timezone.now())
+        if claimed is None:
+            return False
+
+        meeting_id, join_url, start_url, password = claimed
+        appointment.zoom_meeting_id = meeting_id
+        appointment.zoom_join_url = join_url
+        appointment.zoom_start_url = start_url
+        appointment.zoom_password = password
+        appointment.save(update_fields=['zoom_meeting_id', 'zoom_join_url', 'zoom_start_url', 'zoom_password', 'updated_at'])
+        # A meeting fresh from the pool has no pending task to fold into
+        ZoomSyncTask.objects.create(appointment=appointment, meeting_id=meeting_id, action='update')
+    return True
+
+
+def demand(now=None, days_ahead=None):
+    """
+    Meetings needed per upcoming hour
+
+    Returns:
+        Counter: hour start -> pending appointments without a Zoom meeting,
+        less the meetings already available for that hour
+    """
+    now = now or timezone.now()
+    today = timezone.localdate(now)
+    appointments = Appointment.objects.filter(
+        status='pending',
+        appointment_date__range=(today, today + timedelta(days=days_ahead or settings.ZOOM_POOL_DAYS_AHEAD)),
+    ).filter(Q(zoom_meeting_id__isnull=True) | Q(zoom_meeting_id='') | Q(zoom_meeting_id__startswith='manual_'))
+
+    needed = Counter()
+    for appointment_date, appointment_time in appointments.values_list('appointment_date', 'appointment_time'):
+        hour = slot_hour(appointment_date, appointment_time)
+        if hour >= now - timedelta(hours=1):
+            needed[hour] += 1
+
+    pooled = (
+        PooledMeeting.objects.filter(status='available', start_time__in=list(needed))
+        .values('start_time').annotate(count=Count('pk')).order_by()
+    )
+    for row in pooled:
+        needed[row['start_time']] -= row['count']
+    return +needed
+
+
+def _create(service, hour):
+    local = timezone.localtime(hour).replace(tzinfo=None)
+    meeting = service.create_meeting(topic=POOL_TOPIC, start_time=local, duration=60)
+    if not meeting or str(meeting.get('meeting_id')).startswith('manual_'):
+        return None
+    return PooledMeeting(
+        meeting_id=str(meeting['meeting_id']),
+        join_url=meeting['join_url'],
+        start_url=meeting['start_url'],
+        password=meeting.get('password') or '',
+        start_time=hour,
+    )
+
+
+def refill(days_ahead=None, limit=None, workers=None):
+    """
+    Create the meetings ``demand`` asks for, soonest hours first
+
+    Args:
+        limit: Create at most this many meetings (keeps each run within
+            Zoom's rate limits)
+
+    Returns:
+        int: Meetings added to the pool
+    """
+    hours = []
+    for hour, count in sorted(demand(days_ahead=days_ahead).items()):
+        hours.extend([hour] * count)
+    hours = hours[:limit or settings.ZOOM_POOL_MAX_CREATE]
+    if not hours:
+        return 0
+
+    service = ZoomService()
+    if not service.get_access_token():
+        return 0
+    with ThreadPoolExecutor(max_workers=workers or settings.ZOOM_POOL_WORKERS) as pool:
+        meetings = [meeting for meeting in pool.map(lambda hour: _create(service, hour), hours) if meeting]
+    PooledMeeting.objects.bulk_create(meetings)
+    return len(meetings)
+
+
+def collect_garbage(now=None, workers=None):
+    """
+    Delete pooled meetings whose hour passed without being assigned
+
+    The meetings are deleted from Zoom; rows of assigned meetings are
+    dropped once their hour is a day old.
+
+    Returns:
+        int: Unused meetings deleted
+    """
+    now = now or timezone.now()
+    PooledMeeting.objects.filter(status='assigned', start_time__lt=now - timedelta(days=1)).delete()
+
+    expired = list(PooledMeeting.objects.filter(status='available', start_time__lt=now - timedelta(hours=1)))
+    if not expired:
+        return 0
+    service = ZoomService()
+    with ThreadPoolExecutor(max_workers=workers or settings.ZOOM_POOL_WORKERS) as pool:
+        deleted = list(pool.map(lambda meeting: service.delete_meeting(meeting.meeting_id), expired))
+    gone = [meeting.pk for meeting, ok in zip(expired, deleted) if ok]
+    PooledMeeting.objects.filter(pk__in=gone, status='available').delete()
+    return len(gone)
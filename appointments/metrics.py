@@ -0,0 +1,183 @@
+"""
+Prometheus metrics
+
+Request latency and database queries per URL name are recorded by
+``MetricsMiddleware``; bookings, hourly-limit rejections, payment callback
+outcomes and Zoom/bKash calls are counted where they happen. ``/metrics``
+serves them in the text exposition format.
+
+Under gunicorn/uvicorn with several workers, set PROMETHEUS_MULTIPROC_DIR
+to an empty directory writable by all of them before they start: each
+worker then writes its samples to memory-mapped files there, and a scrape
+of any worker aggregates all of them. Appointment counts by status and the
+circuit breaker state are read from the database and the cache at scrape
+time, so they are shared without it.
+"""
+import os
+import time
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Histogram, generate_latest
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily
+from prometheus_client.multiprocess import MultiProcessCollector
+
+
+REQUEST_LATENCY = Histogram(
+    'http_request_duration_seconds', 'Request latency by URL name',
+    ['view', 'method', 'status'],
+)
+REQUEST_QUERIES = Histogram(
+    'http_request_db_queries', 'Database queries per request by URL name',
+    ['view'], buckets=(0, 1, 2, 5, 10, 20, 50, 100, 200, float('inf')),
+)
+APPOINTMENT_TRANSITIONS = Counter(
+    'appointment_status_changes', 'Appointments entering each status (bookings are "pending")',
+    ['status'],
+)
+HOURLY_LIMIT_REJECTIONS = Counter(
+    'appointment_hourly_limit_rejections', "Bookings and reschedules refused because the doctor's hour was full",
+    ['source'],
+)
+PAYMENT_CALLBACKS = Counter(
+    'payment_callbacks', 'bKash payment callback outcomes',
+    ['outcome'],
+)
+GATEWAY_LATENCY = Histogram(
+    'gateway_request_duration_seconds', 'Zoom and bKash API call latency',
+    ['service'],
+)
+GATEWAY_ERRORS = Counter(
+    'gateway_request_errors', 'Failed Zoom and bKash API calls (exceptions, HTTP 5xx and 429)',
+    ['service', 'error'],
+)
+
+# Query counter of the request being handled; sync_to_async copies the
+# context, so queries run by async views in worker threads are counted too
+_request_queries = ContextVar('request_queries', default=None)
+
+
+def count_queries(execute, sql, params, many, context):
+    """Database execute wrapper counting queries of the current request"""
+    queries = _request_queries.get()
+    if queries is not None:
+        queries[0] += 1
+    return execute(sql, params, many, context)
+
+
+def instrument(connection):
+    """Count the queries run on ``connection``"""
+    if count_queries not in connection.execute_wrappers:
+        connection.execute_wrappers.append(count_queries)
+
+
+def observe_gateway_call(service, duration, error=None):
+    """
+    Record one Zoom or bKash call
+
+    Args:
+        error: 'exception' or the failing HTTP status code, None on success
+    """
+    GATEWAY_LATENCY.labels(service).observe(duration)
+    if error:
+        GATEWAY_ERRORS.labels(service, str(error)).inc()
+
+
+class MetricsMiddleware:
+    """Time every request and count its queries, labelled with the URL name"""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        queries = [0]
+        token = _request_queries.set(queries)
+        started = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            _request_queries.reset(token)
+        self.observe(request, response, time.perf_counter() - started, queries[0])
+        return response
+
+    async def __acall__(self, request):
+        queries = [0]
+        token = _request_queries.set(queries)
+        started = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            _request_queries.reset(token)
+        self.observe(request, response, time.perf_counter() - started, queries[0])
+        return response
+
+    @staticmethod
+    def observe(request, response, duration, queries):
+        match = getattr(request, 'resolver_match', None)
+        view = match.view_name if match else 'unmatched'
+        REQUEST_LATENCY.labels(view, request.method, response.status_code).observe(duration)
+        REQUEST_QUERIES.labels(view).observe(queries)
+
+
+class StateCollector:
+    """Appointment counts and circuit breaker state, read at scrape time"""
+
+    def collect(self):
+        from . import counters
+        from .circuit_breaker import BREAKERS, CLOSED, HALF_OPEN, OPEN
+
+        appointments = GaugeMetricFamily('appointments', 'Appointments by status', labels=['status'])
+        for status, count in counters.status_counts().items():
+            appointments.add_metric([status], count)
+        yield appointments
+
+        state = GaugeMetricFamily(
+            'circuit_breaker_state', 'Circuit breaker state (1 for the current one)', labels=['breaker', 'state']
+        )
+        window = GaugeMetricFamily(
+            'circuit_breaker_window_calls', 'Calls in the rolling window', labels=['breaker', 'kind']
+        )
+        rejected = CounterMetricFamily(
+            'circuit_breaker_rejected', 'Calls refused while open', labels=['breaker']
+        )
+        transitions = CounterMetricFamily(
+            'circuit_breaker_transitions', 'Transitions into each state', labels=['breaker', 'state']
+        )
+        for name, breaker in BREAKERS.items():
+            stats = breaker.stats()
+            for value in (CLOSED, OPEN, HALF_OPEN):
+                state.add_metric([name, value], int(stats['state'] == value))
+            window.add_metric([name, 'total'], stats['window_calls'])
+            window.add_metric([name, 'failed'], stats['window_failures'])
+            window.add_metric([name, 'slow'], stats['window_slow_calls'])
+            rejected.add_metric([name], stats['rejected'])
+            for value, count in stats['transitions'].items():
+                transitions.add_metric([name, value], count)
+        yield from (state, window, rejected, transitions)
+
+
+STATE_REGISTRY = CollectorRegistry(auto_describe=False)
+STATE_REGISTRY.register(StateCollector())
+
+
+def exposition():
+    """
+    All metrics in the text exposition format
+
+    Returns:
+        tuple: ``(body, content_type)``
+    """
+    if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+        registry = CollectorRegistry()
+        MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return generate_latest(registry) + generate_latest(STATE_REGISTRY), CONTENT_TYPE_LATEST
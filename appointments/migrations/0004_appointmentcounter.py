@@ -0,0 +1,47 @@
+# Generated by Django 4.2.7 on 2026-10-19 02:46
+
+from django.db import migrations, models
+import django.db.models.deletion
+from collections import Counter
+
+
+def backfill_counters(apps, schema_editor):
+    Appointment = apps.get_model('appointments', 'Appointment')
+    AppointmentCounter = apps.get_model('appointments', 'AppointmentCounter')
+    counts = Counter()
+    rows = Appointment.objects.values_list('doctor_id', 'appointment_date', 'appointment_time', 'status')
+    for doctor_id, day, time, status in rows.iterator():
+        counts[(doctor_id, day, time.hour, status)] += 1
+    AppointmentCounter.objects.bulk_create(
+        [
+            AppointmentCounter(doctor_id=doctor_id, date=day, hour=hour, status=status, count=count)
+            for (doctor_id, day, hour, status), count in counts.items()
+        ],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('appointments', '0003_alter_appointment_unique_together'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AppointmentCounter',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('hour', models.PositiveSmallIntegerField()),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('confirmed', 'Confirmed'), ('completed', 'Completed'), ('cancelled', 'Cancelled')], max_length=20)),
+                ('count', models.IntegerField(default=0)),
+                ('doctor', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='appointment_counters', to='appointments.doctor')),
+            ],
+            options={
+                'ordering': ['-date', 'hour'],
+                'unique_together': {('doctor', 'date', 'hour', 'status')},
+            },
+        ),
+        migrations.RunPython(backfill_counters, migrations.RunPython.noop),
+    ]
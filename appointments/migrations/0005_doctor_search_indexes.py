@@ -0,0 +1,36 @@
+# Trigram indexes backing doctor search on PostgreSQL
+
+from django.db import migrations
+
+
+SEARCH_COLUMNS = ('name', 'specialization', 'qualification', 'bio')
+
+
+def create_trigram_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    for column in SEARCH_COLUMNS:
+        # Matches the UPPER(col::text) LIKE UPPER(...) SQL Django emits for icontains
+        schema_editor.execute(
+            f'CREATE INDEX IF NOT EXISTS appointments_doctor_{column}_trgm '
+            f'ON appointments_doctor USING gin ((UPPER({column}::text)) gin_trgm_ops)'
+        )
+
+
+def drop_trigram_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for column in SEARCH_COLUMNS:
+        schema_editor.execute(f'DROP INDEX IF EXISTS appointments_doctor_{column}_trgm')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('appointments', '0004_appointmentcounter'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_trigram_indexes, drop_trigram_indexes),
+    ]
@@ -0,0 +1,57 @@
+# Generated by Django 4.2.7 on 2026-10-19 02:47
+
+from django.db import migrations, models
+
+
+USER_SEARCH_COLUMNS = ('first_name', 'last_name')
+
+
+def create_user_name_indexes(apps, schema_editor):
+    # Admin searches patients by name with icontains; index those columns on PostgreSQL
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    for column in USER_SEARCH_COLUMNS:
+        schema_editor.execute(
+            f'CREATE INDEX IF NOT EXISTS appointments_auth_user_{column}_trgm '
+            f'ON auth_user USING gin ((UPPER({column}::text)) gin_trgm_ops)'
+        )
+
+
+def drop_user_name_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for column in USER_SEARCH_COLUMNS:
+        schema_editor.execute(f'DROP INDEX IF EXISTS appointments_auth_user_{column}_trgm')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('appointments', '0005_doctor_search_indexes'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='appointment',
+            index=models.Index(fields=['-appointment_date', '-appointment_time'], name='appointment_date_time_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='appointment',
+            index=models.Index(fields=['status', '-appointment_date'], name='appointment_status_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='payment',
+            index=models.Index(fields=['-created_at'], name='payment_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='payment',
+            index=models.Index(fields=['status', '-created_at'], name='payment_status_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='payment',
+            index=models.Index(fields=['bkash_transaction_id'], name='payment_bkash_trx_idx'),
+        ),
+        migrations.RunPython(create_user_name_indexes, drop_user_name_indexes),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 4.2.7 on 2026-10-19 03:27
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('appointments', '0011_zoomsynctask'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PooledMeeting',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('meeting_id', models.CharField(max_length=100, unique=True)),
+                ('join_url', models.URLField()),
+                ('start_url', models.URLField()),
+                ('password', models.CharField(blank=True, max_length=50)),
+                ('start_time', models.DateTimeField()),
+                ('status', models.CharField(choices=[('available', 'Available'), ('assigned', 'Assigned')], default='available', max_length=20)),
+                ('assigned_at', models.DateTimeField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('appointment', models.ForeignKey(blank=True, db_constraint=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='appointments.appointment')),
+            ],
+            options={
+                'ordering': ['start_time'],
+                'indexes': [models.Index(fields=['status', 'start_time'], name='pooled_meeting_status_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.7 on 2026-10-19 04:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('appointments', '0014_payment_claim_token'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='pooledmeeting',
+            name='claim_token',
+            field=models.UUIDField(blank=True, editable=False, null=True),
+        ),
+    ]
@@ -0,0 +1,60 @@
+# Generated by Django 4.2.7 on 2026-10-19 04:25
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+    # AppointmentCounter loses its hour here; its rows are rebuilt per day in
+    # 0017 and only then made unique on (doctor, date, status) in 0018
+
+    dependencies = [
+        ('appointments', '0015_pooledmeeting_claim_token'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='HourlyAppointmentCounter',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('hour', models.PositiveSmallIntegerField()),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('confirmed', 'Confirmed'), ('completed', 'Completed'), ('cancelled', 'Cancelled')], max_length=20)),
+                ('count', models.IntegerField(default=0)),
+                ('doctor', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='hourly_appointment_counters', to='appointments.doctor')),
+            ],
+            options={
+                'ordering': ['-date', 'hour'],
+                'unique_together': {('doctor', 'date', 'hour', 'status')},
+            },
+        ),
+        migrations.CreateModel(
+            name='AppointmentTotal',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('confirmed', 'Confirmed'), ('completed', 'Completed'), ('cancelled', 'Cancelled')], max_length=20)),
+                ('count', models.IntegerField(default=0)),
+                ('doctor', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='appointment_totals', to='appointments.doctor')),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='appointmenttotal',
+            constraint=models.UniqueConstraint(fields=('doctor', 'status'), name='appointment_total_doctor_status_uniq'),
+        ),
+        migrations.AddConstraint(
+            model_name='appointmenttotal',
+            constraint=models.UniqueConstraint(condition=models.Q(('doctor__isnull', True)), fields=('status',), name='appointment_total_overall_uniq'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='appointmentcounter',
+            unique_together=set(),
+        ),
+        migrations.RemoveField(
+            model_name='appointmentcounter',
+            name='hour',
+        ),
+        migrations.AlterModelOptions(
+            name='appointmentcounter',
+            options={'ordering': ['-date']},
+        ),
+    ]
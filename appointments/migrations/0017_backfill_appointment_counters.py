@@ -0,0 +1,59 @@
+from collections import Counter
+
+from django.db import migrations
+
+
+def backfill_counters(apps, schema_editor):
+    Appointment = apps.get_model('appointments', 'Appointment')
+    AppointmentCounter = apps.get_model('appointments', 'AppointmentCounter')
+    HourlyAppointmentCounter = apps.get_model('appointments', 'HourlyAppointmentCounter')
+    AppointmentTotal = apps.get_model('appointments', 'AppointmentTotal')
+
+    hourly, daily, totals = Counter(), Counter(), Counter()
+    rows = Appointment.objects.values_list('doctor_id', 'appointment_date', 'appointment_time', 'status')
+    for doctor_id, day, time, status in rows.iterator():
+        hourly[(doctor_id, day, time.hour, status)] += 1
+        daily[(doctor_id, day, status)] += 1
+        totals[(doctor_id, status)] += 1
+        totals[(None, status)] += 1
+
+    # The hourly rows left by 0016 are now duplicates per day
+    AppointmentCounter.objects.all().delete()
+    AppointmentCounter.objects.bulk_create(
+        [
+            AppointmentCounter(doctor_id=doctor_id, date=day, status=status, count=count)
+            for (doctor_id, day, status), count in daily.items()
+        ],
+        batch_size=1000,
+    )
+    HourlyAppointmentCounter.objects.bulk_create(
+        [
+            HourlyAppointmentCounter(doctor_id=doctor_id, date=day, hour=hour, status=status, count=count)
+            for (doctor_id, day, hour, status), count in hourly.items()
+        ],
+        batch_size=1000,
+    )
+    AppointmentTotal.objects.bulk_create(
+        [
+            AppointmentTotal(doctor_id=doctor_id, status=status, count=count)
+            for (doctor_id, status), count in totals.items()
+        ],
+        batch_size=1000,
+    )
+
+
+def drop_daily_counters(apps, schema_editor):
+    # The hour comes back without values; reconcile_appointment_counters
+    # rebuilds the hourly rows once migrated back
+    apps.get_model('appointments', 'AppointmentCounter').objects.all().delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('appointments', '0016_hourlyappointmentcounter_appointmenttotal'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_counters, drop_daily_counters),
+    ]
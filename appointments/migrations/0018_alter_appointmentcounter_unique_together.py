@@ -0,0 +1,17 @@
+# Generated by Django 4.2.7 on 2026-10-19 04:25
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('appointments', '0017_backfill_appointment_counters'),
+    ]
+
+    operations = [
+        migrations.AlterUniqueTogether(
+            name='appointmentcounter',
+            unique_together={('doctor', 'date', 'status')},
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 4.2.7 on 2026-10-19 04:29
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('appointments', '0018_alter_appointmentcounter_unique_together'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='pooledmeeting',
+            name='claim_token',
+        ),
+    ]
@@ -84,6 +84,13 @@ class Appointment(models.Model):
 
     class Meta:
         ordering = ['-appointment_date', '-appointment_time']
+        indexes = [
+            models.Index(fields=['-appointment_date', '-appointment_time'], name='appointment_date_time_idx'),
+            models.Index(fields=['status', '-appointment_date'], name='appointment_status_date_idx'),
+            # Delta sync: rows changed since a (updated_at, id) cursor
+            models.Index(fields=['patient', 'updated_at', 'id'], name='appointment_patient_sync_idx'),
+            models.Index(fields=['doctor', 'updated_at', 'id'], name='appointment_doctor_sync_idx'),
+        ]
 
 
 class Payment(models.Model):
@@ -113,6 +120,9 @@ class Payment(models.Model):
     
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
     payment_date = models.DateTimeField(null=True, blank=True)
+    # Set by the UPDATE that completes the payment, so that call can read
+    # back exactly the rows it claimed (see transitions.complete_payments)
+    claim_token = models.UUIDField(null=True, blank=True, editable=False)
     
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
@@ -122,6 +132,11 @@ class Payment(models.Model):
 
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['-created_at'], name='payment_created_idx'),
+            models.Index(fields=['status', '-created_at'], name='payment_status_created_idx'),
+            models.Index(fields=['bkash_transaction_id'], name='payment_bkash_trx_idx'),
+        ]
 
 
 class TimeSlot(models.Model):
@@ -148,3 +163,268 @@ class TimeSlot(models.Model):
     class Meta:
         ordering = ['weekday', 'start_time']
         unique_together = ['doctor', 'weekday', 'start_time']
+
+
+class AppointmentCounter(models.Model):
+    """Denormalized appointment counts per doctor, day and status"""
+    doctor = models.ForeignKey(Doctor, on_delete=models.CASCADE, related_name='appointment_counters')
+    date = models.DateField()
+    status = models.CharField(max_length=20, choices=Appointment.STATUS_CHOICES)
+    count = models.IntegerField(default=0)
+
+    def __str__(self):
+        return f"Dr. {self.doctor_id} - {self.date} {self.status}: {self.count}"
+
+    class Meta:
+        ordering = ['-date']
+        unique_together = ['doctor', 'date', 'status']
+
+
+class HourlyAppointmentCounter(models.Model):
+    """Denormalized appointment counts per doctor, day, hour and status, for hourly capacity"""
+    doctor = models.ForeignKey(Doctor, on_delete=models.CASCADE, related_name='hourly_appointment_counters')
+    date = models.DateField()
+    hour = models.PositiveSmallIntegerField()
+    status = models.CharField(max_length=20, choices=Appointment.STATUS_CHOICES)
+    count = models.IntegerField(default=0)
+
+    def __str__(self):
+        return f"Dr. {self.doctor_id} - {self.date} {self.hour:02d}:00 {self.status}: {self.count}"
+
+    class Meta:
+        ordering = ['-date', 'hour']
+        unique_together = ['doctor', 'date', 'hour', 'status']
+
+
+class AppointmentTotal(models.Model):
+    """All-time appointment counts per doctor and status; rows without a doctor count all doctors"""
+    doctor = models.ForeignKey(
+        Doctor, on_delete=models.CASCADE, null=True, blank=True, related_name='appointment_totals'
+    )
+    status = models.CharField(max_length=20, choices=Appointment.STATUS_CHOICES)
+    count = models.IntegerField(default=0)
+
+    def __str__(self):
+        return f"{f'Dr. {self.doctor_id}' if self.doctor_id else 'All doctors'} - {self.status}: {self.count}"
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['doctor', 'status'], name='appointment_total_doctor_status_uniq'),
+            # NULLs never conflict in a unique index, so the overall rows need their own
+            models.UniqueConstraint(
+                fields=['status'], condition=models.Q(doctor__isnull=True), name='appointment_total_overall_uniq'
+            ),
+        ]
+
+
+class Notification(models.Model):
+    """Outgoing email waiting in the outbox for the notification worker"""
+    KIND_CHOICES = [
+        ('appointment_booked', 'Appointment Booked'),
+        ('appointment_confirmed', 'Appointment Confirmed'),
+        ('zoom_link_ready', 'Zoom Link Ready'),
+        ('appointment_cancelled', 'Appointment Cancelled'),
+        ('appointment_reminder', 'Appointment Reminder'),
+    ]
+
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('sent', 'Sent'),
+        ('failed', 'Failed'),
+    ]
+
+    # No database constraint: the appointment table may be partitioned,
+    # and PostgreSQL cannot reference a partitioned table by id alone
+    appointment = models.ForeignKey(
+        Appointment, on_delete=models.CASCADE, related_name='notifications',
+        null=True, blank=True, db_constraint=False
+    )
+    kind = models.CharField(max_length=30, choices=KIND_CHOICES)
+    recipient = models.EmailField()
+    subject = models.CharField(max_length=200)
+    body = models.TextField()
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
+    attempts = models.PositiveSmallIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.get_kind_display()} to {self.recipient} - {self.status}"
+
+    class Meta:
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['status', 'next_attempt_at'], name='notification_due_idx'),
+        ]
+
+
+class Reminder(models.Model):
+    """A reminder due before a confirmed appointment, waiting for the reminder worker"""
+    CHANNEL_CHOICES = [
+        ('email', 'Email'),
+        ('sms', 'SMS'),
+    ]
+
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('sent', 'Sent'),
+        ('failed', 'Failed'),
+        ('skipped', 'Skipped'),
+    ]
+
+    # No database constraint: the appointment table may be partitioned
+    appointment = models.ForeignKey(
+        Appointment, on_delete=models.CASCADE, related_name='reminders', db_constraint=False
+    )
+    channel = models.CharField(max_length=10, choices=CHANNEL_CHOICES)
+    lead_minutes = models.PositiveIntegerField(help_text='Minutes before the appointment starts')
+    due_at = models.DateTimeField()
+    # due_at floored to REMINDER_BUCKET_SECONDS; the worker drains one bucket at a time
+    bucket = models.BigIntegerField()
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
+    attempts = models.PositiveSmallIntegerField(default=0)
+    last_error = models.TextField(blank=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.get_channel_display()} reminder {self.lead_minutes} min before appointment {self.appointment_id} - {self.status}"
+
+    class Meta:
+        ordering = ['due_at']
+        indexes = [
+            models.Index(fields=['status', 'bucket'], name='reminder_due_bucket_idx'),
+            models.Index(fields=['appointment', 'status'], name='reminder_appointment_idx'),
+        ]
+
+
+class Refund(models.Model):
+    """A refund of a cancelled appointment's payment, waiting for the refund worker"""
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('processing', 'Processing'),
+        ('refunded', 'Refunded'),
+        ('failed', 'Failed'),
+    ]
+
+    payment = models.ForeignKey(Payment, on_delete=models.CASCADE, related_name='refunds')
+    # One refund per payment: enqueueing again returns the existing row
+    idempotency_key = models.CharField(max_length=64, unique=True)
+    amount = models.DecimalField(max_digits=10, decimal_places=2)
+    reason = models.CharField(max_length=255)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
+    attempts = models.PositiveSmallIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True)
+    refund_trx_id = models.CharField(max_length=100, blank=True)
+    refunded_at = models.DateTimeField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"Refund of {self.amount} for payment {self.payment_id} - {self.status}"
+
+    class Meta:
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['status', 'next_attempt_at'], name='refund_due_idx'),
+        ]
+
+
+class ZoomSyncTask(models.Model):
+    """A change to push to an appointment's Zoom meeting, waiting for the Zoom sync worker"""
+    ACTION_CHOICES = [
+        ('update', 'Update'),
+        ('delete', 'Delete'),
+    ]
+
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('processing', 'Processing'),
+        ('done', 'Done'),
+        ('failed', 'Failed'),
+    ]
+
+    # No database constraint: the appointment table may be partitioned
+    appointment = models.ForeignKey(
+        Appointment, on_delete=models.CASCADE, related_name='zoom_sync_tasks', db_constraint=False
+    )
+    meeting_id = models.CharField(max_length=100)
+    action = models.CharField(max_length=10, choices=ACTION_CHOICES)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
+    attempts = models.PositiveSmallIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True)
+    processed_at = models.DateTimeField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.get_action_display()} Zoom meeting {self.meeting_id} - {self.status}"
+
+    class Meta:
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['status', 'next_attempt_at'], name='zoom_sync_due_idx'),
+            models.Index(fields=['meeting_id', 'status'], name='zoom_sync_meeting_idx'),
+        ]
+
+
+class PooledMeeting(models.Model):
+    """A Zoom meeting created ahead of time, waiting to be assigned to a confirmed appointment"""
+    STATUS_CHOICES = [
+        ('available', 'Available'),
+        ('assigned', 'Assigned'),
+    ]
+
+    meeting_id = models.CharField(max_length=100, unique=True)
+    join_url = models.URLField()
+    start_url = models.URLField()
+    password = models.CharField(max_length=50, blank=True)
+    # Start of the hour the meeting was created for
+    start_time = models.DateTimeField()
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='available')
+    # No database constraint: the appointment table may be partitioned
+    appointment = models.ForeignKey(
+        Appointment, on_delete=models.SET_NULL, related_name='+', null=True, blank=True, db_constraint=False
+    )
+    assigned_at = models.DateTimeField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"Pooled Zoom meeting {self.meeting_id} at {self.start_time:%Y-%m-%d %H:%M} - {self.status}"
+
+    class Meta:
+        ordering = ['start_time']
+        indexes = [
+            models.Index(fields=['status', 'start_time'], name='pooled_meeting_status_idx'),
+        ]
+
+
+class SlowQuery(models.Model):
+    """Slow queries of one SQL fingerprint, aggregated by the slow-query log (see ``slow_queries``)"""
+    fingerprint = models.CharField(max_length=32, unique=True)
+    # The SQL with literals and IN-lists normalized away
+    sql = models.TextField()
+    calls = models.PositiveIntegerField(default=0)
+    total_ms = models.FloatField(default=0)
+    max_ms = models.FloatField(default=0)
+    # Project code and view of the latest slow call
+    caller = models.CharField(max_length=255, blank=True)
+    view = models.CharField(max_length=200, blank=True)
+    # Latest sampled EXPLAIN (ANALYZE, BUFFERS) output (PostgreSQL only)
+    explain = models.TextField(blank=True)
+    explained_at = models.DateTimeField(null=True, blank=True)
+    first_seen = models.DateTimeField(auto_now_add=True)
+    last_seen = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.fingerprint}: {self.calls} slow call(s), {self.total_ms:.0f} ms"
+
+    @property
+    def avg_ms(self):
+        return self.total_ms / self.calls if self.calls else 0
+
+    class Meta:
+        ordering = ['-total_ms']
+        verbose_name_plural = 'slow queries'
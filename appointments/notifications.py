@@ -0,0 +1,164 @@
+"""
+Email notification outbox
+
+Views and signal handlers only insert Notification rows, inside the same
+transaction as the change that caused them. The ``send_notifications``
+management command drains the outbox in batches over one reused SMTP
+connection, retrying failures with exponential backoff. Mail is never
+sent inside the request cycle.
+"""
+import smtplib
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.db import transaction
+from django.utils import timezone
+
+from .models import Notification
+
+
+def _appointment_when(appointment):
+    return f"{appointment.appointment_date:%d %B %Y} at {appointment.appointment_time:%I:%M %p}"
+
+
+def _build_message(kind, appointment):
+    """Return ``(subject, body)`` for a notification kind"""
+    patient_name = appointment.patient.user.get_full_name() or appointment.patient.user.username
+    doctor = f"Dr. {appointment.doctor.name}"
+    when = _appointment_when(appointment)
+
+    if kind == 'appointment_booked':
+        return (
+            f"Appointment booked with {doctor}",
+            f"Dear {patient_name},\n\nYour appointment with {doctor} on {when} has been booked. "
+            f"Please complete the payment to confirm it.\n"
+        )
+    if kind == 'appointment_confirmed':
+        return (
+            f"Appointment confirmed with {doctor}",
+            f"Dear {patient_name},\n\nYour appointment with {doctor} on {when} is confirmed.\n"
+        )
+    if kind == 'zoom_link_ready':
+        password = f"\nPassword: {appointment.zoom_password}" if appointment.zoom_password else ''
+        return (
+            f"Zoom link for your appointment with {doctor}",
+            f"Dear {patient_name},\n\nYour video consultation with {doctor} on {when} is ready.\n\n"
+            f"Join URL: {appointment.zoom_join_url}{password}\n"
+        )
+    if kind == 'appointment_cancelled':
+        return (
+            f"Appointment cancelled with {doctor}",
+            f"Dear {patient_name},\n\nYour appointment with {doctor} on {when} has been cancelled.\n"
+        )
+    if kind == 'appointment_reminder':
+        join = f"\nJoin URL: {appointment.zoom_join_url}\n" if appointment.zoom_join_url else ''
+        return (
+            f"Reminder: appointment with {doctor}",
+            f"Dear {patient_name},\n\nThis is a reminder of your appointment with {doctor} on {when}.\n{join}"
+        )
+    raise ValueError(f"Unknown notification kind: {kind}")
+
+
+def enqueue(kind, appointment):
+    """
+    Queue an email about ``appointment`` for the patient
+
+    Returns:
+        Notification: The queued row, or None when the patient has no email
+    """
+    recipient = appointment.patient.user.email
+    if not recipient:
+        return None
+    subject, body = _build_message(kind, appointment)
+    return Notification.objects.create(
+        appointment=appointment,
+        kind=kind,
+        recipient=recipient,
+        subject=subject,
+        body=body,
+    )
+
+
+def retry_delay(attempts):
+    """Exponential backoff: 1, 2, 4, ... minutes, capped at one hour"""
+    return timedelta(minutes=min(2 ** (attempts - 1), 60))
+
+
+def _record_failure(notification, error, max_attempts):
+    notification.attempts += 1
+    notification.last_error = str(error)[:1000]
+    if notification.attempts >= max_attempts:
+        notification.status = 'failed'
+    else:
+        notification.next_attempt_at = timezone.now() + retry_delay(notification.attempts)
+
+
+def send_batch(batch_size=None, max_attempts=None, connection=None):
+    """
+    Send one batch of due notifications over a single SMTP connection
+
+    Due rows are claimed with ``SELECT ... FOR UPDATE SKIP LOCKED`` so
+    several workers can drain the outbox side by side. A message the server
+    rejects is retried later with backoff; if the connection drops and
+    cannot be reopened, the rest of the batch is left for the next run.
+
+    Returns:
+        tuple: ``(sent, failed)`` counts for this batch
+
+    Raises:
+        OSError, smtplib.SMTPException: If the SMTP server is unreachable
+    """
+    batch_size = batch_size or settings.NOTIFICATION_BATCH_SIZE
+    max_attempts = max_attempts or settings.NOTIFICATION_MAX_ATTEMPTS
+
+    with transaction.atomic():
+        notifications = list(
+            Notification.objects.filter(status='pending', next_attempt_at__lte=timezone.now())
+            .order_by('next_attempt_at')
+            .select_for_update(skip_locked=True)[:batch_size]
+        )
+        if not notifications:
+            return 0, 0
+
+        connection = connection or get_connection(fail_silently=False, timeout=settings.EMAIL_TIMEOUT)
+        connection.open()
+        sent = failed = 0
+        processed = []
+        try:
+            for notification in notifications:
+                message = EmailMessage(
+                    subject=notification.subject,
+                    body=notification.body,
+                    from_email=settings.DEFAULT_FROM_EMAIL,
+                    to=[notification.recipient],
+                    connection=connection,
+                )
+                processed.append(notification)
+                try:
+                    message.send()
+                except (smtplib.SMTPServerDisconnected, OSError) as e:
+                    _record_failure(notification, e, max_attempts)
+                    failed += 1
+                    connection.close()
+                    try:
+                        connection.open()
+                    except (smtplib.SMTPException, OSError):
+                        break
+                except smtplib.SMTPException as e:
+                    _record_failure(notification, e, max_attempts)
+                    failed += 1
+                else:
+                    notification.attempts += 1
+                    notification.status = 'sent'
+                    notification.sent_at = timezone.now()
+                    notification.last_error = ''
+                    sent += 1
+        finally:
+            connection.close()
+
+        Notification.objects.bulk_update(
+            processed,
+            ['status', 'attempts', 'next_attempt_at', 'last_error', 'sent_at'],
+        )
+    return sent, failed
@@ -0,0 +1,256 @@
+"""
+Monthly range partitioning of the Appointment table (PostgreSQL only)
+
+The appointment table can optionally be converted into a declaratively
+partitioned table, ranged by month on ``appointment_date``. Django keeps
+treating ``id`` as the primary key; on the database side the key becomes
+``(id, appointment_date)`` because PostgreSQL requires the partition key to
+be part of every unique constraint.
+"""
+import re
+from datetime import date
+
+from django.db import connection as default_connection, transaction
+
+from .models import Appointment
+
+
+PARTITION_NAME_RE = re.compile(r'_p(\d{4})(\d{2})$')
+
+
+def table_name():
+    return Appointment._meta.db_table
+
+
+def partition_name(month_start):
+    """Name of the partition holding the month that starts at ``month_start``"""
+    return f"{table_name()}_p{month_start.year:04d}{month_start.month:02d}"
+
+
+def month_start(value):
+    return value.replace(day=1)
+
+
+def add_months(value, months):
+    """Return the first day of the month ``months`` after ``value``'s month"""
+    index = value.year * 12 + (value.month - 1) + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def require_postgresql(connection):
+    if connection.vendor != 'postgresql':
+        raise RuntimeError(
+            f"Appointment partitioning requires PostgreSQL (current backend: {connection.vendor})"
+        )
+
+
+def is_partitioned(connection=None):
+    """Check whether the appointment table is already a partitioned table"""
+    connection = connection or default_connection
+    if connection.vendor != 'postgresql':
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT 1 FROM pg_partitioned_table pt "
+            "JOIN pg_class c ON c.oid = pt.partrelid "
+            "WHERE c.relname = %s AND pg_table_is_visible(c.oid)",
+            [table_name()],
+        )
+        return cursor.fetchone() is not None
+
+
+def list_partitions(connection=None):
+    """
+    List attached monthly partitions
+
+    Returns:
+        list: ``(name, month_start)`` tuples ordered by month. The default
+        partition is not included.
+    """
+    connection = connection or default_connection
+    require_postgresql(connection)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT child.relname FROM pg_inherits i "
+            "JOIN pg_class parent ON parent.oid = i.inhparent "
+            "JOIN pg_class child ON child.oid = i.inhrelid "
+            "WHERE parent.relname = %s AND pg_table_is_visible(parent.oid)",
+            [table_name()],
+        )
+        names = [row[0] for row in cursor.fetchall()]
+
+    partitions = []
+    for name in names:
+        match = PARTITION_NAME_RE.search(name)
+        if match:
+            partitions.append((name, date(int(match.group(1)), int(match.group(2)), 1)))
+    return sorted(partitions, key=lambda item: item[1])
+
+
+def create_partition(cursor, month):
+    """Create the partition for ``month`` if it does not exist yet"""
+    quote = cursor.db.ops.quote_name
+    start = month_start(month)
+    end = add_months(start, 1)
+    cursor.execute(
+        f"CREATE TABLE IF NOT EXISTS {quote(partition_name(start))} "
+        f"PARTITION OF {quote(table_name())} "
+        f"FOR VALUES FROM ('{start.isoformat()}') TO ('{end.isoformat()}')"
+    )
+
+
+def ensure_partitions(start, months_ahead, connection=None):
+    """
+    Create monthly partitions from ``start``'s month up to ``months_ahead``
+    months later (inclusive)
+
+    Returns:
+        list: Names of the partitions that now exist for the range
+    """
+    connection = connection or default_connection
+    require_postgresql(connection)
+    first = month_start(start)
+    names = []
+    with transaction.atomic(using=connection.alias), connection.cursor() as cursor:
+        for offset in range(months_ahead + 1):
+            month = add_months(first, offset)
+            create_partition(cursor, month)
+            names.append(partition_name(month))
+    return names
+
+
+def detach_partitions(before, archive_schema=None, drop=False, connection=None):
+    """
+    Detach every monthly partition that ends on or before ``before``
+
+    Detached partitions become ordinary tables. They are moved into
+    ``archive_schema`` when given, or dropped when ``drop`` is set.
+
+    Returns:
+        list: Names of the detached partitions
+    """
+    connection = connection or default_connection
+    require_postgresql(connection)
+    quote = connection.ops.quote_name
+    cutoff = month_start(before)
+    detached = []
+    with transaction.atomic(using=connection.alias), connection.cursor() as cursor:
+        if archive_schema and not drop:
+            cursor.execute(f"CREATE SCHEMA IF NOT EXISTS {quote(archive_schema)}")
+        for name, month in list_partitions(connection):
+            if add_months(month, 1) > cutoff:
+                continue
+            cursor.execute(f"ALTER TABLE {quote(table_name())} DETACH PARTITION {quote(name)}")
+            if drop:
+                cursor.execute(f"DROP TABLE {quote(name)}")
+            elif archive_schema:
+                cursor.execute(f"ALTER TABLE {quote(name)} SET SCHEMA {quote(archive_schema)}")
+            detached.append(name)
+    return detached
+
+
+def convert_to_partitioned(months_ahead=3, connection=None):
+    """
+    Rebuild the appointment table as a table partitioned by month
+
+    Rows are copied into the new table inside a single transaction.
+    Foreign keys that point *to* the appointment table (for example from
+    ``Payment``) are dropped, because PostgreSQL cannot reference a
+    partitioned table through ``id`` alone; the ORM relations keep working.
+
+    Returns:
+        dict: Summary with the created partitions and dropped constraints
+    """
+    connection = connection or default_connection
+    require_postgresql(connection)
+    if is_partitioned(connection):
+        raise RuntimeError(f"{table_name()} is already partitioned")
+
+    quote = connection.ops.quote_name
+    table = table_name()
+    legacy = f"{table}_legacy"
+    sequence = f"{table}_id_seq"
+    doctor_table = Appointment._meta.get_field('doctor').related_model._meta.db_table
+    patient_table = Appointment._meta.get_field('patient').related_model._meta.db_table
+
+    with transaction.atomic(using=connection.alias), connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT con.conname, src.relname FROM pg_constraint con "
+            "JOIN pg_class src ON src.oid = con.conrelid "
+            "WHERE con.contype = 'f' AND con.confrelid = %s::regclass",
+            [table],
+        )
+        inbound = cursor.fetchall()
+        for name, source in inbound:
+            cursor.execute(f"ALTER TABLE {quote(source)} DROP CONSTRAINT {quote(name)}")
+
+        cursor.execute("SELECT MIN(appointment_date), MAX(appointment_date) FROM " + quote(table))
+        first_date, last_date = cursor.fetchone()
+
+        cursor.execute(f"ALTER TABLE {quote(table)} RENAME TO {quote(legacy)}")
+        cursor.execute(
+            f"CREATE TABLE {quote(table)} "
+            f"(LIKE {quote(legacy)} INCLUDING DEFAULTS INCLUDING CONSTRAINTS) "
+            f"PARTITION BY RANGE (appointment_date)"
+        )
+        cursor.execute(f"CREATE SEQUENCE IF NOT EXISTS {quote(sequence + '_p')}")
+        cursor.execute(
+            f"ALTER TABLE {quote(table)} ALTER COLUMN id "
+            f"SET DEFAULT nextval('{sequence}_p')"
+        )
+        cursor.execute(f"ALTER SEQUENCE {quote(sequence + '_p')} OWNED BY {quote(table)}.id")
+        cursor.execute(
+            f"ALTER TABLE {quote(table)} ADD CONSTRAINT {quote(table + '_pkey_p')} "
+            f"PRIMARY KEY (id, appointment_date)"
+        )
+        cursor.execute(
+            f"ALTER TABLE {quote(table)} ADD CONSTRAINT {quote(table + '_doctor_fk')} "
+            f"FOREIGN KEY (doctor_id) REFERENCES {quote(doctor_table)} (id) "
+            f"DEFERRABLE INITIALLY DEFERRED"
+        )
+        cursor.execute(
+            f"ALTER TABLE {quote(table)} ADD CONSTRAINT {quote(table + '_patient_fk')} "
+            f"FOREIGN KEY (patient_id) REFERENCES {quote(patient_table)} (id) "
+            f"DEFERRABLE INITIALLY DEFERRED"
+        )
+        cursor.execute(f"CREATE INDEX ON {quote(table)} (doctor_id, appointment_date)")
+        cursor.execute(f"CREATE INDEX ON {quote(table)} (patient_id, appointment_date)")
+
+        today = date.today()
+        first_month = month_start(first_date or today)
+        last_month = add_months(month_start(max(last_date or today, today)), months_ahead)
+        month = first_month
+        created = []
+        while month <= last_month:
+            create_partition(cursor, month)
+            created.append(partition_name(month))
+            month = add_months(month, 1)
+        cursor.execute(
+            f"CREATE TABLE IF NOT EXISTS {quote(table + '_default')} "
+            f"PARTITION OF {quote(table)} DEFAULT"
+        )
+
+        cursor.execute(f"INSERT INTO {quote(table)} SELECT * FROM {quote(legacy)}")
+        cursor.execute(
+            f"SELECT setval('{sequence}_p', COALESCE((SELECT MAX(id) FROM {quote(table)}), 0) + 1, false)"
+        )
+        cursor.execute(f"DROP TABLE {quote(legacy)} CASCADE")
+        cursor.execute(
+            f"ALTER TABLE {quote(table)} RENAME CONSTRAINT {quote(table + '_pkey_p')} "
+            f"TO {quote(table + '_pkey')}"
+        )
+        cursor.execute(f"ALTER SEQUENCE {quote(sequence + '_p')} RENAME TO {quote(sequence)}")
+        cursor.execute(
+            f"ALTER TABLE {quote(table)} ALTER COLUMN id SET DEFAULT nextval('{sequence}')"
+        )
+
+        # Index names are schema-wide, so the model's Meta indexes can only
+        # be recreated once the legacy table (which still owns them) is gone
+        with connection.schema_editor(atomic=False) as editor:
+            for index in Appointment._meta.indexes:
+                editor.add_index(Appointment, index)
+
+    return {
+        'partitions': created,
+        'dropped_constraints': [f"{source}.{name}" for name, source in inbound],
+    }
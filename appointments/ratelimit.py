@@ -0,0 +1,156 @@
+"""
+Per-route rate limiting
+
+``rate_limit(name)`` throttles a view per signed-in user, or per client IP
+for anonymous requests, at the rate set in ``RATE_LIMITS[name]`` (e.g.
+``'10/m'``: 10 requests a minute, allowing bursts of up to 10).
+
+Counters live in the default cache, so all workers sharing it enforce one
+limit. Each request costs one atomic ``incr`` on the counter of the current
+period plus a read of the previous one. The previous period's count decays
+linearly over the current period, so the allowance refills continuously,
+like a token bucket, without a read-modify-write race. Rejected requests get
+a 429 with ``Retry-After``. Async views count through the cache's async
+methods (``ahit``), so a networked cache never blocks the event loop.
+"""
+import math
+import time
+from functools import lru_cache, wraps
+
+from asgiref.sync import iscoroutinefunction
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse, JsonResponse
+
+
+PERIODS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}
+
+
+@lru_cache(maxsize=None)
+def parse_rate(rate):
+    """
+    Parse ``'<requests>/<period>'``, the period being s, m, h or d,
+    optionally with a count (``'100/5m'``)
+
+    Returns:
+        tuple: ``(requests, period_seconds)``
+    """
+    requests, period = rate.split('/')
+    multiplier = int(period[:-1] or 1)
+    return int(requests), multiplier * PERIODS[period[-1]]
+
+
+def _keys(name, ident, window):
+    """Counter keys of the current and the previous period"""
+    return f'ratelimit:{name}:{ident}:{int(window)}', f'ratelimit:{name}:{ident}:{int(window) - 1}'
+
+
+def _retry_after(limit, period, elapsed, count, previous):
+    """Seconds until the next request would be allowed, 0 if this one is"""
+    if previous * (1 - elapsed / period) + count <= limit:
+        return 0
+    # The previous period's share drops below the remaining allowance after:
+    return max(1, math.ceil(period * (1 - (limit - count) / previous) - elapsed))
+
+
+def hit(name, ident, rate, now=None):
+    """
+    Count one request of ``ident`` against the ``name`` limit
+
+    Returns:
+        int: 0 if allowed, otherwise seconds until the next request would be
+    """
+    limit, period = parse_rate(rate)
+    window, elapsed = divmod(now or time.time(), period)
+    key, previous_key = _keys(name, ident, window)
+    try:
+        count = cache.incr(key)
+    except ValueError:
+        count = 1 if cache.add(key, 1, timeout=2 * period) else cache.incr(key)
+
+    if count > limit:
+        return max(1, math.ceil(period - elapsed))
+    return _retry_after(limit, period, elapsed, count, cache.get(previous_key, 0))
+
+
+async def ahit(name, ident, rate, now=None):
+    """Async version of ``hit``, for async views: the cache round trips don't block the event loop"""
+    limit, period = parse_rate(rate)
+    window, elapsed = divmod(now or time.time(), period)
+    key, previous_key = _keys(name, ident, window)
+    try:
+        count = await cache.aincr(key)
+    except ValueError:
+        count = 1 if await cache.aadd(key, 1, timeout=2 * period) else await cache.aincr(key)
+
+    if count > limit:
+        return max(1, math.ceil(period - elapsed))
+    return _retry_after(limit, period, elapsed, count, await cache.aget(previous_key, 0))
+
+
+def _client_ip(request):
+    """
+    Address of the client, as seen by the outermost trusted proxy
+
+    Each of the RATE_LIMIT_TRUSTED_PROXIES proxies appends the address it
+    was connected from to X-Forwarded-For; anything further left came from
+    the client and can be forged, so it is skipped.
+    """
+    proxies = settings.RATE_LIMIT_TRUSTED_PROXIES
+    if proxies:
+        hops = [hop.strip() for hop in request.META.get('HTTP_X_FORWARDED_FOR', '').split(',') if hop.strip()]
+        if len(hops) >= proxies:
+            return hops[-proxies]
+    return request.META.get('REMOTE_ADDR') or 'unknown'
+
+
+def _too_many_requests(retry_after, json):
+    message = 'Too many requests. Please try again later.'
+    if json:
+        response = JsonResponse({'error': message}, status=429)
+    else:
+        response = HttpResponse(message, status=429, content_type='text/plain')
+    response['Retry-After'] = str(retry_after)
+    return response
+
+
+def rate_limit(name, methods=None, json=False):
+    """
+    Throttle a sync or async view at ``RATE_LIMITS[name]``
+
+    Args:
+        name: Key into RATE_LIMITS and part of the counter key
+        methods: Only count these HTTP methods (default: all)
+        json: Answer 429s with a JSON error instead of plain text
+
+    Async views are keyed per user only once the user was resolved (put
+    ``async_login_required`` outside this decorator); otherwise per IP, as
+    resolving it would mean a sync database hop on every request.
+    """
+    def decorator(view_func):
+        def applies(request):
+            return settings.RATE_LIMIT_ENABLED and not (methods and request.method not in methods)
+
+        def ident(request, user):
+            return f'user:{user.pk}' if user is not None and user.is_authenticated else f'ip:{_client_ip(request)}'
+
+        if iscoroutinefunction(view_func):
+            @wraps(view_func)
+            async def wrapper(request, *args, **kwargs):
+                if applies(request):
+                    # Set by AuthenticationMiddleware's lazy user once it was resolved
+                    user = getattr(request, '_cached_user', None)
+                    retry_after = await ahit(name, ident(request, user), settings.RATE_LIMITS[name])
+                    if retry_after:
+                        return _too_many_requests(retry_after, json)
+                return await view_func(request, *args, **kwargs)
+        else:
+            @wraps(view_func)
+            def wrapper(request, *args, **kwargs):
+                if applies(request):
+                    retry_after = hit(name, ident(request, getattr(request, 'user', None)), settings.RATE_LIMITS[name])
+                    if retry_after:
+                        return _too_many_requests(retry_after, json)
+                return view_func(request, *args, **kwargs)
+        return wrapper
+    return decorator
@@ -0,0 +1,150 @@
+"""
+Resolve bKash payments left pending, e.g. by a dropped payment callback
+
+Stale pending payments are read in keyset chunks. A bounded thread pool
+queries their status from bKash through one shared grant token and a shared
+rate limiter. Each chunk's results are applied with the same bulk
+transitions the payment callback uses (``transitions.complete_payments`` /
+``fail_payments``).
+"""
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import Q
+from django.utils import timezone
+
+from .bkash_service import BkashPaymentService, SharedToken
+from .circuit_breaker import OPEN, CircuitOpenError, bkash_breaker
+from .models import Payment
+from .transitions import complete_payments, fail_payments
+
+
+# bKash transaction states that will never complete
+FAILED_STATES = {'Cancelled', 'Failed', 'Expired', 'Declined'}
+
+
+class RateLimiter:
+    """Spaces calls at least ``1 / rate`` seconds apart across threads"""
+
+    def __init__(self, rate):
+        self.interval = 1 / rate if rate else 0
+        self._next = time.monotonic()
+        self._lock = threading.Lock()
+
+    def wait(self):
+        if not self.interval:
+            return
+        with self._lock:
+            now = time.monotonic()
+            slot = max(self._next, now)
+            self._next = slot + self.interval
+        time.sleep(slot - now)
+
+
+def classify(result, created_at, expire_before):
+    """
+    Returns:
+        str: 'completed' or 'failed', or None to leave the payment pending
+    """
+    if not result or result.get('statusCode') != '0000':
+        return None
+    status = result.get('transactionStatus')
+    if status == 'Completed' and result.get('trxID'):
+        return 'completed'
+    if status in FAILED_STATES or (status == 'Initiated' and created_at < expire_before):
+        return 'failed'
+    return None
+
+
+def stale_payments(stale_before):
+    """Pending bKash payments created before ``stale_before`` (simulated TEST_ ones excluded)"""
+    return (
+        Payment.objects
+        .filter(status='pending', payment_method='bkash', created_at__lt=stale_before, payment_id__isnull=False)
+        .exclude(payment_id__startswith='TEST_')
+    )
+
+
+def reconcile(stale_minutes=None, expire_hours=None, chunk_size=None, workers=None, rate_limit=None,
+              limit=None, now=None, progress=None):
+    """
+    Query bKash for every stale pending payment and apply the results
+
+    Args:
+        stale_minutes: Only payments pending for longer than this
+        expire_hours: 'Initiated' payments older than this are failed
+        chunk_size: Payments read, queried and updated per round
+        workers: Concurrent bKash queries
+        rate_limit: bKash requests per second across all workers
+        limit: Stop after this many payments
+        progress: Called with the running totals after each chunk
+
+    Returns:
+        Counter: checked, completed, failed, unresolved and errors counts,
+        aborted=1 if the bKash circuit breaker opened, and seconds
+    """
+    now = now or timezone.now()
+    stale_before = now - timedelta(minutes=stale_minutes or settings.RECONCILE_STALE_MINUTES)
+    expire_before = now - timedelta(hours=expire_hours or settings.RECONCILE_EXPIRE_HOURS)
+    chunk_size = chunk_size or settings.RECONCILE_CHUNK_SIZE
+    rate_limit = settings.RECONCILE_RATE_LIMIT if rate_limit is None else rate_limit
+
+    service = BkashPaymentService()
+    token = SharedToken(service)
+    limiter = RateLimiter(rate_limit)
+
+    def query(row):
+        limiter.wait()
+        try:
+            token.ensure()
+        except CircuitOpenError as e:
+            return service._unavailable(e)
+        return service.query_payment(row['payment_id'])
+
+    pending = stale_payments(stale_before)
+    totals = Counter()
+    cursor = None
+    started = time.monotonic()
+    with ThreadPoolExecutor(max_workers=workers or settings.RECONCILE_WORKERS) as pool:
+        while True:
+            if bkash_breaker.state() == OPEN:
+                totals['aborted'] = 1
+                break
+
+            chunk = pending
+            if cursor:
+                # Keyset over (created_at, pk): unresolved rows stay pending
+                # and must not be read again
+                created_at, pk = cursor
+                chunk = chunk.filter(Q(created_at__gt=created_at) | Q(created_at=created_at, pk__gt=pk))
+            size = chunk_size if not limit else min(chunk_size, limit - totals['checked'])
+            rows = list(chunk.order_by('created_at', 'pk').values('pk', 'payment_id', 'created_at')[:size])
+            if not rows:
+                break
+
+            completed, failed = {}, []
+            for row, result in zip(rows, pool.map(query, rows)):
+                if result is None or result.get('unavailable'):
+                    totals['errors'] += 1
+                outcome = classify(result, row['created_at'], expire_before)
+                if outcome == 'completed':
+                    completed[row['pk']] = result['trxID']
+                elif outcome == 'failed':
+                    failed.append(row['pk'])
+
+            totals['completed'] += len(complete_payments(completed))
+            totals['failed'] += fail_payments(failed)
+            totals['checked'] += len(rows)
+            totals['unresolved'] = totals['checked'] - totals['completed'] - totals['failed']
+            cursor = (rows[-1]['created_at'], rows[-1]['pk'])
+            if progress:
+                progress(totals)
+            if limit and totals['checked'] >= limit:
+                break
+
+    totals['seconds'] = time.monotonic() - started
+    return totals
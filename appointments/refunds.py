@@ -0,0 +1,157 @@
+"""
+Refund queue for cancelled paid appointments
+
+Cancelling a paid appointment only inserts a Refund row (see the
+``appointment_status_changed`` receivers in ``signals``), so the
+cancellation never waits on bKash. The ``process_refunds`` management
+command claims due refunds in batches, sends them to bKash concurrently and
+applies the outcomes in bulk. Failed refunds are retried with backoff.
+
+Every refund carries an idempotency key, one per payment, so enqueueing a
+refund twice returns the existing row. bKash's refund API takes no key of
+its own: before re-sending a refund whose earlier attempt may have reached
+bKash, the worker queries the payment and takes 'Refunded' as done. When
+the status cannot be confirmed, the refund is retried later, not re-sent.
+"""
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .bkash_service import BkashPaymentService, SharedToken
+from .circuit_breaker import CircuitOpenError
+from .models import Refund
+from .notifications import retry_delay
+from .transitions import refund_payments
+
+
+def enqueue(payment, reason='Appointment cancelled'):
+    """
+    Queue a full refund of ``payment``
+
+    Returns:
+        Refund: The queued row, or the existing one for this payment
+    """
+    refund, _ = Refund.objects.get_or_create(
+        idempotency_key=f'payment-{payment.pk}',
+        defaults={'payment': payment, 'amount': payment.amount, 'reason': reason},
+    )
+    return refund
+
+
+def enqueue_for_appointment(appointment):
+    """Queue refunds for the completed bKash payments of a cancelled appointment"""
+    for payment in appointment.payments.filter(status='completed', payment_method='bkash'):
+        enqueue(payment)
+
+
+def claim_batch(batch_size, claim_seconds=None):
+    """
+    Claim due refunds for this worker
+
+    Claimed rows are 'processing' until ``claim_seconds`` from now; a row
+    still processing after that (its worker died) is claimed again.
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        refunds = list(
+            Refund.objects.filter(status__in=('pending', 'processing'), next_attempt_at__lte=now)
+            .select_related('payment')
+            .order_by('next_attempt_at')
+            .select_for_update(skip_locked=True, of=('self',))[:batch_size]
+        )
+        for refund in refunds:
+            refund.status = 'processing'
+            refund.attempts += 1
+            refund.next_attempt_at = now + timedelta(seconds=claim_seconds or settings.REFUND_CLAIM_SECONDS)
+        Refund.objects.bulk_update(refunds, ['status', 'attempts', 'next_attempt_at'])
+    return refunds
+
+
+def _send(service, token, refund):
+    """Refund one payment through bKash and return the service result"""
+    payment = refund.payment
+    if payment.status == 'refunded':
+        return {'success': True}
+    if (payment.payment_id or '').startswith('TEST_'):
+        # Simulated test-mode payment: nothing was charged
+        return {'success': True, 'refund_trx_id': f'TEST_REFUND_{refund.pk}'}
+
+    try:
+        token.ensure()
+    except CircuitOpenError as e:
+        return service._unavailable(e)
+
+    if refund.attempts > 1:
+        # An earlier attempt may have been refunded with only its response
+        # lost: send again only once bKash confirms it was not
+        status = service.query_payment(payment.payment_id)
+        if status is None or status.get('unavailable'):
+            return status or {'success': False, 'message': 'Could not confirm the payment status before retrying'}
+        if status.get('statusCode') != '0000':
+            return {'success': False, 'message': status.get('statusMessage', 'Payment status query failed')}
+        if status.get('transactionStatus') == 'Refunded':
+            return {'success': True}
+
+    return service.refund_payment(
+        payment.payment_id, payment.bkash_transaction_id or payment.transaction_id, refund.amount, refund.reason
+    )
+
+
+def process_batch(batch_size=None, max_attempts=None, workers=None):
+    """
+    Send one batch of due refunds to bKash, ``workers`` at a time
+
+    Refunded payments and their appointments are marked 'refunded' in bulk.
+    A failed refund goes back to pending with exponential backoff until
+    ``max_attempts``; while the bKash circuit breaker is open nothing is
+    sent and no attempt is used up.
+
+    Returns:
+        tuple: ``(refunded, failed)`` counts for this batch
+    """
+    batch_size = batch_size or settings.REFUND_BATCH_SIZE
+    max_attempts = max_attempts or settings.REFUND_MAX_ATTEMPTS
+
+    refunds = claim_batch(batch_size)
+    if not refunds:
+        return 0, 0
+
+    service = BkashPaymentService()
+    token = SharedToken(service)
+    with ThreadPoolExecutor(max_workers=min(workers or settings.REFUND_WORKERS, len(refunds))) as pool:
+        results = list(pool.map(lambda refund: _send(service, token, refund), refunds))
+
+    now = timezone.now()
+    refunded = []
+    failed = 0
+    for refund, result in zip(refunds, results):
+        if result.get('success'):
+            refund.status = 'refunded'
+            refund.refund_trx_id = result.get('refund_trx_id') or ''
+            refund.refunded_at = now
+            refund.last_error = ''
+            refunded.append(refund.payment_id)
+            continue
+
+        failed += 1
+        refund.last_error = str(result.get('message', 'Refund failed'))[:1000]
+        if result.get('unavailable'):
+            refund.attempts -= 1
+            refund.status = 'pending'
+            refund.next_attempt_at = now + timedelta(seconds=settings.CIRCUIT_OPEN_SECONDS)
+        elif refund.attempts >= max_attempts:
+            refund.status = 'failed'
+        else:
+            refund.status = 'pending'
+            refund.next_attempt_at = now + retry_delay(refund.attempts)
+
+    with transaction.atomic():
+        refund_payments(refunded)
+        Refund.objects.bulk_update(
+            refunds,
+            ['status', 'attempts', 'next_attempt_at', 'last_error', 'refund_trx_id', 'refunded_at'],
+        )
+    return len(refunded), failed
@@ -0,0 +1,163 @@
+"""
+Appointment reminders
+
+When an appointment is confirmed, one Reminder row per lead time and
+channel is written with its due time precomputed and floored into a time
+bucket. The ``send_reminders`` worker reads only the due buckets through the
+(status, bucket) index and never scans Appointment. Cancelling or
+rescheduling an appointment rewrites just that appointment's pending rows.
+
+Delivery goes through the senders named in ``REMINDER_SENDERS``: the email
+sender queues into the notification outbox and the SMS sender is a console
+stand-in until an SMS gateway is configured.
+"""
+import sys
+import threading
+from datetime import datetime, timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from . import notifications
+from .models import Reminder
+
+
+def appointment_start(appointment):
+    """Aware datetime at which the appointment starts"""
+    return timezone.make_aware(datetime.combine(appointment.appointment_date, appointment.appointment_time))
+
+
+def bucket_for(moment):
+    """Index of the REMINDER_BUCKET_SECONDS-wide bucket containing ``moment``"""
+    return int(moment.timestamp()) // settings.REMINDER_BUCKET_SECONDS
+
+
+def schedule(appointment, now=None):
+    """
+    Replace the appointment's pending reminders with ones for its current time
+
+    Reminders whose due time has already passed are not created.
+
+    Returns:
+        int: Number of reminders scheduled
+    """
+    now = now or timezone.now()
+    start = appointment_start(appointment)
+    reminders = []
+    for lead_minutes in settings.REMINDER_LEAD_MINUTES:
+        due_at = start - timedelta(minutes=lead_minutes)
+        if due_at <= now:
+            continue
+        for channel in settings.REMINDER_CHANNELS:
+            reminders.append(Reminder(
+                appointment=appointment,
+                channel=channel,
+                lead_minutes=lead_minutes,
+                due_at=due_at,
+                bucket=bucket_for(due_at),
+            ))
+
+    with transaction.atomic():
+        cancel(appointment)
+        Reminder.objects.bulk_create(reminders)
+    return len(reminders)
+
+
+def cancel(appointment):
+    """Drop the appointment's pending reminders"""
+    Reminder.objects.filter(appointment=appointment, status='pending').delete()
+
+
+class OutboxEmailSender:
+    """Queues the reminder into the email notification outbox"""
+
+    def send(self, reminder):
+        return notifications.enqueue('appointment_reminder', reminder.appointment) is not None
+
+
+class ConsoleSMSSender:
+    """Stand-in SMS gateway that writes messages to stdout"""
+
+    _lock = threading.Lock()
+
+    def __init__(self, stream=None):
+        self.stream = stream or sys.stdout
+
+    def send(self, reminder):
+        appointment = reminder.appointment
+        phone = appointment.patient.phone
+        if not phone:
+            return False
+        text = (
+            f"Reminder: appointment with Dr. {appointment.doctor.name} on "
+            f"{appointment.appointment_date:%d %b} at {appointment.appointment_time:%I:%M %p}"
+        )
+        with self._lock:
+            self.stream.write(f"SMS to {phone}: {text}\n")
+            self.stream.flush()
+        return True
+
+
+def get_senders():
+    """Instantiate the configured sender for each channel"""
+    return {channel: import_string(path)() for channel, path in settings.REMINDER_SENDERS.items()}
+
+
+def dispatch_due(batch_size=None, now=None, senders=None):
+    """
+    Hand one batch of due reminders, oldest bucket first, to their senders
+
+    A sender's ``send(reminder)`` returns False when the patient has no
+    address for that channel (the reminder is skipped) and raises on
+    failure (the reminder moves to a later bucket until
+    REMINDER_MAX_ATTEMPTS is reached).
+
+    Returns:
+        dict: Counts of ``sent``, ``skipped`` and ``failed`` reminders
+    """
+    batch_size = batch_size or settings.REMINDER_BATCH_SIZE
+    now = now or timezone.now()
+    senders = senders or get_senders()
+    current = bucket_for(now)
+
+    with transaction.atomic():
+        reminders = list(
+            Reminder.objects.filter(status='pending', bucket__lte=current)
+            .order_by('bucket', 'id')
+            .select_related('appointment__patient__user', 'appointment__doctor')
+            .select_for_update(skip_locked=True, of=('self',))[:batch_size]
+        )
+        sent, skipped, failed = [], [], []
+        for reminder in reminders:
+            appointment = reminder.appointment
+            if appointment.status != 'confirmed' or appointment_start(appointment) <= now:
+                skipped.append(reminder.pk)
+                continue
+
+            try:
+                delivered = senders[reminder.channel].send(reminder)
+            except Exception as e:
+                # Senders are pluggable, so any error counts as a failed attempt
+                reminder.attempts += 1
+                reminder.last_error = str(e)[:1000]
+                if reminder.attempts >= settings.REMINDER_MAX_ATTEMPTS:
+                    reminder.status = 'failed'
+                else:
+                    reminder.bucket = current + reminder.attempts
+                failed.append(reminder)
+                continue
+            (sent if delivered else skipped).append(reminder.pk)
+
+        # One UPDATE per outcome; bulk_update's per-row CASE is far slower
+        # for the thousands of rows a busy bucket can hold
+        if sent:
+            Reminder.objects.filter(pk__in=sent).update(
+                status='sent', attempts=F('attempts') + 1, last_error='', sent_at=timezone.now()
+            )
+        if skipped:
+            Reminder.objects.filter(pk__in=skipped).update(status='skipped')
+        Reminder.objects.bulk_update(failed, ['status', 'attempts', 'bucket', 'last_error'])
+    return {'sent': len(sent), 'skipped': len(skipped), 'failed': len(failed)}
@@ -0,0 +1,265 @@
+"""
+Read replicas for read-heavy views
+
+Set DATABASE_REPLICA_URLS to one or more comma-separated database URLs.
+Views decorated with ``replica_reads`` (doctor list and detail, home page,
+schedules and dashboards) then run their reads on one replica per request,
+picked round-robin or, with REPLICA_SELECTION=least_latency, by the lowest
+measured round trip. Everything else, and every write, uses ``default``.
+
+After a request writes (or uses a method other than GET/HEAD), its response
+sets a short-lived cookie that keeps the browser on the primary for
+REPLICA_PIN_SECONDS, so users see their own changes despite replication lag.
+
+Each process checks every replica at most every REPLICA_CHECK_SECONDS before
+using it. A replica that fails is skipped for REPLICA_RETRY_SECONDS, and one
+lagging more than REPLICA_MAX_LAG_SECONDS (PostgreSQL standbys) until its
+next check. With no usable replica, reads go to the primary; a view whose
+replica fails mid-request is run again on the primary.
+"""
+import itertools
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, InterfaceError, OperationalError, connections
+
+
+logger = logging.getLogger(__name__)
+
+ALIAS_PREFIX = 'replica_'
+REPLICAS = [alias for alias in settings.DATABASES if alias.startswith(ALIAS_PREFIX)]
+
+PIN_COOKIE = 'primary_reads'
+SAFE_METHODS = ('GET', 'HEAD')
+
+# Replay delay of a PostgreSQL standby in seconds; 0 when it has replayed all
+# it received, or when the server is not a standby
+POSTGRESQL_LAG_SQL = """
+    SELECT COALESCE(
+        CASE WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+        ELSE EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()) END,
+        0)
+"""
+
+# Alias the current request reads from, None for the primary; sync_to_async
+# copies the context, so async views' worker threads read from it too
+_replica = ContextVar('replica', default=None)
+# Set by ReplicaPinMiddleware: whether the current request wrote
+_request_writes = ContextVar('request_writes', default=None)
+
+
+class ReplicaState:
+    """What this process knows about one replica"""
+
+    def __init__(self):
+        self.latency = None  # Moving average of check round trips, seconds
+        self.checked_at = float('-inf')
+        self.down_until = 0.0
+
+
+_states = {alias: ReplicaState() for alias in REPLICAS}
+_states_lock = threading.Lock()
+_turn = itertools.count()
+
+
+def check(alias):
+    """
+    Time a round trip to ``alias`` and read its replication lag
+
+    Returns:
+        bool: Whether the replica can serve reads
+    """
+    state = _states[alias]
+    connection = connections[alias]
+    started = time.monotonic()
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute(POSTGRESQL_LAG_SQL if connection.vendor == 'postgresql' else 'SELECT 1')
+            lag = float(cursor.fetchone()[0]) if connection.vendor == 'postgresql' else 0.0
+    except DatabaseError as e:
+        # A dead connection is not reopened by Django until it is closed
+        connection.close()
+        with _states_lock:
+            state.down_until = time.monotonic() + settings.REPLICA_RETRY_SECONDS
+        logger.warning('Replica %s unavailable for %ss: %s', alias, settings.REPLICA_RETRY_SECONDS, e)
+        return False
+
+    now = time.monotonic()
+    with _states_lock:
+        elapsed = now - started
+        state.latency = elapsed if state.latency is None else 0.7 * state.latency + 0.3 * elapsed
+        if lag > settings.REPLICA_MAX_LAG_SECONDS:
+            state.down_until = now + settings.REPLICA_CHECK_SECONDS
+    if lag > settings.REPLICA_MAX_LAG_SECONDS:
+        logger.warning('Replica %s is %.1fs behind; reading from the others', alias, lag)
+        return False
+    return True
+
+
+def _claim_checks():
+    """Replicas due for a check; marked as checked so other threads skip them"""
+    now = time.monotonic()
+    with _states_lock:
+        due = [
+            alias for alias, state in _states.items()
+            if state.down_until <= now and now - state.checked_at >= settings.REPLICA_CHECK_SECONDS
+        ]
+        for alias in due:
+            _states[alias].checked_at = now
+    return due
+
+
+def run_checks(aliases):
+    """Check ``aliases``, e.g. those returned by ``_claim_checks``"""
+    for alias in aliases:
+        check(alias)
+
+
+def choose():
+    """Replica to read from, or None when none is usable"""
+    now = time.monotonic()
+    usable = [alias for alias, state in _states.items() if state.down_until <= now]
+    if not usable:
+        return None
+    if settings.REPLICA_SELECTION == 'least_latency':
+        return min(usable, key=lambda alias: _states[alias].latency or 0.0)
+    return usable[next(_turn) % len(usable)]
+
+
+def _use_replica(request):
+    return bool(REPLICAS) and request.method in SAFE_METHODS and PIN_COOKIE not in request.COOKIES
+
+
+def _replica_failed(alias):
+    """Whether an error raised while reading from ``alias`` came from it"""
+    return not check(alias)
+
+
+def replica_reads(view_func):
+    """
+    Run the reads of a sync or async read-only view on a replica
+
+    Writes still go to the primary. Requests pinned to the primary after a
+    write, and other methods than GET/HEAD, are not affected.
+    """
+    if iscoroutinefunction(view_func):
+        @wraps(view_func)
+        async def wrapper(request, *args, **kwargs):
+            if not _use_replica(request):
+                return await view_func(request, *args, **kwargs)
+            due = _claim_checks()
+            if due:
+                await sync_to_async(run_checks)(due)
+            alias = choose()
+            if alias is None:
+                return await view_func(request, *args, **kwargs)
+            token = _replica.set(alias)
+            try:
+                return await view_func(request, *args, **kwargs)
+            except (OperationalError, InterfaceError):
+                if not await sync_to_async(_replica_failed)(alias):
+                    raise
+            finally:
+                _replica.reset(token)
+            return await view_func(request, *args, **kwargs)
+    else:
+        @wraps(view_func)
+        def wrapper(request, *args, **kwargs):
+            if not _use_replica(request):
+                return view_func(request, *args, **kwargs)
+            run_checks(_claim_checks())
+            alias = choose()
+            if alias is None:
+                return view_func(request, *args, **kwargs)
+            token = _replica.set(alias)
+            try:
+                return view_func(request, *args, **kwargs)
+            except (OperationalError, InterfaceError):
+                if not _replica_failed(alias):
+                    raise
+            finally:
+                _replica.reset(token)
+            return view_func(request, *args, **kwargs)
+    return wrapper
+
+
+@contextmanager
+def primary():
+    """Read from the primary within the block, e.g. to compute values that get cached"""
+    token = _replica.set(None)
+    try:
+        yield
+    finally:
+        _replica.reset(token)
+
+
+class ReplicaRouter:
+    """Reads inside ``replica_reads`` views go to the chosen replica, all else to default"""
+
+    def db_for_read(self, model, **hints):
+        return _replica.get()
+
+    def db_for_write(self, model, **hints):
+        writes = _request_writes.get()
+        if writes is not None:
+            writes[0] = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas hold the same rows as the primary
+        databases = {DEFAULT_DB_ALIAS, *REPLICAS}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Replicas get their schema by replication
+        return db == DEFAULT_DB_ALIAS
+
+
+class ReplicaPinMiddleware:
+    """Pin browsers to the primary for REPLICA_PIN_SECONDS after they write"""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        writes = [False]
+        token = _request_writes.set(writes)
+        try:
+            response = self.get_response(request)
+        finally:
+            _request_writes.reset(token)
+        return self.pin(request, response, writes[0])
+
+    async def __acall__(self, request):
+        writes = [False]
+        token = _request_writes.set(writes)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _request_writes.reset(token)
+        return self.pin(request, response, writes[0])
+
+    @staticmethod
+    def pin(request, response, wrote):
+        if REPLICAS and (wrote or request.method not in SAFE_METHODS):
+            response.set_cookie(
+                PIN_COOKIE, '1', max_age=settings.REPLICA_PIN_SECONDS, httponly=True,
+                samesite='Lax', secure=request.is_secure(),
+            )
+        return response
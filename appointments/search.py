@@ -0,0 +1,134 @@
+"""
+Doctor search and typeahead
+
+``search_doctors`` filters on name, specialization, qualification and bio.
+On PostgreSQL those lookups are served by the trigram indexes created in
+migration 0005 and results are ranked by similarity; on SQLite the same
+query runs unindexed so development keeps working.
+
+``prefix_index`` is an in-process prefix index over doctor name and
+specialization words, used by the autocomplete endpoint. Saving or deleting
+a Doctor bumps the cache generation of INDEX_SCOPE once the transaction
+commits; every process compares that generation on lookup and rebuilds its
+index lazily when it moved.
+"""
+import re
+import threading
+from bisect import bisect_left
+
+from django.db import connection, transaction
+from django.db.models import Q
+
+from . import caching
+from .models import Doctor
+
+
+SEARCH_FIELDS = ('name', 'specialization', 'qualification', 'bio')
+
+TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+# Cache generation scope shared by every process's prefix index
+INDEX_SCOPE = 'doctor-index'
+
+
+def tokenize(text):
+    return [token.lower() for token in TOKEN_RE.findall(text or '')]
+
+
+def search_doctors(query, queryset=None):
+    """
+    Search doctors by every word in ``query``
+
+    Each word must appear (case-insensitively) in at least one of
+    SEARCH_FIELDS.
+
+    Returns:
+        QuerySet: Matching doctors, best matches first on PostgreSQL
+    """
+    doctors = Doctor.objects.all() if queryset is None else queryset
+    terms = tokenize(query)
+    for term in terms:
+        condition = Q()
+        for field in SEARCH_FIELDS:
+            condition |= Q(**{f'{field}__icontains': term})
+        doctors = doctors.filter(condition)
+
+    if terms and connection.vendor == 'postgresql':
+        from django.contrib.postgres.search import TrigramSimilarity
+        doctors = doctors.annotate(
+            similarity=TrigramSimilarity('name', query) + TrigramSimilarity('specialization', query)
+        ).order_by('-similarity', 'name')
+    return doctors
+
+
+class PrefixIndex:
+    """Sorted (token, doctor id) pairs answering prefix queries with bisect"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries = None
+        self._doctors = {}
+        self._generation = None
+
+    def invalidate(self):
+        """Make every process rebuild its index once the current transaction commits"""
+        transaction.on_commit(lambda: caching.bump(INDEX_SCOPE))
+
+    def build(self):
+        """Load available doctors and index the words of their name and specialization"""
+        entries = []
+        doctors = {}
+        rows = Doctor.objects.filter(is_available=True).values_list('id', 'name', 'specialization')
+        for doctor_id, name, specialization in rows:
+            doctors[doctor_id] = {'id': doctor_id, 'name': name, 'specialization': specialization}
+            for token in set(tokenize(name) + tokenize(specialization)):
+                entries.append((token, doctor_id))
+        entries.sort()
+        self._entries, self._doctors = entries, doctors
+
+    def _ensure_built(self):
+        current = caching.generation(INDEX_SCOPE)
+        if self._entries is None or self._generation != current:
+            with self._lock:
+                if self._entries is None or self._generation != current:
+                    # A bump during the build leaves the older generation
+                    # recorded, so the next lookup rebuilds again
+                    self.build()
+                    self._generation = current
+        return self._entries
+
+    def _matches(self, entries, prefix):
+        """Doctor ids having a word that starts with ``prefix``"""
+        found = set()
+        position = bisect_left(entries, (prefix,))
+        while position < len(entries) and entries[position][0].startswith(prefix):
+            found.add(entries[position][1])
+            position += 1
+        return found
+
+    def lookup(self, query, limit=10):
+        """
+        Find doctors where every word of ``query`` prefixes a name or
+        specialization word
+
+        Returns:
+            list: dicts with ``id``, ``name`` and ``specialization``
+        """
+        terms = tokenize(query)
+        if not terms:
+            return []
+        entries = self._ensure_built()
+        doctors = self._doctors
+
+        matched = None
+        for term in sorted(terms, key=len, reverse=True):
+            ids = self._matches(entries, term)
+            matched = ids if matched is None else matched & ids
+            if not matched:
+                return []
+
+        results = sorted((doctors[doctor_id] for doctor_id in matched), key=lambda d: d['name'])
+        return results[:limit]
+
+
+prefix_index = PrefixIndex()
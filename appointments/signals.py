@@ -0,0 +1,247 @@
+"""
+Appointment state tracking and transition signals
+
+Each Appointment instance remembers the state it was loaded with, so a save
+can tell what changed without re-reading the row. Other modules subscribe
+to ``appointment_status_changed``, ``appointment_rescheduled`` and
+``zoom_link_ready`` instead of hooking ``post_save`` directly.
+
+Appointment and payment changes are also published to the live dashboard
+event stream (see ``events``) once their transaction commits. Changes to a
+doctor, their schedule or their appointments bump the doctor's cache
+generation (see ``caching``) first, so the stream never reads stale stats.
+"""
+from django.conf import settings
+from django.db import transaction
+from django.core.signals import request_finished
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_delete, post_init, post_save
+from django.dispatch import Signal, receiver
+from django.utils.text import Truncator
+
+from . import caching, counters, metrics, slow_queries, meeting_pool, notifications, reminders, zoom_sync
+from .events import broker, doctor_topic
+from .models import Appointment, Doctor, Payment, TimeSlot
+from .search import prefix_index
+
+
+# Sent after an appointment is created or its status changes.
+# Arguments: appointment, old_status (None when created), new_status
+appointment_status_changed = Signal()
+
+# Sent when an existing appointment's date or time changes.
+# Arguments: appointment, old_date, old_time
+appointment_rescheduled = Signal()
+
+# Sent when an appointment first gets a Zoom join URL.
+# Arguments: appointment
+zoom_link_ready = Signal()
+
+
+TRACKED_FIELDS = ('doctor_id', 'appointment_date', 'appointment_time', 'status', 'zoom_join_url')
+
+# Status transitions that email the patient
+STATUS_NOTIFICATIONS = {
+    'pending': 'appointment_booked',
+    'confirmed': 'appointment_confirmed',
+    'cancelled': 'appointment_cancelled',
+}
+
+
+def snapshot(instance):
+    """Capture the tracked fields without triggering deferred field loads"""
+    return {field: instance.__dict__.get(field) for field in TRACKED_FIELDS}
+
+
+def state_key(state):
+    return counters.counter_key(
+        state['doctor_id'], state['appointment_date'], state['appointment_time'], state['status']
+    )
+
+
+@receiver(post_init, sender=Appointment)
+def remember_appointment_state(sender, instance, **kwargs):
+    instance._loaded_state = snapshot(instance) if instance.pk else None
+
+
+@receiver(post_save, sender=Appointment)
+def appointment_saved(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    old_state = None if created else getattr(instance, '_loaded_state', None)
+    new_state = snapshot(instance)
+    instance._loaded_state = new_state
+
+    counters.record_change(state_key(old_state) if old_state else None, state_key(new_state))
+
+    old_status = old_state['status'] if old_state else None
+    if created or old_status != new_state['status']:
+        appointment_status_changed.send(
+            sender=Appointment,
+            appointment=instance,
+            old_status=old_status,
+            new_status=new_state['status'],
+        )
+
+    if old_state and (
+        old_state['appointment_date'] != new_state['appointment_date']
+        or old_state['appointment_time'] != new_state['appointment_time']
+    ):
+        appointment_rescheduled.send(
+            sender=Appointment,
+            appointment=instance,
+            old_date=old_state['appointment_date'],
+            old_time=old_state['appointment_time'],
+        )
+
+    # Manual-entry placeholders ('MANUAL_ENTRY_REQUIRED') are not links
+    old_zoom_url = old_state['zoom_join_url'] if old_state else None
+    if _is_link(new_state['zoom_join_url']) and not _is_link(old_zoom_url):
+        zoom_link_ready.send(sender=Appointment, appointment=instance)
+
+
+def _is_link(url):
+    return bool(url) and url.startswith('http')
+
+
+@receiver(post_delete, sender=Appointment)
+def appointment_deleted(sender, instance, **kwargs):
+    state = getattr(instance, '_loaded_state', None) or snapshot(instance)
+    counters.adjust(state_key(state), -1)
+    caching.invalidate_doctor(state['doctor_id'])
+
+
+@receiver(appointment_status_changed)
+@receiver(appointment_rescheduled)
+def invalidate_doctor_cache(sender, appointment, **kwargs):
+    caching.invalidate_doctor(appointment.doctor_id)
+
+
+@receiver(post_save, sender=TimeSlot)
+@receiver(post_delete, sender=TimeSlot)
+def time_slot_changed(sender, instance, **kwargs):
+    caching.invalidate_doctor(instance.doctor_id)
+
+
+@receiver(appointment_status_changed)
+def count_status_change(sender, appointment, old_status, new_status, **kwargs):
+    metrics.APPOINTMENT_TRANSITIONS.labels(new_status).inc()
+
+
+@receiver(appointment_status_changed)
+def queue_status_notification(sender, appointment, old_status, new_status, **kwargs):
+    kind = STATUS_NOTIFICATIONS.get(new_status)
+    if kind:
+        notifications.enqueue(kind, appointment)
+
+
+@receiver(appointment_status_changed)
+def update_reminders(sender, appointment, old_status, new_status, **kwargs):
+    if new_status == 'confirmed':
+        reminders.schedule(appointment)
+    elif old_status == 'confirmed':
+        reminders.cancel(appointment)
+
+
+@receiver(appointment_status_changed)
+def queue_refund(sender, appointment, old_status, new_status, **kwargs):
+    if new_status == 'cancelled' and appointment.payment_status == 'paid':
+        # Imported here: refunds -> transitions -> signals
+        from .refunds import enqueue_for_appointment
+        enqueue_for_appointment(appointment)
+
+
+@receiver(appointment_status_changed)
+def assign_pooled_meeting(sender, appointment, old_status, new_status, **kwargs):
+    if new_status == 'confirmed' and not zoom_sync.has_meeting(appointment):
+        meeting_pool.assign(appointment)
+
+
+@receiver(appointment_status_changed)
+def queue_zoom_meeting_delete(sender, appointment, old_status, new_status, **kwargs):
+    if new_status == 'cancelled':
+        zoom_sync.enqueue(appointment, 'delete')
+
+
+@receiver(appointment_rescheduled)
+def reschedule_reminders(sender, appointment, **kwargs):
+    if appointment.status == 'confirmed':
+        reminders.schedule(appointment)
+
+
+@receiver(appointment_rescheduled)
+def queue_zoom_meeting_update(sender, appointment, **kwargs):
+    if appointment.status in ('pending', 'confirmed'):
+        zoom_sync.enqueue(appointment, 'update')
+
+
+@receiver(zoom_link_ready)
+def queue_zoom_link_notification(sender, appointment, **kwargs):
+    notifications.enqueue('zoom_link_ready', appointment)
+
+
+def publish_appointment_event(event_type, appointment, old_status=None):
+    """Publish a dashboard delta for ``appointment`` after the transaction commits"""
+    user = appointment.patient.user
+    data = {
+        'id': appointment.pk,
+        # str() also copes with values assigned as ISO strings before a refresh
+        'date': str(appointment.appointment_date),
+        'time': str(appointment.appointment_time)[:5],
+        'status': appointment.status,
+        'old_status': old_status,
+        'payment_status': appointment.payment_status,
+        'patient': user.get_full_name() or user.username,
+        'phone': appointment.patient.phone,
+        'email': user.email,
+        'reason': Truncator(appointment.reason).words(5),
+    }
+    topic = doctor_topic(appointment.doctor_id)
+    transaction.on_commit(lambda: broker.publish(topic, event_type, data))
+
+
+@receiver(appointment_status_changed)
+def publish_status_event(sender, appointment, old_status, new_status, **kwargs):
+    event_type = 'appointment.created' if old_status is None else f'appointment.{new_status}'
+    publish_appointment_event(event_type, appointment, old_status)
+
+
+@receiver(appointment_rescheduled)
+def publish_reschedule_event(sender, appointment, **kwargs):
+    publish_appointment_event('appointment.rescheduled', appointment, appointment.status)
+
+
+@receiver(post_init, sender=Payment)
+def remember_payment_status(sender, instance, **kwargs):
+    instance._loaded_status = instance.__dict__.get('status') if instance.pk else None
+
+
+@receiver(post_save, sender=Payment)
+def payment_saved(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    old_status = None if created else getattr(instance, '_loaded_status', None)
+    instance._loaded_status = instance.status
+    if instance.status == 'completed' and old_status != 'completed':
+        appointment = instance.appointment
+        publish_appointment_event('payment.completed', appointment, appointment.status)
+
+
+@receiver(post_save, sender=Doctor)
+@receiver(post_delete, sender=Doctor)
+def doctor_changed(sender, instance, **kwargs):
+    prefix_index.invalidate()
+    caching.invalidate_doctor(instance)
+
+
+@receiver(connection_created)
+def instrument_connection(sender, connection, **kwargs):
+    metrics.instrument(connection)
+    if settings.SLOW_QUERY_LOG:
+        slow_queries.instrument(connection)
+
+
+@receiver(request_finished)
+def flush_slow_queries(sender, **kwargs):
+    if settings.SLOW_QUERY_LOG:
+        slow_queries.flush()
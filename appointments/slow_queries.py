@@ -0,0 +1,196 @@
+"""
+Opt-in slow-query log
+
+With SLOW_QUERY_LOG=True every database connection gets an execute wrapper
+that times each query. Queries slower than SLOW_QUERY_MS are logged with
+their SQL fingerprint, the project line that ran them and the view of the
+current request, and aggregated per fingerprint in the SlowQuery table once
+the surrounding transaction commits. ``python manage.py slow_queries``
+lists the worst offenders.
+
+On PostgreSQL a share (SLOW_QUERY_EXPLAIN_RATE) of slow SELECTs is run
+again under ``EXPLAIN (ANALYZE, BUFFERS)`` and the plan is kept with the
+fingerprint. The re-run costs as much as the query, hence the sampling.
+"""
+import hashlib
+import logging
+import random
+import re
+import sys
+import threading
+import time
+from pathlib import Path
+
+from django.conf import settings
+from django.db import DatabaseError, IntegrityError, transaction
+from django.db.models import F
+from django.db.models.functions import Greatest
+from django.utils import timezone
+
+from . import metrics
+from .log import current_request, request_fields
+from .models import SlowQuery
+
+
+logger = logging.getLogger(__name__)
+
+# Set while the log's own queries run, so they are not timed themselves
+_local = threading.local()
+
+PROJECT_DIR = str(Path(settings.BASE_DIR).resolve())
+# Execute wrappers, which sit between the project code and the query
+WRAPPER_FILES = {str(Path(module.__file__).resolve()) for module in (sys.modules[__name__], metrics)}
+
+STRING_LITERAL = re.compile(r"'(?:[^']|'')*'")
+NUMBER = re.compile(r'\b\d+(?:\.\d+)?\b')
+VALUE_LIST = re.compile(r'\(\s*\?(?:\s*,\s*\?)*\s*\)')
+WHITESPACE = re.compile(r'\s+')
+
+
+def normalize(sql):
+    """SQL with literals, placeholders and IN-lists replaced, so equal queries compare equal"""
+    sql = STRING_LITERAL.sub('?', sql).replace('%s', '?')
+    sql = NUMBER.sub('?', sql)
+    sql = VALUE_LIST.sub('(...)', sql)
+    return WHITESPACE.sub(' ', sql).strip()
+
+
+def fingerprint(sql):
+    """
+    Returns:
+        tuple: ``(fingerprint, normalized_sql)``
+    """
+    normalized = normalize(sql)
+    return hashlib.md5(normalized.encode()).hexdigest(), normalized
+
+
+def caller():
+    """``path:line in function`` of the innermost project frame running the query"""
+    frame = sys._getframe(1)
+    while frame is not None:
+        filename = frame.f_code.co_filename
+        if filename.startswith(PROJECT_DIR) and filename not in WRAPPER_FILES and 'site-packages' not in filename:
+            path = Path(filename).relative_to(PROJECT_DIR)
+            return f'{path}:{frame.f_lineno} in {frame.f_code.co_name}'
+        frame = frame.f_back
+    return ''
+
+
+def _explain(connection, sql, params):
+    """EXPLAIN (ANALYZE, BUFFERS) output of a slow SELECT, or '' when not sampled"""
+    if (
+        connection.vendor != 'postgresql'
+        or not sql.lstrip().upper().startswith('SELECT')
+        or random.random() >= settings.SLOW_QUERY_EXPLAIN_RATE
+    ):
+        return ''
+    try:
+        # Savepoint: a failing EXPLAIN must not abort the caller's transaction
+        with transaction.atomic(using=connection.alias), connection.cursor() as cursor:
+            cursor.execute(f'EXPLAIN (ANALYZE, BUFFERS) {sql}', params)
+            return '\n'.join(row[0] for row in cursor.fetchall())
+    except Exception:
+        logger.exception('EXPLAIN of slow query failed')
+        return ''
+
+
+def record(fp, normalized, duration_ms, where, view, plan):
+    """Add one slow call to the SlowQuery row of ``fp``"""
+    now = timezone.now()
+    changes = {
+        'calls': F('calls') + 1,
+        'total_ms': F('total_ms') + duration_ms,
+        'max_ms': Greatest(F('max_ms'), duration_ms),
+        'caller': where[:255],
+        'view': view[:200],
+        'last_seen': now,
+    }
+    if plan:
+        changes.update(explain=plan, explained_at=now)
+    rows = SlowQuery.objects.filter(fingerprint=fp)
+    if rows.update(**changes):
+        return
+    try:
+        with transaction.atomic():
+            SlowQuery.objects.create(
+                fingerprint=fp, sql=normalized, calls=1, total_ms=duration_ms, max_ms=duration_ms,
+                caller=where[:255], view=view[:200], explain=plan, explained_at=now if plan else None,
+            )
+    except IntegrityError:
+        # Another worker created the row first
+        rows.update(**changes)
+
+
+def _pending():
+    if not hasattr(_local, 'pending'):
+        _local.pending = []
+    return _local.pending
+
+
+def flush():
+    """
+    Explain and record the slow queries this thread logged
+
+    Runs before the thread's next query and when a request finishes: never
+    between a query and the fetch of its results. Rows are written once the
+    surrounding transaction commits.
+    """
+    pending = _pending()
+    if not pending or getattr(_local, 'active', False):
+        return
+    _local.active = True
+    try:
+        while pending:
+            connection, sql, params, many, entry = pending.pop(0)
+            if not many and not connection.needs_rollback:
+                entry['plan'] = _explain(connection, sql, params)
+            transaction.on_commit(lambda entry=entry: _record(entry), using=connection.alias)
+    finally:
+        _local.active = False
+
+
+def _record(entry):
+    active, _local.active = getattr(_local, 'active', False), True
+    try:
+        record(**entry)
+    except DatabaseError as e:
+        # E.g. during migrate, before the SlowQuery table exists
+        logger.warning('Could not record slow query: %s', e)
+    except Exception:
+        logger.exception('Could not record slow query')
+    finally:
+        _local.active = active
+
+
+def time_query(execute, sql, params, many, context):
+    """Database execute wrapper logging queries slower than SLOW_QUERY_MS"""
+    if getattr(_local, 'active', False):
+        return execute(sql, params, many, context)
+    if _pending():
+        flush()
+    started = time.perf_counter()
+    result = execute(sql, params, many, context)
+    duration_ms = (time.perf_counter() - started) * 1000
+    if duration_ms >= settings.SLOW_QUERY_MS:
+        _slow(context['connection'], sql, params, many, duration_ms)
+    return result
+
+
+def _slow(connection, sql, params, many, duration_ms):
+    """Log a slow query and leave it for ``flush``"""
+    fp, normalized = fingerprint(sql)
+    where = caller()
+    request = current_request.get()
+    view = request_fields(request).get('view', '') if request is not None else ''
+    logger.warning(
+        'Slow query (%.1f ms) at %s', duration_ms, where or 'unknown caller',
+        extra={'fingerprint': fp, 'duration_ms': round(duration_ms, 1), 'caller': where, 'sql': normalized},
+    )
+    entry = {'fp': fp, 'normalized': normalized, 'duration_ms': duration_ms, 'where': where, 'view': view, 'plan': ''}
+    _pending().append((connection, sql, params, many, entry))
+
+
+def instrument(connection):
+    """Time the queries run on ``connection``"""
+    if time_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(time_query)
@@ -1,3 +1,1093 @@
-from django.test import TestCase
+import smtplib
+import time as clock
+from collections import Counter
+from datetime import time, timedelta
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import async_to_sync
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser, User
+from django.core.cache import cache
+from django.core import mail
+from django.core.exceptions import ValidationError
+from django.core.management import call_command
+from django.db import OperationalError, connection
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from . import (
+    caching, circuit_breaker, counters, meeting_pool, notifications, refunds, reminders, replicas,
+    zoom_sync,
+)
+from .circuit_breaker import BREAKERS, CLOSED, HALF_OPEN, OPEN, CircuitBreaker, CircuitOpenError
+from .models import (
+    Appointment, AppointmentCounter, AppointmentTotal, Doctor, HourlyAppointmentCounter, Notification, Patient,
+    Payment, PooledMeeting, Refund, Reminder, ZoomSyncTask,
+)
+from .ratelimit import ahit, hit, parse_rate, rate_limit
+from .search import PrefixIndex
+from .sync import SYNC_SAFETY_LAG, changes_since, decode_cursor, encode_cursor
+from .transitions import bulk_set_status, complete_payments, fail_payments, refund_payments, reschedule
+
+
+class AppointmentTestCase(TestCase):
+    """One patient and one doctor, plus helpers to book and pay"""
+
+    @classmethod
+    def setUpTestData(cls):
+        user = User.objects.create_user('patient', 'patient@example.com', 'secret', first_name='Pat')
+        cls.patient = Patient.objects.create(user=user, phone='01700000000')
+        cls.doctor = Doctor.objects.create(name='Rahman', specialization='Cardiology', email='rahman@example.com', phone='')
+
+    def book(self, days=1, hour=9, status='pending', **fields):
+        fields.setdefault('doctor', self.doctor)
+        return Appointment.objects.create(
+            patient=self.patient,
+            appointment_date=timezone.localdate() + timedelta(days=days),
+            appointment_time=time(hour),
+            reason='Checkup',
+            amount=500,
+            status=status,
+            **fields,
+        )
+
+    def stored_counts(self):
+        """Non-zero hourly, daily and total counters, comparable to ``expected_counts()``"""
+        counts = Counter()
+        for row in HourlyAppointmentCounter.objects.exclude(count=0):
+            counts[('hour', row.doctor_id, row.date, row.hour, row.status)] = row.count
+        for row in AppointmentCounter.objects.exclude(count=0):
+            counts[('day', row.doctor_id, row.date, row.status)] = row.count
+        for row in AppointmentTotal.objects.exclude(count=0):
+            counts[('total', row.doctor_id, row.status)] = row.count
+        return counts
+
+    def expected_counts(self):
+        """What the counters should hold, counted from the appointments"""
+        counts = Counter()
+        for appointment in Appointment.objects.all():
+            doctor_id, day, status = appointment.doctor_id, appointment.appointment_date, appointment.status
+            counts[('hour', doctor_id, day, appointment.appointment_time.hour, status)] += 1
+            counts[('day', doctor_id, day, status)] += 1
+            counts[('total', doctor_id, status)] += 1
+            counts[('total', None, status)] += 1
+        return counts
+
+    def pay(self, appointment, status='pending', **fields):
+        return Payment.objects.create(
+            appointment=appointment,
+            amount=appointment.amount,
+            payment_method='bkash',
+            payment_id=f'PAY{appointment.pk}',
+            status=status,
+            **fields,
+        )
+
+
+class LatePaymentTests(AppointmentTestCase):
+    def test_payment_completed_after_cancellation_is_refunded(self):
+        appointment = self.book()
+        payment = self.pay(appointment)
+        bulk_set_status(Appointment.objects.filter(pk=appointment.pk), 'cancelled')
+        self.assertFalse(Refund.objects.exists())
+
+        complete_payments({payment.pk: 'TRX1'})
+
+        appointment.refresh_from_db()
+        payment.refresh_from_db()
+        self.assertEqual(appointment.status, 'cancelled')
+        self.assertEqual(payment.status, 'completed')
+        refund = Refund.objects.get()
+        self.assertEqual(refund.payment, payment)
+        self.assertEqual(refund.status, 'pending')
+        self.assertEqual(refund.amount, payment.amount)
+
+    def test_payment_completed_after_completion_is_refunded(self):
+        appointment = self.book(status='completed')
+        payment = self.pay(appointment)
+
+        complete_payments({payment.pk: 'TRX1'})
+
+        self.assertEqual(Refund.objects.get().payment, payment)
+
+    def test_payment_of_pending_appointment_is_kept(self):
+        appointment = self.book()
+        payment = self.pay(appointment)
+
+        complete_payments({payment.pk: 'TRX1'})
+
+        appointment.refresh_from_db()
+        self.assertEqual(appointment.status, 'confirmed')
+        self.assertEqual(appointment.payment_status, 'paid')
+        self.assertFalse(Refund.objects.exists())
+
+
+class PaymentTransitionTests(AppointmentTestCase):
+    def test_complete_payments_confirms_appointment(self):
+        appointment = self.book()
+        payment = self.pay(appointment)
+
+        completed = complete_payments({payment.pk: 'TRX1'})
+
+        self.assertEqual(completed, [payment])
+        payment.refresh_from_db()
+        self.assertEqual(payment.status, 'completed')
+        self.assertEqual(payment.bkash_transaction_id, 'TRX1')
+        self.assertIsNotNone(payment.payment_date)
+        appointment.refresh_from_db()
+        self.assertEqual(appointment.status, 'confirmed')
+        self.assertEqual(appointment.payment_status, 'paid')
+        counts = counters.status_counts(doctor=self.doctor)
+        self.assertEqual((counts['pending'], counts['confirmed']), (0, 1))
+
+    def test_complete_payments_claims_only_pending_payments(self):
+        failed = self.pay(self.book(hour=9), status='failed')
+        pending = self.pay(self.book(hour=10))
+
+        self.assertEqual(complete_payments({failed.pk: 'TRX1', pending.pk: 'TRX2'}), [pending])
+        # A second callback for the same payment finds nothing to claim
+        self.assertEqual(complete_payments({pending.pk: 'TRX3'}), [])
+
+        failed.refresh_from_db()
+        pending.refresh_from_db()
+        self.assertEqual(failed.status, 'failed')
+        self.assertEqual(failed.appointment.payment_status, 'pending')
+        self.assertEqual(pending.bkash_transaction_id, 'TRX2')
+
+    def test_fail_payments_only_fails_pending_payments(self):
+        pending = self.pay(self.book(hour=9))
+        completed = self.pay(self.book(hour=10), status='completed')
+
+        self.assertEqual(fail_payments([pending.pk, completed.pk]), 1)
+
+        pending.refresh_from_db()
+        completed.refresh_from_db()
+        self.assertEqual(pending.status, 'failed')
+        self.assertEqual(completed.status, 'completed')
+
+    def test_refund_payments_only_refunds_completed_payments(self):
+        completed = self.pay(self.book(hour=9, payment_status='paid'), status='completed')
+        pending = self.pay(self.book(hour=10))
+
+        self.assertEqual(refund_payments([completed.pk, pending.pk]), 1)
+
+        completed.refresh_from_db()
+        pending.refresh_from_db()
+        self.assertEqual(completed.status, 'refunded')
+        self.assertEqual(completed.appointment.payment_status, 'refunded')
+        self.assertEqual(pending.status, 'pending')
+        self.assertEqual(pending.appointment.payment_status, 'pending')
+
+
+class BulkSetStatusTests(AppointmentTestCase):
+    def test_counters_follow_the_status_change(self):
+        day = timezone.localdate() + timedelta(days=1)
+        self.book(hour=9)
+        self.book(hour=10)
+        self.book(hour=11, status='cancelled')
+
+        changed = bulk_set_status(Appointment.objects.filter(doctor=self.doctor), 'cancelled')
+
+        self.assertEqual(changed, 2)
+        counts = counters.status_counts(doctor=self.doctor)
+        self.assertEqual((counts['pending'], counts['cancelled']), (0, 3))
+        self.assertFalse(any(counters.hourly_counts(self.doctor, day).values()))
+        self.assertEqual(counters.hourly_counts(self.doctor, day, ['cancelled']), {9: 1, 10: 1, 11: 1})
+        self.assertEqual(self.stored_counts(), self.expected_counts())
+
+    def test_nothing_to_change(self):
+        self.book(status='cancelled')
+
+        self.assertEqual(bulk_set_status(Appointment.objects.all(), 'cancelled'), 0)
+
+
+class CounterTests(AppointmentTestCase):
+    def setUp(self):
+        self.day = timezone.localdate() + timedelta(days=1)
+
+    def test_create(self):
+        self.book(hour=9)
+        self.book(hour=9, status='confirmed')
+        self.book(days=2, hour=9)
+
+        self.assertEqual(counters.hourly_counts(self.doctor, self.day), {9: 2})
+        self.assertEqual(counters.status_counts(doctor=self.doctor, date=self.day)['pending'], 1)
+        self.assertEqual(counters.status_counts(doctor=self.doctor)['pending'], 2)
+        self.assertEqual(counters.status_counts()['confirmed'], 1)
+        self.assertEqual(self.stored_counts(), self.expected_counts())
+
+    def test_totals_read_one_row_per_status(self):
+        other = Doctor.objects.create(name='Karim', specialization='Skin', email='karim@example.com', phone='')
+        for days in range(1, 4):
+            self.book(days=days)
+            self.book(days=days, doctor=other)
+
+        with self.assertNumQueries(1):
+            counts = counters.status_counts()
+        self.assertEqual(counts['pending'], 6)
+        self.assertEqual(AppointmentTotal.objects.filter(doctor=None).count(), 1)
+        self.assertEqual(counters.status_counts(doctor=other)['pending'], 3)
+
+    def test_status_change(self):
+        appointment = self.book(hour=9)
+
+        appointment.status = 'cancelled'
+        appointment.save()
+
+        self.assertFalse(any(counters.hourly_counts(self.doctor, self.day).values()))
+        counts = counters.status_counts(doctor=self.doctor)
+        self.assertEqual((counts['pending'], counts['cancelled']), (0, 1))
+        self.assertEqual(self.stored_counts(), self.expected_counts())
+
+    def test_reschedule(self):
+        appointment = self.book(hour=9)
+
+        reschedule(appointment, self.day + timedelta(days=1), time(14))
+
+        self.assertFalse(any(counters.hourly_counts(self.doctor, self.day).values()))
+        self.assertEqual(counters.hourly_counts(self.doctor, self.day + timedelta(days=1)), {14: 1})
+        self.assertEqual(self.stored_counts(), self.expected_counts())
+
+    def test_reschedule_into_a_full_hour_is_rejected(self):
+        appointment = self.book(hour=9)
+        HourlyAppointmentCounter.objects.create(
+            doctor=self.doctor, date=self.day, hour=10, status='confirmed', count=counters.HOURLY_CAPACITY
+        )
+
+        with self.assertRaises(ValidationError):
+            reschedule(appointment, self.day, time(10))
+        self.assertEqual(counters.hourly_counts(self.doctor, self.day)[9], 1)
+
+    def test_delete(self):
+        appointment = self.book(hour=9)
+        self.book(hour=9)
+
+        appointment.delete()
+
+        self.assertEqual(counters.hourly_counts(self.doctor, self.day), {9: 1})
+        self.assertEqual(self.stored_counts(), self.expected_counts())
+
+    def test_reconcile_repairs_drift(self):
+        self.book(hour=9)
+        self.book(hour=10, status='completed')
+        expected = self.expected_counts()
+        # Drift: wrong counts, missing rows and rows with no appointments
+        HourlyAppointmentCounter.objects.filter(hour=9).update(count=5)
+        HourlyAppointmentCounter.objects.filter(hour=10).delete()
+        HourlyAppointmentCounter.objects.create(doctor=self.doctor, date=self.day, hour=15, status='pending', count=2)
+        AppointmentCounter.objects.filter(status='pending').update(count=3)
+        AppointmentCounter.objects.filter(status='completed').delete()
+        AppointmentTotal.objects.filter(doctor=None, status='pending').update(count=7)
+        AppointmentTotal.objects.create(doctor=None, status='cancelled', count=1)
+
+        call_command('reconcile_appointment_counters', '--dry-run', stdout=StringIO())
+        self.assertNotEqual(self.stored_counts(), expected)
+
+        call_command('reconcile_appointment_counters', stdout=StringIO())
+        self.assertEqual(self.stored_counts(), expected)
+
+
+LOCMEM_CACHE = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+
+
+@override_settings(CACHES=LOCMEM_CACHE, RATE_LIMIT_ENABLED=True, RATE_LIMITS={'test': '4/m'})
+class RateLimitTests(SimpleTestCase):
+    # Start of a one-minute period
+    start = 60 * 28_000_000
+
+    def setUp(self):
+        cache.clear()
+
+    def test_parse_rate(self):
+        self.assertEqual(parse_rate('10/m'), (10, 60))
+        self.assertEqual(parse_rate('100/5m'), (100, 300))
+        self.assertEqual(parse_rate('1/d'), (1, 86400))
+
+    def test_allows_up_to_the_limit_then_rejects_until_the_period_ends(self):
+        for _ in range(4):
+            self.assertEqual(hit('test', 'ip:1', '4/m', now=self.start + 10), 0)
+
+        self.assertEqual(hit('test', 'ip:1', '4/m', now=self.start + 10), 50)
+        self.assertEqual(hit('test', 'ip:1', '4/m', now=self.start + 59.5), 1)
+
+    def test_limits_are_per_client(self):
+        for _ in range(4):
+            hit('test', 'ip:1', '4/m', now=self.start)
+
+        self.assertEqual(hit('test', 'ip:2', '4/m', now=self.start), 0)
+
+    def test_previous_period_decays_across_the_next(self):
+        for _ in range(4):
+            hit('test', 'ip:1', '4/m', now=self.start)
+
+        # All four still count at the start of the next period; a quarter of
+        # them has decayed after 15 seconds
+        self.assertEqual(hit('test', 'ip:1', '4/m', now=self.start + 60), 15)
+        # 2 of the 4 remain after 30 seconds, plus the 2 of this period
+        self.assertEqual(hit('test', 'ip:1', '4/m', now=self.start + 90), 0)
+        # Two periods later the first one no longer counts
+        for _ in range(4):
+            self.assertEqual(hit('test', 'ip:1', '4/m', now=self.start + 180), 0)
+
+    def test_async_hit_counts_with_hit(self):
+        for _ in range(3):
+            hit('test', 'ip:1', '4/m', now=self.start)
+
+        self.assertEqual(async_to_sync(ahit)('test', 'ip:1', '4/m', now=self.start), 0)
+        self.assertEqual(async_to_sync(ahit)('test', 'ip:1', '4/m', now=self.start + 20), 40)
+
+    def test_rejected_requests_get_429_with_retry_after(self):
+        view = rate_limit('test')(lambda request: HttpResponse('ok'))
+        request = RequestFactory().get('/', REMOTE_ADDR='10.0.0.1')
+        request.user = AnonymousUser()
+
+        responses = [view(request) for _ in range(5)]
+
+        self.assertEqual([r.status_code for r in responses], [200] * 4 + [429])
+        self.assertTrue(1 <= int(responses[-1]['Retry-After']) <= 60)
+
+    @override_settings(RATE_LIMIT_TRUSTED_PROXIES=1)
+    def test_clients_behind_a_proxy_are_limited_apart(self):
+        view = rate_limit('test')(lambda request: HttpResponse('ok'))
+        factory = RequestFactory()
+
+        def post(forwarded_for):
+            request = factory.post('/', REMOTE_ADDR='10.0.0.1', HTTP_X_FORWARDED_FOR=forwarded_for)
+            request.user = AnonymousUser()
+            return view(request).status_code
+
+        self.assertEqual([post('203.0.113.7') for _ in range(5)], [200] * 4 + [429])
+        # Another client through the same proxy has its own allowance
+        self.assertEqual(post('198.51.100.2'), 200)
+        # A forged left-most hop does not reset the proxy-appended one
+        self.assertEqual(post('192.0.2.99, 203.0.113.7'), 429)
+
+
+class ChangesSinceTests(AppointmentTestCase):
+    fields = ('id', 'updated_at')
+
+    def setUp(self):
+        self.now = timezone.now()
+        self.stamp = self.now - timedelta(minutes=5)
+
+    def touch(self, appointment, updated_at):
+        Appointment.objects.filter(pk=appointment.pk).update(updated_at=updated_at)
+
+    def changes(self, cursor=None, limit=2, now=None):
+        rows, cursor, has_more = changes_since(
+            Appointment.objects.filter(doctor=self.doctor), self.fields, cursor, limit, now or self.now
+        )
+        return [row['id'] for row in rows], cursor, has_more
+
+    def test_cursor_round_trip(self):
+        updated_at = self.now.replace(microsecond=123456)
+
+        self.assertEqual(decode_cursor(encode_cursor(updated_at, 42)), (updated_at, 42))
+        with self.assertRaises(ValueError):
+            decode_cursor('not a cursor')
+
+    def test_pages_through_equal_stamps_by_id(self):
+        appointments = [self.book(hour=hour) for hour in (9, 10, 11)]
+        for appointment in appointments:
+            self.touch(appointment, self.stamp)
+
+        first, cursor, has_more = self.changes()
+        self.assertEqual(first, [appointments[0].pk, appointments[1].pk])
+        self.assertTrue(has_more)
+
+        second, cursor, has_more = self.changes(cursor)
+        self.assertEqual(second, [appointments[2].pk])
+        self.assertFalse(has_more)
+
+        self.assertEqual(self.changes(cursor), ([], cursor, False))
+
+    def test_returns_changed_rows_again(self):
+        first, second = self.book(hour=9), self.book(hour=10)
+        self.touch(first, self.stamp)
+        self.touch(second, self.stamp)
+        _, cursor, _ = self.changes()
+
+        self.touch(first, self.stamp + timedelta(minutes=1))
+
+        rows, _, has_more = self.changes(cursor)
+        self.assertEqual(rows, [first.pk])
+        self.assertFalse(has_more)
+
+    def test_cursor_stays_behind_the_safety_lag(self):
+        old, recent = self.book(hour=9), self.book(hour=10)
+        self.touch(old, self.stamp)
+        self.touch(recent, self.now - SYNC_SAFETY_LAG / 2)
+
+        rows, cursor, _ = self.changes()
+        self.assertEqual(rows, [old.pk, recent.pk])
+        self.assertEqual(decode_cursor(cursor), (self.now - SYNC_SAFETY_LAG, 0))
+
+        # The recent row may have had an older one committed around it: it is
+        # sent again until it leaves the lag
+        self.assertEqual(self.changes(cursor)[0], [recent.pk])
+        later = self.now + SYNC_SAFETY_LAG
+        rows, cursor, _ = self.changes(cursor, now=later)
+        self.assertEqual(rows, [recent.pk])
+        self.assertEqual(self.changes(cursor, now=later)[0], [])
+
+
+class FakeResponse:
+    def __init__(self, status_code):
+        self.status_code = status_code
+
+
+@override_settings(CACHES=LOCMEM_CACHE)
+class CircuitBreakerTests(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+        self.breaker = CircuitBreaker(
+            'test', 'Test service unavailable', window_seconds=60, minimum_calls=3,
+            failure_rate=0.5, slow_call_seconds=5, slow_call_rate=0.5, open_seconds=30,
+        )
+        self.addCleanup(BREAKERS.pop, 'test')
+        silenced = mock.patch.object(circuit_breaker.logger, 'disabled', True)
+        silenced.start()
+        self.addCleanup(silenced.stop)
+
+    def respond(self, status_code):
+        return self.breaker.call(lambda: FakeResponse(status_code))
+
+    def trip(self):
+        for status_code in (200, 500, 503):
+            self.respond(status_code)
+
+    def end_open_period(self):
+        cache.set(self.breaker.key, clock.time() - 1, timeout=None)
+
+    def test_opens_once_the_failure_rate_is_crossed(self):
+        self.respond(200)
+        self.respond(500)
+        self.assertEqual(self.breaker.state(), CLOSED)
+
+        self.assertEqual(self.respond(429).status_code, 429)
+
+        self.assertEqual(self.breaker.state(), OPEN)
+
+    def test_failures_below_the_minimum_calls_keep_it_closed(self):
+        self.respond(500)
+        self.respond(500)
+
+        self.assertEqual(self.breaker.state(), CLOSED)
+
+    def test_exceptions_count_as_failures(self):
+        def fail():
+            raise ConnectionError
+
+        for _ in range(3):
+            with self.assertRaises(ConnectionError):
+                self.breaker.call(fail)
+
+        self.assertEqual(self.breaker.state(), OPEN)
+
+    def test_open_breaker_rejects_without_calling(self):
+        self.trip()
+        calls = []
+
+        with self.assertRaisesMessage(CircuitOpenError, 'Test service unavailable'):
+            self.breaker.call(lambda: calls.append(1))
+
+        self.assertEqual(calls, [])
+        self.assertEqual(self.breaker.stats()['rejected'], 1)
+
+    def test_successful_probe_closes_it(self):
+        self.trip()
+        self.end_open_period()
+        self.assertEqual(self.breaker.state(), HALF_OPEN)
+
+        self.respond(200)
+
+        self.assertEqual(self.breaker.state(), CLOSED)
+        stats = self.breaker.stats()
+        self.assertEqual(stats['window_calls'], 0)
+        self.assertEqual(stats['transitions'], {OPEN: 1, HALF_OPEN: 1, CLOSED: 1})
+
+    def test_failed_probe_reopens_it(self):
+        self.trip()
+        self.end_open_period()
+
+        self.respond(500)
+
+        self.assertEqual(self.breaker.state(), OPEN)
+        self.assertGreater(cache.get(self.breaker.key), clock.time() + 25)
+
+    def test_only_one_probe_at_a_time(self):
+        self.trip()
+        self.end_open_period()
+
+        def second_caller():
+            with self.assertRaises(CircuitOpenError):
+                self.respond(200)
+            return FakeResponse(200)
+
+        self.breaker.call(second_caller)
+
+        self.assertEqual(self.breaker.state(), CLOSED)
+
+    def test_slow_calls_open_it(self):
+        # Each call reads the clock before and after
+        with mock.patch('appointments.circuit_breaker.time.monotonic', side_effect=[0, 10] * 3):
+            for _ in range(3):
+                self.respond(200)
+
+        self.assertEqual(self.breaker.state(), OPEN)
+
+    def test_async_calls_go_through_the_same_breaker(self):
+        async def respond(status_code):
+            return FakeResponse(status_code)
+
+        self.trip()
+        self.end_open_period()
+
+        async_to_sync(self.breaker.acall)(respond, 200)
+
+        self.assertEqual(self.breaker.state(), CLOSED)
+
+
+class MeetingPoolTests(AppointmentTestCase):
+    def pool(self, hour, meeting_id):
+        return PooledMeeting.objects.create(
+            meeting_id=meeting_id,
+            join_url=f'https://zoom.example.com/j/{meeting_id}',
+            start_url=f'https://zoom.example.com/s/{meeting_id}',
+            password='pw',
+            start_time=hour,
+        )
+
+    def test_confirmation_claims_the_meeting_of_its_hour_in_one_statement(self):
+        appointment = self.book(hour=10)
+        hour = meeting_pool.slot_hour(appointment.appointment_date, appointment.appointment_time)
+        self.pool(hour - timedelta(hours=1), '111')
+        self.pool(hour, '222')
+
+        with CaptureQueriesContext(connection) as queries:
+            bulk_set_status(Appointment.objects.filter(pk=appointment.pk), 'confirmed')
+
+        appointment.refresh_from_db()
+        self.assertEqual(appointment.zoom_meeting_id, '222')
+        self.assertEqual(appointment.zoom_join_url, 'https://zoom.example.com/j/222')
+        meeting = PooledMeeting.objects.get(meeting_id='222')
+        self.assertEqual((meeting.status, meeting.appointment_id), ('assigned', appointment.pk))
+        self.assertEqual(PooledMeeting.objects.get(meeting_id='111').status, 'available')
+        pool_queries = [q['sql'] for q in queries.captured_queries if 'pooledmeeting' in q['sql']]
+        self.assertEqual(len(pool_queries), 1)
+        self.assertTrue(pool_queries[0].startswith('UPDATE'))
+        self.assertEqual(list(ZoomSyncTask.objects.values_list('meeting_id', 'action')), [('222', 'update')])
+
+    def test_other_hours_are_used_when_its_own_has_none(self):
+        appointment = self.book(hour=10)
+        hour = meeting_pool.slot_hour(appointment.appointment_date, appointment.appointment_time)
+        self.pool(hour + timedelta(hours=3), '333')
+
+        self.assertTrue(meeting_pool.assign(appointment))
+        self.assertEqual(appointment.zoom_meeting_id, '333')
+
+    def test_empty_pool(self):
+        appointment = self.book(hour=10)
+        self.pool(timezone.now() - timedelta(hours=2), '444')
+
+        self.assertFalse(meeting_pool.assign(appointment))
+        self.assertEqual(PooledMeeting.objects.get().status, 'available')
+        self.assertFalse(ZoomSyncTask.objects.exists())
+
+
+class FakeBkashService:
+    """Stands in for BkashPaymentService: answers status queries from ``status``, records refunds"""
+
+    status = None
+
+    def __init__(self):
+        self.queries = []
+        self.refunds = []
+
+    def query_payment(self, payment_id):
+        self.queries.append(payment_id)
+        return self.status
+
+    def refund_payment(self, payment_id, transaction_id, amount, reason):
+        self.refunds.append(payment_id)
+        return {'success': True, 'refund_trx_id': f'RFD{len(self.refunds)}'}
+
+    def _unavailable(self, error):
+        return {'success': False, 'unavailable': True, 'message': str(error)}
+
+
+class FakeToken:
+    def __init__(self, service):
+        pass
+
+    def ensure(self):
+        pass
+
+
+class RefundQueueTests(AppointmentTestCase):
+    def setUp(self):
+        self.service = FakeBkashService()
+        for target, fake in (('BkashPaymentService', lambda: self.service), ('SharedToken', FakeToken)):
+            patcher = mock.patch(f'appointments.refunds.{target}', fake)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        appointment = self.book(status='cancelled', payment_status='paid')
+        self.payment = self.pay(appointment, status='completed', bkash_transaction_id='TRX1')
+
+    def queue(self, attempts=0):
+        refund = refunds.enqueue(self.payment)
+        Refund.objects.filter(pk=refund.pk).update(attempts=attempts)
+        return refund
+
+    def test_first_attempt_sends_the_refund(self):
+        refund = self.queue()
+
+        self.assertEqual(refunds.process_batch(), (1, 0))
+
+        self.assertEqual(self.service.queries, [])
+        self.assertEqual(self.service.refunds, [self.payment.payment_id])
+        refund.refresh_from_db()
+        self.assertEqual((refund.status, refund.refund_trx_id), ('refunded', 'RFD1'))
+        self.payment.refresh_from_db()
+        self.assertEqual(self.payment.status, 'refunded')
+        self.assertEqual(self.payment.appointment.payment_status, 'refunded')
+
+    def test_retry_of_a_refund_bkash_already_made_is_not_sent_again(self):
+        refund = self.queue(attempts=1)
+        self.service.status = {'statusCode': '0000', 'transactionStatus': 'Refunded'}
+
+        self.assertEqual(refunds.process_batch(), (1, 0))
+
+        self.assertEqual(self.service.queries, [self.payment.payment_id])
+        self.assertEqual(self.service.refunds, [])
+        refund.refresh_from_db()
+        self.assertEqual(refund.status, 'refunded')
+        self.payment.refresh_from_db()
+        self.assertEqual(self.payment.status, 'refunded')
+
+    def test_retry_sends_the_refund_once_bkash_confirms_it_was_not_made(self):
+        self.queue(attempts=1)
+        self.service.status = {'statusCode': '0000', 'transactionStatus': 'Completed'}
+
+        self.assertEqual(refunds.process_batch(), (1, 0))
+
+        self.assertEqual(self.service.refunds, [self.payment.payment_id])
+
+    def test_unavailable_status_keeps_the_refund_pending_without_using_an_attempt(self):
+        refund = self.queue(attempts=1)
+        self.service.status = self.service._unavailable('bKash is temporarily unavailable')
+
+        self.assertEqual(refunds.process_batch(), (0, 1))
+
+        self.assertEqual(self.service.refunds, [])
+        refund.refresh_from_db()
+        self.assertEqual((refund.status, refund.attempts), ('pending', 1))
+        self.assertGreater(refund.next_attempt_at, timezone.now())
+        self.assertEqual(refund.last_error, 'bKash is temporarily unavailable')
+
+    def test_unknown_status_is_retried_later_without_sending(self):
+        refund = self.queue(attempts=1)
+
+        self.assertEqual(refunds.process_batch(), (0, 1))
+
+        self.assertEqual(self.service.refunds, [])
+        refund.refresh_from_db()
+        self.assertEqual((refund.status, refund.attempts), ('pending', 2))
+
+    def test_enqueue_returns_the_existing_refund(self):
+        first = refunds.enqueue(self.payment)
+        second = refunds.enqueue(self.payment, reason='Queued again')
+
+        self.assertEqual(first, second)
+        self.assertEqual(Refund.objects.get().idempotency_key, f'payment-{self.payment.pk}')
+
+
+@override_settings(CACHES=LOCMEM_CACHE, APPOINTMENT_CACHE_TIMEOUT=60)
+class CachingTests(SimpleTestCase):
+    key = 'appt:test:key'
+
+    def setUp(self):
+        cache.clear()
+
+    def compute(self, value):
+        calls = []
+
+        def compute():
+            calls.append(1)
+            return value
+        return compute, calls
+
+    def test_fresh_value_is_served_from_the_cache(self):
+        compute, calls = self.compute('new')
+        cache.set(self.key, ('cached', clock.time() + 30))
+
+        self.assertEqual(caching.get_or_set(self.key, compute), 'cached')
+        self.assertEqual(calls, [])
+
+    def test_expired_value_is_recomputed(self):
+        compute, calls = self.compute('new')
+        cache.set(self.key, ('old', clock.time() - 1))
+
+        self.assertEqual(caching.get_or_set(self.key, compute), 'new')
+        self.assertEqual(cache.get(self.key)[0], 'new')
+        self.assertFalse(cache.get(f'{self.key}:lock'))
+
+    def test_stale_value_is_served_while_another_caller_recomputes(self):
+        compute, calls = self.compute('new')
+        cache.set(self.key, ('old', clock.time() - 1))
+        cache.add(f'{self.key}:lock', 1)
+
+        self.assertEqual(caching.get_or_set(self.key, compute), 'old')
+        self.assertEqual(calls, [])
+
+    def test_without_a_value_callers_wait_for_the_recompute(self):
+        compute, calls = self.compute('mine')
+        cache.add(f'{self.key}:lock', 1)
+
+        def lock_holder_finishes(seconds):
+            cache.set(self.key, ('theirs', clock.time() + 60))
+
+        with mock.patch('appointments.caching.time.sleep', side_effect=lock_holder_finishes):
+            self.assertEqual(caching.get_or_set(self.key, compute), 'theirs')
+        self.assertEqual(calls, [])
+
+    def test_bump_moves_the_scope_to_new_keys(self):
+        scope = caching.doctor_scope(7)
+        key = caching.make_key(scope, 'slots')
+        other_key = caching.make_key(caching.doctor_scope(8), 'slots')
+        caching.get_or_set(key, lambda: 'before')
+
+        caching.bump(scope)
+
+        self.assertNotEqual(caching.make_key(scope, 'slots'), key)
+        self.assertEqual(caching.get_or_set(caching.make_key(scope, 'slots'), lambda: 'after'), 'after')
+        # Other doctors keep their keys
+        self.assertEqual(caching.make_key(caching.doctor_scope(8), 'slots'), other_key)
+
+
+class FakeZoomService:
+    """Stands in for ZoomService, recording the meeting calls"""
+
+    def __init__(self, ok=True):
+        self.ok = ok
+        self.calls = []
+
+    def get_access_token(self):
+        return 'token'
+
+    def update_meeting(self, meeting_id, **details):
+        self.calls.append(('update', meeting_id, details['start_time']))
+        return self.ok
+
+    def delete_meeting(self, meeting_id):
+        self.calls.append(('delete', meeting_id))
+        return self.ok
+
+
+@override_settings(CACHES=LOCMEM_CACHE)
+class ZoomSyncTests(AppointmentTestCase):
+    def setUp(self):
+        cache.clear()
+        self.service = FakeZoomService()
+        patcher = mock.patch('appointments.zoom_sync.ZoomService', lambda: self.service)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.appointment = self.book(hour=9, status='confirmed', zoom_meeting_id='999')
+
+    def test_changes_to_a_meeting_fold_into_its_pending_task(self):
+        day = self.appointment.appointment_date
+        reschedule(self.appointment, day, time(10))
+        reschedule(self.appointment, day, time(11))
+        self.assertEqual(list(ZoomSyncTask.objects.values_list('action', flat=True)), ['update'])
+
+        bulk_set_status(Appointment.objects.filter(pk=self.appointment.pk), 'cancelled')
+
+        self.assertEqual(list(ZoomSyncTask.objects.values_list('action', flat=True)), ['delete'])
+
+    def test_due_tasks_of_one_meeting_make_one_call_with_the_current_time(self):
+        for _ in range(3):
+            ZoomSyncTask.objects.create(appointment=self.appointment, meeting_id='999', action='update')
+        reschedule(self.appointment, self.appointment.appointment_date, time(15))
+
+        self.assertEqual(zoom_sync.process_batch(), (1, 0))
+
+        self.assertEqual(len(self.service.calls), 1)
+        action, meeting_id, start_time = self.service.calls[0]
+        self.assertEqual((action, meeting_id, start_time.hour), ('update', '999', 15))
+        self.assertFalse(ZoomSyncTask.objects.exclude(status='done').exists())
+
+    def test_delete_supersedes_updates(self):
+        ZoomSyncTask.objects.create(appointment=self.appointment, meeting_id='999', action='update')
+        ZoomSyncTask.objects.create(appointment=self.appointment, meeting_id='999', action='delete')
+
+        self.assertEqual(zoom_sync.process_batch(), (1, 0))
+
+        self.assertEqual(self.service.calls, [('delete', '999')])
+
+    def test_failed_call_puts_the_meetings_tasks_back_with_backoff(self):
+        self.service.ok = False
+        ZoomSyncTask.objects.create(appointment=self.appointment, meeting_id='999', action='update')
+
+        self.assertEqual(zoom_sync.process_batch(), (0, 1))
+
+        task = ZoomSyncTask.objects.get()
+        self.assertEqual((task.status, task.attempts), ('pending', 1))
+        self.assertGreater(task.next_attempt_at, timezone.now())
+
+
+class ReplicaTests(TestCase):
+    """Routing with one configured replica; its health checks pass unless a test says otherwise"""
+
+    def setUp(self):
+        mock.patch.object(replicas, 'REPLICAS', ['replica_0']).start()
+        mock.patch.object(replicas, '_states', {'replica_0': replicas.ReplicaState()}).start()
+        self.check = mock.patch.object(replicas, 'check', return_value=True).start()
+        self.addCleanup(mock.patch.stopall)
+        self.factory = RequestFactory()
+
+    def serve(self, request, view):
+        return replicas.ReplicaPinMiddleware(view)(request)
+
+    def test_write_pins_the_browser_to_the_primary(self):
+        def view(request):
+            Doctor.objects.create(name='Karim', specialization='Skin', email='karim@example.com', phone='')
+            return HttpResponse('ok')
+
+        response = self.serve(self.factory.get('/'), view)
+
+        self.assertIn(replicas.PIN_COOKIE, response.cookies)
+        self.assertEqual(response.cookies[replicas.PIN_COOKIE]['max-age'], settings.REPLICA_PIN_SECONDS)
+
+    def test_reads_do_not_pin(self):
+        def view(request):
+            list(Doctor.objects.all())
+            return HttpResponse('ok')
+
+        self.assertNotIn(replicas.PIN_COOKIE, self.serve(self.factory.get('/'), view).cookies)
+        self.assertIn(replicas.PIN_COOKIE, self.serve(self.factory.post('/'), view).cookies)
+
+    def test_pinned_request_reads_the_primary(self):
+        used = []
+
+        @replicas.replica_reads
+        def view(request):
+            used.append(Doctor.objects.all().db)
+            return HttpResponse('ok')
+
+        view(self.factory.get('/'))
+        pinned = self.factory.get('/')
+        pinned.COOKIES[replicas.PIN_COOKIE] = '1'
+        view(pinned)
+        view(self.factory.post('/'))
+
+        self.assertEqual(used, ['replica_0', 'default', 'default'])
+
+    def test_cached_values_are_computed_from_the_primary(self):
+        @replicas.replica_reads
+        def view(request):
+            with replicas.primary():
+                return HttpResponse(Doctor.objects.all().db)
+
+        self.assertEqual(view(self.factory.get('/')).content, b'default')
+
+    def test_view_is_run_again_on_the_primary_when_the_replica_fails(self):
+        used = []
+
+        @replicas.replica_reads
+        def view(request):
+            used.append(Doctor.objects.all().db)
+            if used[-1] != 'default':
+                raise OperationalError('replica went away')
+            return HttpResponse('ok')
+
+        self.check.side_effect = [True, False]
+        self.assertEqual(view(self.factory.get('/')).status_code, 200)
+        self.assertEqual(used, ['replica_0', 'default'])
+
+
+class FakeSMTPConnection:
+    """Email connection whose server rejects every message with ``error``"""
+
+    def __init__(self, error):
+        self.error = error
+
+    def open(self):
+        pass
+
+    def close(self):
+        pass
+
+    def send_messages(self, messages):
+        raise self.error
+
+
+class NotificationOutboxTests(AppointmentTestCase):
+    def setUp(self):
+        self.appointment = self.book()
+        Notification.objects.all().delete()
+
+    def test_due_notifications_are_sent(self):
+        notification = notifications.enqueue('appointment_confirmed', self.appointment)
+
+        self.assertEqual(notifications.send_batch(), (1, 0))
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(mail.outbox[0].to, ['patient@example.com'])
+        notification.refresh_from_db()
+        self.assertEqual((notification.status, notification.attempts), ('sent', 1))
+        self.assertEqual(notifications.send_batch(), (0, 0))
+
+    def test_patient_without_email_is_not_queued(self):
+        User.objects.filter(patient=self.patient).update(email='')
+        self.appointment.refresh_from_db()
+
+        self.assertIsNone(notifications.enqueue('appointment_confirmed', self.appointment))
+        self.assertFalse(Notification.objects.exists())
+
+    def test_rejected_message_is_retried_with_backoff(self):
+        notification = notifications.enqueue('appointment_confirmed', self.appointment)
+        rejecting = FakeSMTPConnection(smtplib.SMTPDataError(554, b'rejected'))
+
+        before = timezone.now()
+        self.assertEqual(notifications.send_batch(connection=rejecting), (0, 1))
+        notification.refresh_from_db()
+        self.assertEqual((notification.status, notification.attempts), ('pending', 1))
+        self.assertGreaterEqual(notification.next_attempt_at, before + notifications.retry_delay(1))
+        # Not due again until the backoff has passed
+        self.assertEqual(notifications.send_batch(connection=rejecting), (0, 0))
+
+    def test_gives_up_after_the_last_attempt(self):
+        notification = notifications.enqueue('appointment_confirmed', self.appointment)
+        rejecting = FakeSMTPConnection(smtplib.SMTPDataError(554, b'rejected'))
+
+        notifications.send_batch(max_attempts=1, connection=rejecting)
+        notification.refresh_from_db()
+        self.assertEqual(notification.status, 'failed')
+        self.assertIn('rejected', notification.last_error)
+
+    def test_backoff_doubles_up_to_an_hour(self):
+        delays = [notifications.retry_delay(attempts) for attempts in (1, 2, 3, 10)]
+        self.assertEqual(delays, [timedelta(minutes=m) for m in (1, 2, 4, 60)])
+
+
+class FakeSender:
+    """Reminder sender that returns ``result``, or raises it when it is an exception"""
+
+    def __init__(self, result=True):
+        self.result = result
+        self.sent = []
+
+    def send(self, reminder):
+        if isinstance(self.result, Exception):
+            raise self.result
+        self.sent.append(reminder.pk)
+        return self.result
+
+
+@override_settings(REMINDER_LEAD_MINUTES=[24 * 60, 60], REMINDER_CHANNELS=['email', 'sms'])
+class ReminderTests(AppointmentTestCase):
+    def setUp(self):
+        self.appointment = self.book(days=2, status='confirmed')
+        self.start = reminders.appointment_start(self.appointment)
+        Reminder.objects.all().delete()
+
+    def test_one_reminder_per_lead_time_and_channel(self):
+        self.assertEqual(reminders.schedule(self.appointment), 4)
+
+        for reminder in Reminder.objects.filter(appointment=self.appointment):
+            self.assertEqual(reminder.due_at, self.start - timedelta(minutes=reminder.lead_minutes))
+            self.assertEqual(reminder.bucket, reminders.bucket_for(reminder.due_at))
+
+    def test_lead_times_already_passed_are_skipped(self):
+        now = self.start - timedelta(hours=2)
+
+        self.assertEqual(reminders.schedule(self.appointment, now=now), 2)
+        self.assertEqual(set(Reminder.objects.values_list('lead_minutes', flat=True)), {60})
+
+    def test_rescheduling_replaces_pending_reminders(self):
+        reminders.schedule(self.appointment)
+        Reminder.objects.filter(lead_minutes=24 * 60, channel='email').update(status='sent')
+
+        reminders.schedule(self.appointment)
+        self.assertEqual(Reminder.objects.filter(status='pending').count(), 4)
+        self.assertEqual(Reminder.objects.filter(status='sent').count(), 1)
+
+        reminders.cancel(self.appointment)
+        self.assertEqual(list(Reminder.objects.values_list('status', flat=True)), ['sent'])
+
+    def test_dispatch_sends_due_reminders(self):
+        reminders.schedule(self.appointment)
+        now = self.start - timedelta(minutes=30)
+        email, sms = FakeSender(), FakeSender(result=False)
+
+        outcome = reminders.dispatch_due(now=now, senders={'email': email, 'sms': sms})
+        self.assertEqual(outcome, {'sent': 2, 'skipped': 2, 'failed': 0})
+        self.assertEqual(len(email.sent), 2)
+        self.assertEqual(
+            Counter(Reminder.objects.values_list('channel', 'status')),
+            Counter({('email', 'sent'): 2, ('sms', 'skipped'): 2}),
+        )
+
+    def test_reminders_of_unconfirmed_appointments_are_skipped(self):
+        reminders.schedule(self.appointment)
+        Appointment.objects.filter(pk=self.appointment.pk).update(status='cancelled')
+        email = FakeSender()
+
+        reminders.dispatch_due(now=self.start - timedelta(minutes=30), senders={'email': email, 'sms': email})
+        self.assertEqual(email.sent, [])
+        self.assertFalse(Reminder.objects.exclude(status='skipped').exists())
+
+    @override_settings(REMINDER_MAX_ATTEMPTS=2)
+    def test_failed_send_moves_to_a_later_bucket_until_the_last_attempt(self):
+        reminders.schedule(self.appointment)
+        Reminder.objects.exclude(lead_minutes=60, channel='email').delete()
+        now = self.start - timedelta(minutes=30)
+        senders = {'email': FakeSender(result=OSError('gateway down'))}
+
+        self.assertEqual(reminders.dispatch_due(now=now, senders=senders)['failed'], 1)
+        reminder = Reminder.objects.get()
+        self.assertEqual((reminder.status, reminder.attempts), ('pending', 1))
+        self.assertEqual(reminder.bucket, reminders.bucket_for(now) + 1)
+        # Not picked up again until its new bucket comes round
+        self.assertEqual(reminders.dispatch_due(now=now, senders=senders)['failed'], 0)
+
+        later = now + timedelta(seconds=settings.REMINDER_BUCKET_SECONDS)
+        reminders.dispatch_due(now=later, senders=senders)
+        reminder.refresh_from_db()
+        self.assertEqual((reminder.status, reminder.last_error), ('failed', 'gateway down'))
+
+
+@override_settings(CACHES=LOCMEM_CACHE)
+class PrefixIndexTests(AppointmentTestCase):
+    def setUp(self):
+        cache.clear()
+        self.index = PrefixIndex()
+
+    def names(self, query):
+        return [doctor['name'] for doctor in self.index.lookup(query)]
+
+    def test_every_word_must_prefix_a_name_or_specialization_word(self):
+        self.assertEqual(self.names('rah card'), ['Rahman'])
+        self.assertEqual(self.names('rah neuro'), [])
+        self.assertEqual(self.names('  '), [])
+
+    def test_doctor_change_rebuilds_every_index_once_committed(self):
+        other = PrefixIndex()
+        self.assertEqual(self.names('rah'), ['Rahman'])
+        other.lookup('rah')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Doctor.objects.create(name='Rahim', specialization='Neurology', email='rahim@example.com', phone='')
+            # Nothing is rebuilt before the commit
+            self.assertEqual(self.names('rah'), ['Rahman'])
+
+        self.assertEqual(self.names('rah'), ['Rahim', 'Rahman'])
+        self.assertEqual([doctor['name'] for doctor in other.lookup('rah')], ['Rahim', 'Rahman'])
+
+    def test_lookups_between_changes_reuse_the_index(self):
+        self.index.lookup('rah')
+        with mock.patch.object(self.index, 'build') as build:
+            self.index.lookup('card')
+        build.assert_not_called()
@@ -0,0 +1,187 @@
+"""
+Appointment and payment transitions, mostly applied to many rows at once
+"""
+import uuid
+from collections import Counter
+
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.db.models import Case, CharField, Value, When
+from django.utils import timezone
+
+from . import counters, metrics
+from .models import Appointment, Doctor, Payment
+from .signals import appointment_status_changed, publish_appointment_event, snapshot, state_key
+
+
+def bulk_set_status(queryset, status):
+    """
+    Move every appointment in ``queryset`` to ``status`` with one UPDATE
+
+    Unlike ``queryset.update()``, this keeps the appointment counters and
+    ``updated_at`` current and sends ``appointment_status_changed`` for each
+    appointment that actually changed.
+
+    Returns:
+        int: Number of appointments whose status changed
+    """
+    with transaction.atomic():
+        appointments = list(
+            queryset.exclude(status=status)
+            .select_related('patient__user', 'doctor')
+            .select_for_update(of=('self',))
+        )
+        if not appointments:
+            return 0
+
+        now = timezone.now()
+        Appointment.objects.filter(pk__in=[a.pk for a in appointments]).update(status=status, updated_at=now)
+
+        deltas = Counter()
+        changes = []
+        for appointment in appointments:
+            old_status = appointment.status
+            deltas[state_key(snapshot(appointment))] -= 1
+            appointment.status = status
+            appointment.updated_at = now
+            appointment._loaded_state = snapshot(appointment)
+            deltas[state_key(appointment._loaded_state)] += 1
+            changes.append((appointment, old_status))
+        counters.apply_deltas(deltas)
+
+        # Inside the transaction so receivers' writes (e.g. queued
+        # notifications) commit or roll back with the status change
+        for appointment, old_status in changes:
+            appointment_status_changed.send(
+                sender=Appointment,
+                appointment=appointment,
+                old_status=old_status,
+                new_status=status,
+            )
+    return len(changes)
+
+
+def reschedule(appointment, appointment_date, appointment_time):
+    """
+    Move a pending or confirmed appointment to another date and time
+
+    The doctor row is locked while the target hour's capacity is checked,
+    so concurrent reschedules cannot overfill an hour. The save moves the
+    appointment counters and reminders and queues the Zoom meeting update
+    through the usual signals.
+
+    Returns:
+        Appointment: The rescheduled appointment, freshly loaded
+
+    Raises:
+        ValidationError: If the appointment cannot be moved or the hour is full
+    """
+    with transaction.atomic():
+        doctor = Doctor.objects.select_for_update().get(pk=appointment.doctor_id)
+        appointment = (
+            Appointment.objects.select_related('patient__user', 'doctor')
+            .select_for_update(of=('self',))
+            .get(pk=appointment.pk)
+        )
+        if appointment.status not in counters.BOOKED_STATUSES:
+            raise ValidationError('Only pending or confirmed appointments can be rescheduled.')
+
+        same_hour = (
+            appointment.appointment_date == appointment_date
+            and appointment.appointment_time.hour == appointment_time.hour
+        )
+        booked = counters.hourly_counts(doctor, appointment_date).get(appointment_time.hour, 0)
+        if not same_hour and booked >= counters.HOURLY_CAPACITY:
+            metrics.HOURLY_LIMIT_REJECTIONS.labels('reschedule').inc()
+            raise ValidationError(
+                f'Dr. {doctor.name} is fully booked between {appointment_time.hour:02d}:00 and '
+                f'{appointment_time.hour + 1:02d}:00 on {appointment_date:%d %B %Y}.'
+            )
+
+        appointment.appointment_date = appointment_date
+        appointment.appointment_time = appointment_time
+        appointment.save(update_fields=['appointment_date', 'appointment_time', 'updated_at'])
+    return appointment
+
+
+def complete_payments(transactions):
+    """
+    Mark pending payments completed and confirm their appointments
+
+    The payment callback and ``reconcile_payments`` both apply payment
+    results through here. Each appointment is marked paid and, if still
+    pending, confirmed. A late payment does not revive a cancelled or
+    completed appointment; it is queued for a refund instead.
+
+    Args:
+        transactions: ``{payment pk: bKash transaction id}``
+
+    Returns:
+        list: Payments this call completed, with appointment, patient user
+        and doctor loaded; payments that were no longer pending are skipped
+    """
+    if not transactions:
+        return []
+    now = timezone.now()
+    trx_id = Case(
+        *(When(pk=pk, then=Value(trx)) for pk, trx in transactions.items()),
+        output_field=CharField(),
+    )
+    with transaction.atomic():
+        # The conditional UPDATE goes first: it claims rows that are still
+        # pending, so a concurrent callback or reconcile run cannot complete
+        # them twice, and on SQLite it takes the write lock before any read.
+        # The claimed rows are read back by a token unique to this call
+        token = uuid.uuid4()
+        Payment.objects.filter(pk__in=transactions, status='pending').update(
+            status='completed',
+            transaction_id=trx_id,
+            bkash_transaction_id=trx_id,
+            payment_date=now,
+            claim_token=token,
+            updated_at=now,
+        )
+        claimed = Payment.objects.filter(pk__in=transactions, claim_token=token)
+        appointment_ids = list(claimed.values_list('appointment_id', flat=True))
+        if not appointment_ids:
+            return []
+
+        Appointment.objects.filter(pk__in=appointment_ids).update(payment_status='paid', updated_at=now)
+        bulk_set_status(Appointment.objects.filter(pk__in=appointment_ids, status='pending'), 'confirmed')
+
+        payments = list(claimed.select_related('appointment__patient__user', 'appointment__doctor'))
+        # Imported here: refunds -> transitions
+        from .refunds import enqueue
+        for payment in payments:
+            if payment.appointment.status in ('cancelled', 'completed'):
+                # Paid after the appointment was cancelled (late callback or
+                # reconciliation): nothing else would refund it
+                enqueue(payment, reason=f'Payment received for a {payment.appointment.status} appointment')
+            publish_appointment_event('payment.completed', payment.appointment, payment.appointment.status)
+    return payments
+
+
+def fail_payments(pks):
+    """
+    Mark pending payments failed
+
+    Returns:
+        int: Number of payments that changed
+    """
+    return Payment.objects.filter(pk__in=pks, status='pending').update(status='failed', updated_at=timezone.now())
+
+
+def refund_payments(pks):
+    """
+    Mark completed payments refunded, together with their appointments
+
+    Returns:
+        int: Number of payments that changed
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        # Writes only, so SQLite takes the write lock up front
+        Appointment.objects.filter(payments__pk__in=pks, payments__status='completed').update(
+            payment_status='refunded', updated_at=now
+        )
+        return Payment.objects.filter(pk__in=pks, status='completed').update(status='refunded', updated_at=now)
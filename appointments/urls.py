@@ -21,6 +21,7 @@ urlpatterns = [
     path('appointments/book/', views.book_appointment, name='book_appointment'),
     path('appointments/<int:appointment_id>/', views.appointment_detail, name='appointment_detail'),
     path('appointments/<int:appointment_id>/cancel/', views.cancel_appointment, name='cancel_appointment'),
+    path('appointments/<int:appointment_id>/reschedule/', views.reschedule_appointment, name='reschedule_appointment'),
     path('appointments/<int:appointment_id>/generate-zoom/', views.generate_zoom_link, name='generate_zoom_link'),
     
     # Payments
@@ -30,10 +31,18 @@ urlpatterns = [
     path('appointments/<int:appointment_id>/payment/success/', views.payment_success, name='payment_success'),
     
     # AJAX endpoints
+    path('api/slots/<int:doctor_id>/range/', views.get_availability_range, name='get_availability_range'),
     path('api/slots/<int:doctor_id>/<str:date>/', views.get_available_slots, name='get_available_slots'),
+    path('api/search/earliest/', views.search_earliest_slots, name='search_earliest_slots'),
+    path('api/doctors/autocomplete/', views.doctor_autocomplete, name='doctor_autocomplete'),
+
+    # JSON API v1 (delta sync)
+    path('api/v1/patient/appointments/', views.api_patient_appointments, name='api_patient_appointments'),
+    path('api/v1/doctor/appointments/', views.api_doctor_appointments, name='api_doctor_appointments'),
     
     # Doctor Dashboard URLs
     path('doctor/dashboard/', views.doctor_dashboard, name='doctor_dashboard'),
+    path('doctor/dashboard/events/', views.doctor_events, name='doctor_events'),
     path('doctor/appointment/<int:appointment_id>/', views.doctor_appointment_detail, name='doctor_appointment_detail'),
     path('doctor/appointment/<int:appointment_id>/complete/', views.doctor_complete_appointment, name='doctor_complete_appointment'),
     path('doctor/appointment/<int:appointment_id>/confirm/', views.doctor_confirm_appointment, name='doctor_confirm_appointment'),
@@ -42,4 +51,7 @@ urlpatterns = [
     path('doctor/schedule/delete/<int:slot_id>/', views.delete_time_slot, name='delete_time_slot'),
     path('doctor/<int:doctor_id>/time-slots/', views.get_doctor_time_slots, name='get_doctor_time_slots'),
     path('doctor/profile/', views.doctor_profile, name='doctor_profile'),
+    
+    # Monitoring
+    path('metrics', views.prometheus_metrics, name='metrics'),
 ]
@@ -1,18 +1,44 @@
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth import login, logout, authenticate
 from django.contrib.auth.decorators import login_required
+from django.contrib.auth.views import redirect_to_login
 from django.contrib import messages
-from django.http import JsonResponse
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.handlers.asgi import ASGIRequest
+from django.http import Http404, HttpResponse, JsonResponse, StreamingHttpResponse
+from django.urls import reverse
 from django.utils import timezone
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import quote_etag
+from asgiref.sync import sync_to_async
 from datetime import datetime, timedelta
 from .models import Patient, Doctor, Appointment, Payment, TimeSlot
-from .forms import PatientRegistrationForm, AppointmentForm, PatientProfileForm
-from .zoom_service import create_appointment_meeting
-from .bkash_service import BkashPaymentService, initiate_appointment_payment
-from django.views.decorators.csrf import csrf_exempt
+from .forms import PatientRegistrationForm, AppointmentForm, PatientProfileForm, RescheduleForm
+from . import caching, counters, metrics
+from .transitions import complete_payments, fail_payments, reschedule
+from .events import broker, doctor_topic
+from .ratelimit import rate_limit
+from .replicas import replica_reads
+from .availability import BOOKING_WINDOW_DAYS, booking_window, earliest_slots
+from .search import prefix_index, search_doctors
+from .sync import (
+    DOCTOR_FIELDS, PATIENT_FIELDS, SYNC_MAX_PAGE_SIZE, SYNC_PAGE_SIZE,
+    changes_since, doctor_row, patient_row,
+)
+from .zoom_service import acreate_appointment_meeting, create_appointment_meeting
+from .bkash_service import BkashPaymentService, ainitiate_appointment_payment
+from functools import wraps
+import asyncio
+import hashlib
 import json
+import logging
 
 
+logger = logging.getLogger(__name__)
+
+
+@replica_reads
 def home(request):
     """Home page view"""
     # If user is logged in and is admin/staff, redirect to admin panel
@@ -25,11 +51,12 @@ def home(request):
         'doctors': doctors,
         'total_doctors': Doctor.objects.filter(is_available=True).count(),
         'total_patients': Patient.objects.count(),
-        'total_appointments': Appointment.objects.count(),
+        'total_appointments': sum(counters.status_counts().values()),
     }
     return render(request, 'appointments/home.html', context)
 
 
+@rate_limit('register', methods=('POST',))
 def register(request):
     """Patient registration view"""
     if request.user.is_authenticated:
@@ -50,6 +77,7 @@ def register(request):
     return render(request, 'appointments/register.html', {'form': form})
 
 
+@rate_limit('login', methods=('POST',))
 def user_login(request):
     """User login view"""
     if request.user.is_authenticated:
@@ -101,6 +129,7 @@ def user_logout(request):
     return redirect('home')
 
 
+@replica_reads
 @login_required
 def dashboard(request):
     """Patient dashboard view"""
@@ -112,12 +141,14 @@ def dashboard(request):
     try:
         patient = request.user.patient
     except Patient.DoesNotExist:
-        # Automatically create patient profile if not exists (only for non-admin users)
-        patient = Patient.objects.create(
+        # Automatically create patient profile if not exists (only for non-admin users).
+        # get_or_create reads the primary: a lagging replica may miss a new profile
+        patient, created = Patient.objects.get_or_create(
             user=request.user,
-            phone='',  # User can update this in profile
+            defaults={'phone': ''},  # User can update this in profile
         )
-        messages.info(request, 'Profile created! Please update your contact information.')
+        if created:
+            messages.info(request, 'Profile created! Please update your contact information.')
     
     # Get patient's appointments
     appointments = Appointment.objects.filter(patient=patient).order_by('-appointment_date', '-appointment_time')
@@ -161,24 +192,16 @@ def book_appointment(request):
             appointment.amount = appointment.doctor.consultation_fee
             appointment.save()
             
-            # Try to create Zoom meeting (non-blocking)
-            try:
-                meeting_info = create_appointment_meeting(appointment)
-                if meeting_info:
-                    # Already saved in create_appointment_meeting function
-                    messages.success(request, 'Appointment booked successfully with Zoom link! Please proceed to payment.')
-                else:
-                    messages.warning(request, 'Appointment booked! Zoom link will be generated after payment. Please proceed to payment.')
-            except Exception as e:
-                messages.warning(request, 'Appointment booked! Zoom link will be created shortly. Please proceed to payment.')
+            # The Zoom link comes from the meeting pool once the payment confirms the appointment
+            messages.success(request, 'Appointment booked successfully! Please proceed to payment; your Zoom link will be ready as soon as it is confirmed.')
             
             return redirect('appointment_detail', appointment_id=appointment.id)
         else:
-            # Debug form errors - print to console for debugging
-            print(f"Form validation failed for user {request.user.username}")
-            print(f"Form errors: {form.errors}")
-            print(f"Non-field errors: {form.non_field_errors}")
-            print(f"Form data: {request.POST}")
+            # Field errors only: the submitted data may hold patient details
+            logger.info(
+                'Booking form invalid for user %s', request.user.pk,
+                extra={'errors': form.errors.get_json_data()},
+            )
             
             # Add specific error messages
             error_messages = []
@@ -253,12 +276,43 @@ def cancel_appointment(request, appointment_id):
     if request.method == 'POST':
         appointment.status = 'cancelled'
         appointment.save()
-        messages.success(request, 'Appointment cancelled successfully.')
+        if appointment.payment_status == 'paid':
+            messages.success(request, 'Appointment cancelled successfully. Your payment will be refunded to your bKash account.')
+        else:
+            messages.success(request, 'Appointment cancelled successfully.')
         return redirect('dashboard')
     
     return render(request, 'appointments/cancel_appointment.html', {'appointment': appointment})
 
 
+@login_required
+def reschedule_appointment(request, appointment_id):
+    """Move an appointment to another date and time"""
+    appointment = get_object_or_404(Appointment, id=appointment_id, patient=request.user.patient)
+    
+    if appointment.status in ['completed', 'cancelled']:
+        messages.error(request, 'This appointment cannot be rescheduled.')
+        return redirect('appointment_detail', appointment_id=appointment.id)
+    
+    if request.method == 'POST':
+        form = RescheduleForm(request.POST)
+        if form.is_valid():
+            try:
+                reschedule(appointment, form.cleaned_data['appointment_date'], form.cleaned_data['appointment_time'])
+            except ValidationError as e:
+                form.add_error(None, e)
+            else:
+                messages.success(request, 'Appointment rescheduled successfully.')
+                return redirect('appointment_detail', appointment_id=appointment.id)
+    else:
+        form = RescheduleForm(initial={
+            'appointment_date': appointment.appointment_date,
+            'appointment_time': appointment.appointment_time,
+        })
+    
+    return render(request, 'appointments/reschedule_appointment.html', {'appointment': appointment, 'form': form})
+
+
 @login_required
 def profile(request):
     """Patient profile view"""
@@ -311,28 +365,72 @@ def initiate_payment(request, appointment_id):
     return render(request, 'appointments/payment.html', context)
 
 
-@login_required
-def process_bkash_payment(request, appointment_id):
+def async_login_required(view_func):
+    """login_required for async views (Django 4.2's decorator only wraps sync views)"""
+    @wraps(view_func)
+    async def wrapper(request, *args, **kwargs):
+        # Resolving request.user reads the session, which is sync-only
+        is_authenticated = await sync_to_async(lambda: request.user.is_authenticated)()
+        if not is_authenticated:
+            return redirect_to_login(request.get_full_path())
+        return await view_func(request, *args, **kwargs)
+    return wrapper
+
+
+async def _aget_object_or_404(model, **kwargs):
+    """Async get_object_or_404 (not in Django 4.2)"""
+    try:
+        return await model._default_manager.aget(**kwargs)
+    except model.DoesNotExist:
+        raise Http404(f'No {model._meta.object_name} matches the given query.')
+
+
+@async_login_required
+@rate_limit('payment')
+async def process_bkash_payment(request, appointment_id):
     """Process bKash payment - TEST MODE (for demo without credentials)"""
     if request.method != 'POST':
         return JsonResponse({'success': False, 'message': 'Invalid request method'})
     
     # Check if user has patient profile
-    if not hasattr(request.user, 'patient'):
+    patient = await Patient.objects.filter(user_id=request.user.id).afirst()
+    if patient is None:
         return JsonResponse({'success': False, 'message': 'Patient profile not found'})
     
-    appointment = get_object_or_404(Appointment, id=appointment_id, patient=request.user.patient)
+    appointment = await _aget_object_or_404(Appointment, id=appointment_id, patient=patient)
     
     if appointment.payment_status == 'paid':
         return JsonResponse({'success': False, 'message': 'Payment already completed'})
     
     try:
+        if not settings.BKASH_TEST_MODE:
+            callback_url = request.build_absolute_uri(reverse('payment_callback'))
+            result = await ainitiate_appointment_payment(appointment, callback_url=callback_url)
+            if result and result.get('success'):
+                payment = await Payment.objects.acreate(
+                    appointment=appointment,
+                    amount=appointment.amount,
+                    payment_method='bkash',
+                    payment_id=result.get('payment_id'),
+                    status='pending'
+                )
+                return JsonResponse({
+                    'success': True,
+                    'bkash_url': result.get('bkash_url'),
+                    'payment_id': result.get('payment_id')
+                })
+            else:
+                return JsonResponse({
+                    'success': False,
+                    'message': (result or {}).get('message', 'Payment initiation failed')
+                })
+        
         # TEST MODE: Simulate payment without bKash credentials
-        # In production, uncomment the real bKash integration below
+        # (set BKASH_TEST_MODE=False to use the real bKash integration above)
         
         # Create payment record
         import uuid
-        payment = Payment.objects.create(
+        payment = await Payment.objects.acreate(
             appointment=appointment,
             amount=appointment.amount,
             payment_method='bkash',
@@ -350,27 +448,6 @@ def process_bkash_payment(request, appointment_id):
             'payment_id': payment.payment_id,
             'test_mode': True
         })
-        
-        # REAL bKash INTEGRATION (uncomment when you have credentials):
-        # result = initiate_appointment_payment(appointment)
-        # if result and result.get('success'):
-        #     payment = Payment.objects.create(
-        #         appointment=appointment,
-        #         amount=appointment.amount,
-        #         payment_method='bkash',
-        #         payment_id=result.get('payment_id'),
-        #         status='pending'
-        #     )
-        #     return JsonResponse({
-        #         'success': True,
-        #         'bkash_url': result.get('bkash_url'),
-        #         'payment_id': result.get('payment_id')
-        #     })
-        # else:
-        #     return JsonResponse({
-        #         'success': False,
-        #         'message': result.get('message', 'Payment initiation failed')
-        #     })
     
     except Exception as e:
         return JsonResponse({
@@ -379,83 +456,83 @@ def process_bkash_payment(request, appointment_id):
         })
 
 
-@csrf_exempt
-def payment_callback(request):
-    """bKash payment callback - TEST MODE"""
+@rate_limit('payment_callback')
+async def payment_callback(request):
+    """bKash payment callback (simulated in TEST MODE)"""
     if request.method == 'GET':
         payment_id = request.GET.get('paymentID')
         status = request.GET.get('status')
         
         if status == 'success' and payment_id:
-            try:
-                payment = Payment.objects.get(payment_id=payment_id)
-                
+            record = await Payment.objects.filter(payment_id=payment_id).values('id', 'appointment_id', 'status').afirst()
+            if record is None:
+                metrics.PAYMENT_CALLBACKS.labels('not_found').inc()
+                messages.error(request, 'Payment record not found.')
+                return redirect('dashboard')
+            if record['status'] == 'completed':
+                # Callback replayed (e.g. page refresh): bKash would refuse a second execute
+                metrics.PAYMENT_CALLBACKS.labels('replayed').inc()
+                return redirect('payment_success', appointment_id=record['appointment_id'])
+            
+            if settings.BKASH_TEST_MODE:
                 # TEST MODE: Auto-complete payment without bKash API
                 import uuid
-                payment.status = 'completed'
-                payment.transaction_id = f'TRX_{uuid.uuid4().hex[:10]}'
-                payment.bkash_transaction_id = payment.transaction_id
-                payment.payment_date = timezone.now()
-                payment.save()
-                
-                # Update appointment payment status
-                payment.appointment.payment_status = 'paid'
-                payment.appointment.status = 'confirmed'
-                payment.appointment.save()
-                
-                # Create Zoom meeting if not exists
-                if not payment.appointment.zoom_join_url:
-                    try:
-                        meeting_info = create_appointment_meeting(payment.appointment)
-                        if meeting_info:
-                            messages.success(request, 'Payment successful! Your appointment is confirmed and Zoom meeting link is ready.')
-                        else:
-                            messages.warning(request, 'Payment successful! However, Zoom link creation failed. Please contact support.')
-                    except Exception as zoom_error:
-                        messages.warning(request, f'Payment successful! Zoom link will be created shortly.')
-                else:
-                    messages.success(request, 'Payment successful! Your appointment is confirmed.')
-                
-                return redirect('payment_success', appointment_id=payment.appointment.id)
-                
-                # REAL bKash INTEGRATION (uncomment when you have credentials):
-                # bkash_service = BkashPaymentService()
-                # result = bkash_service.execute_payment(payment_id)
-                # 
-                # if result and result.get('success'):
-                #     payment.status = 'completed'
-                #     payment.transaction_id = result.get('transaction_id')
-                #     payment.bkash_transaction_id = result.get('transaction_id')
-                #     payment.payment_date = timezone.now()
-                #     payment.save()
-                #     
-                #     payment.appointment.payment_status = 'paid'
-                #     payment.appointment.status = 'confirmed'
-                #     payment.appointment.save()
-                #     
-                #     messages.success(request, 'Payment successful! Your appointment is confirmed.')
-                #     return redirect('appointment_detail', appointment_id=payment.appointment.id)
-                # else:
-                #     payment.status = 'failed'
-                #     payment.save()
-                #     messages.error(request, 'Payment execution failed. Please try again.')
-                #     return redirect('initiate_payment', appointment_id=payment.appointment.id)
+                transaction_id = f'TRX_{uuid.uuid4().hex[:10]}'
+            else:
+                result = await BkashPaymentService().aexecute_payment(payment_id)
+                if result and result.get('unavailable'):
+                    # bKash is down: leave the payment pending rather than failing it
+                    metrics.PAYMENT_CALLBACKS.labels('unavailable').inc()
+                    messages.warning(request, result['message'])
+                    return redirect('appointment_detail', appointment_id=record['appointment_id'])
+                if not (result and result.get('success')):
+                    metrics.PAYMENT_CALLBACKS.labels('execute_failed').inc()
+                    await sync_to_async(fail_payments)([record['id']])
+                    messages.error(request, 'Payment execution failed. Please try again.')
+                    return redirect('initiate_payment', appointment_id=record['appointment_id'])
+                transaction_id = result.get('transaction_id')
             
-            except Payment.DoesNotExist:
-                messages.error(request, 'Payment record not found.')
-                return redirect('dashboard')
+            completed = await sync_to_async(complete_payments)({record['id']: transaction_id})
+            if not completed:
+                # A concurrent callback or reconcile run got there first
+                metrics.PAYMENT_CALLBACKS.labels('replayed').inc()
+                return redirect('payment_success', appointment_id=record['appointment_id'])
+            payment = completed[0]
+            metrics.PAYMENT_CALLBACKS.labels('completed').inc()
+            
+            # Confirmation normally assigned a pooled meeting; create one only if the pool ran dry
+            if not payment.appointment.zoom_join_url:
+                try:
+                    meeting_info = await acreate_appointment_meeting(payment.appointment)
+                    if meeting_info:
+                        messages.success(request, 'Payment successful! Your appointment is confirmed and Zoom meeting link is ready.')
+                    else:
+                        messages.warning(request, 'Payment successful! However, Zoom link creation failed. Please contact support.')
+                except Exception as zoom_error:
+                    messages.warning(request, f'Payment successful! Zoom link will be created shortly.')
+            else:
+                messages.success(request, 'Payment successful! Your appointment is confirmed and Zoom meeting link is ready.')
+            
+            return redirect('payment_success', appointment_id=payment.appointment.id)
         
         elif status == 'cancel':
+            metrics.PAYMENT_CALLBACKS.labels('cancelled').inc()
             messages.warning(request, 'Payment cancelled.')
             return redirect('dashboard')
         
         else:
+            metrics.PAYMENT_CALLBACKS.labels('failed').inc()
             messages.error(request, 'Payment failed.')
             return redirect('dashboard')
     
+    metrics.PAYMENT_CALLBACKS.labels('invalid').inc()
     return redirect('dashboard')
 
 
+# csrf_exempt() in Django 4.2 wraps the view in a sync function; mark it instead
+payment_callback.csrf_exempt = True
+
+
 @login_required
 def payment_success(request, appointment_id):
     """Payment success page"""
@@ -469,10 +546,16 @@ def payment_success(request, appointment_id):
     return render(request, 'appointments/payment_success.html', context)
 
 
+@replica_reads
 def doctors_list(request):
     """List all available doctors"""
     doctors = Doctor.objects.filter(is_available=True)
     
+    # Search by name, specialization, qualification or bio
+    query = request.GET.get('q', '').strip()
+    if query:
+        doctors = search_doctors(query, doctors)
+    
     # Filter by specialization if provided
     specialization = request.GET.get('specialization')
     if specialization:
@@ -480,11 +563,19 @@ def doctors_list(request):
     
     context = {
         'doctors': doctors,
+        'query': query,
         'specializations': Doctor.objects.values_list('specialization', flat=True).distinct(),
     }
     return render(request, 'appointments/doctors_list.html', context)
 
 
+def doctor_autocomplete(request):
+    """Typeahead suggestions for doctor search (AJAX endpoint)"""
+    query = request.GET.get('q', '')
+    return JsonResponse({'results': prefix_index.lookup(query, limit=10)})
+
+
+@replica_reads
 def doctor_detail(request, doctor_id):
     """Doctor detail view"""
     doctor = get_object_or_404(Doctor, id=doctor_id)
@@ -526,43 +617,189 @@ def generate_zoom_link(request, appointment_id):
 
 
 # AJAX endpoints
-@login_required
-def get_available_slots(request, doctor_id, date):
+@async_login_required
+@rate_limit('slots', json=True)
+async def get_available_slots(request, doctor_id, date):
     """Get available time slots for a doctor on a specific date"""
     try:
-        doctor = Doctor.objects.get(id=doctor_id)
+        doctor = await Doctor.objects.aget(id=doctor_id)
         appointment_date = datetime.strptime(date, '%Y-%m-%d').date()
-        weekday = appointment_date.weekday()
-        
-        # Get doctor's time slots for this weekday
-        time_slots = TimeSlot.objects.filter(
-            doctor=doctor,
-            weekday=weekday,
-            is_available=True
-        )
-        
-        # Get already booked appointments
-        booked_times = Appointment.objects.filter(
+        available_slots = await sync_to_async(_cached_available_slots)(doctor, appointment_date)
+        return JsonResponse({'slots': available_slots})
+    
+    except Exception as e:
+        return JsonResponse({'error': str(e)}, status=400)
+
+
+def _available_slots(doctor, appointment_date):
+    """A doctor's free slots on one date, as ``get_available_slots`` returns them"""
+    # Get doctor's time slots for this weekday
+    time_slots = TimeSlot.objects.filter(
+        doctor=doctor,
+        weekday=appointment_date.weekday(),
+        is_available=True
+    )
+    
+    # Get already booked appointments
+    booked_times = set(
+        Appointment.objects.filter(
             doctor=doctor,
             appointment_date=appointment_date,
             status__in=['pending', 'confirmed']
         ).values_list('appointment_time', flat=True)
-        
-        available_slots = []
-        for slot in time_slots:
-            if slot.start_time not in booked_times:
-                available_slots.append({
-                    'time': slot.start_time.strftime('%H:%M'),
-                    'display': slot.start_time.strftime('%I:%M %p')
-                })
-        
-        return JsonResponse({'slots': available_slots})
+    )
     
-    except Exception as e:
+    return [
+        {
+            'time': slot.start_time.strftime('%H:%M'),
+            'display': slot.start_time.strftime('%I:%M %p')
+        }
+        for slot in time_slots
+        if slot.start_time not in booked_times
+    ]
+
+
+def _cached_available_slots(doctor, appointment_date):
+    key = caching.make_key(caching.doctor_scope(doctor), 'slots', appointment_date.isoformat())
+    return caching.get_or_set(key, lambda: _available_slots(doctor, appointment_date))
+
+
+def _conditional_json(request, payload):
+    """
+    Compact JSON response with an ETag over its body
+
+    Clients that send the ETag back in If-None-Match get a 304 when nothing
+    changed; private/max-age=0 keeps shared caches out of it.
+    """
+    body = json.dumps(payload, separators=(',', ':'))
+    etag = quote_etag(hashlib.md5(body.encode()).hexdigest())
+
+    response = get_conditional_response(request, etag=etag)
+    if response is None:
+        response = HttpResponse(body, content_type='application/json')
+    response['ETag'] = etag
+    patch_cache_control(response, private=True, max_age=0)
+    return response
+
+
+@login_required
+def get_availability_range(request, doctor_id):
+    """
+    Get availability for a doctor's whole booking window in one call
+
+    Query params: ``start`` (YYYY-MM-DD, default today) and ``days``
+    (default and maximum BOOKING_WINDOW_DAYS). Each entry of ``days`` in the
+    response is a hex bitmask over ``slots[weekday]`` for that date.
+    """
+    doctor = get_object_or_404(Doctor, id=doctor_id)
+    try:
+        start = request.GET.get('start')
+        start = datetime.strptime(start, '%Y-%m-%d').date() if start else timezone.localdate()
+        days = int(request.GET.get('days', BOOKING_WINDOW_DAYS))
+    except ValueError as e:
         return JsonResponse({'error': str(e)}, status=400)
+    days = max(1, min(days, BOOKING_WINDOW_DAYS))
+
+    key = caching.make_key(caching.doctor_scope(doctor), 'window', start.isoformat(), days)
+    window = caching.get_or_set(key, lambda: booking_window(doctor, start, days))
+    payload = {
+        'doctor': doctor.id,
+        'start': start.isoformat(),
+        'slots': window['slots'],
+        'days': [format(mask, 'x') for mask in window['days']],
+    }
+    return _conditional_json(request, payload)
+
+
+def search_earliest_slots(request):
+    """
+    Find the earliest open slots across all doctors of a specialization
+
+    Query params: ``specialization`` (required), ``start`` (YYYY-MM-DD,
+    default today), ``days`` (default 7) and ``k`` (default 10, max 50).
+    """
+    specialization = request.GET.get('specialization', '').strip()
+    if not specialization:
+        return JsonResponse({'error': 'specialization is required'}, status=400)
+
+    try:
+        today = timezone.localdate()
+        start = request.GET.get('start')
+        start = datetime.strptime(start, '%Y-%m-%d').date() if start else today
+        days = max(1, min(int(request.GET.get('days', 7)), BOOKING_WINDOW_DAYS))
+        k = max(1, min(int(request.GET.get('k', 10)), 50))
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+
+    # Never offer slots that have already started today
+    not_before = timezone.localtime().replace(tzinfo=None) if start <= today else None
+    results = earliest_slots(specialization, start, days, k=k, not_before=not_before)
+
+    return JsonResponse({
+        'slots': [
+            {
+                'doctor_id': result['doctor'].id,
+                'doctor_name': result['doctor'].name,
+                'specialization': result['doctor'].specialization,
+                'consultation_fee': str(result['doctor'].consultation_fee),
+                'date': result['date'].isoformat(),
+                'time': result['time'].strftime('%H:%M'),
+            }
+            for result in results
+        ]
+    })
 
 
 # Doctor Dashboard Views
+def dashboard_stats(doctor, today):
+    """
+    Dashboard totals and today's hourly load for a doctor
+
+    Totals come from the incrementally maintained counters, not COUNT(*),
+    and are cached until the doctor's next appointment change. Shared by
+    the dashboard page and its live event stream.
+    """
+    key = caching.make_key(caching.doctor_scope(doctor), 'dashboard', today.isoformat())
+    return caching.get_or_set(key, lambda: _dashboard_stats(doctor, today))
+
+
+def _dashboard_stats(doctor, today):
+    total_counts = counters.status_counts(doctor=doctor)
+    today_counts = counters.status_counts(doctor=doctor, date=today)
+    today_total = sum(today_counts.values())
+
+    # Calculate hourly appointment statistics for today
+    hourly_stats = []
+    if today_total:
+        hour_counts = counters.hourly_counts(doctor, today)
+        for hour in range(8, 20):  # 8 AM to 8 PM
+            hour_appointments = hour_counts.get(hour, 0)
+            
+            status = "Available"
+            if hour_appointments >= 20:
+                status = "FULL (20/20)"
+            elif hour_appointments >= 15:
+                status = f"Almost Full ({hour_appointments}/20)"
+            elif hour_appointments > 0:
+                status = f"Booked ({hour_appointments}/20)"
+            
+            hourly_stats.append({
+                'hour': f"{hour:02d}:00 - {hour+1:02d}:00",
+                'count': hour_appointments,
+                'status': status,
+                'is_full': hour_appointments >= 20,
+                'is_almost_full': hour_appointments >= 15
+            })
+
+    return {
+        'total': sum(total_counts.values()),
+        'completed': total_counts['completed'],
+        'today': today_total,
+        'hourly': hourly_stats,
+    }
+
+
+@replica_reads
 @login_required
 def doctor_dashboard(request):
     """Doctor dashboard view - shows all appointments"""
@@ -582,8 +819,9 @@ def doctor_dashboard(request):
             doctors = Doctor.objects.filter(is_available=True)
             return render(request, 'appointments/select_doctor.html', {'doctors': doctors})
         
-        # Save selected doctor in session
-        request.session['selected_doctor_id'] = doctor_id
+        # Save selected doctor in session (only on change, so the session isn't saved on every request)
+        if request.session.get('selected_doctor_id') != doctor_id:
+            request.session['selected_doctor_id'] = doctor_id
         
         try:
             doctor = Doctor.objects.get(id=doctor_id)
@@ -616,51 +854,113 @@ def doctor_dashboard(request):
         appointment_date__lt=today
     ) | all_appointments.filter(status__in=['completed', 'cancelled'])
     
-    # Calculate hourly appointment statistics for today
-    from datetime import datetime, timedelta
-    hourly_stats = []
-    if todays_appointments.exists():
-        # Group today's appointments by hour
-        for hour in range(8, 20):  # 8 AM to 8 PM
-            hour_start = datetime.combine(today, datetime.min.time().replace(hour=hour))
-            hour_end = hour_start + timedelta(hours=1)
-            
-            hour_appointments = todays_appointments.filter(
-                appointment_time__gte=hour_start.time(),
-                appointment_time__lt=hour_end.time(),
-                status__in=['pending', 'confirmed']
-            ).count()
-            
-            status = "Available"
-            if hour_appointments >= 20:
-                status = "FULL (20/20)"
-            elif hour_appointments >= 15:
-                status = f"Almost Full ({hour_appointments}/20)"
-            elif hour_appointments > 0:
-                status = f"Booked ({hour_appointments}/20)"
-            
-            hourly_stats.append({
-                'hour': f"{hour:02d}:00 - {hour+1:02d}:00",
-                'count': hour_appointments,
-                'status': status,
-                'is_full': hour_appointments >= 20,
-                'is_almost_full': hour_appointments >= 15
-            })
+    stats = dashboard_stats(doctor, today)
 
     context = {
         'doctor': doctor,
-        'total_appointments': all_appointments.count(),
-        'today_appointments': todays_appointments.count(),
+        'total_appointments': stats['total'],
+        'today_appointments': stats['today'],
         'todays_list': todays_appointments,
         'upcoming_appointments': upcoming_appointments,
-        'completed_appointments': all_appointments.filter(status='completed').count(),
+        'completed_appointments': stats['completed'],
         'past_appointments': past_appointments[:10],
-        'hourly_stats': hourly_stats,
+        'hourly_stats': stats['hourly'],
+        'today': today,
     }
     
     return render(request, 'appointments/doctor_dashboard.html', context)
 
 
+# Live dashboard stream: heartbeat keeps proxies from closing an idle
+# connection and re-sends the stats when they changed, which also catches up
+# on changes published in another worker process; streams end after a while
+# and EventSource reconnects, which bounds how long a vanished client can
+# hold a subscription
+SSE_HEARTBEAT_SECONDS = 15
+SSE_MAX_SECONDS = 300
+
+
+def _dashboard_doctor_id(request):
+    """Id of the doctor whose dashboard ``request.user`` may watch, or None"""
+    user = request.user
+    if not user.is_authenticated:
+        return None
+    if hasattr(user, 'doctor'):
+        return user.doctor.id
+    if user.is_staff:
+        doctor_id = str(request.GET.get('doctor_id') or request.session.get('selected_doctor_id') or '')
+        return int(doctor_id) if doctor_id.isdigit() else None
+    return None
+
+
+def _stats_event(stats):
+    return f'event: stats\ndata: {json.dumps(stats, separators=(",", ":"))}\n\n'
+
+
+async def _doctor_event_stream(subscription, doctor):
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + SSE_MAX_SECONDS
+    sent_stats = None
+    try:
+        yield 'retry: 3000\n\n'
+        while loop.time() < deadline:
+            if subscription.overflowed:
+                # Events were lost: the page must reload rather than patch
+                yield 'event: resync\ndata: {}\n\n'
+                return
+            event = await subscription.get(SSE_HEARTBEAT_SECONDS)
+            if event is None:
+                # Events are only seen in the process that published them; the
+                # counters behind the stats are shared by all of them
+                stats = await sync_to_async(dashboard_stats)(doctor, timezone.now().date())
+                if stats == sent_stats:
+                    yield ': keepalive\n\n'
+                else:
+                    sent_stats = stats
+                    yield _stats_event(stats)
+                continue
+
+            chunks = [event.encode()]
+            while (event := subscription.get_nowait()) is not None:
+                chunks.append(event.encode())
+            # One stats refresh per burst of events
+            sent_stats = await sync_to_async(dashboard_stats)(doctor, timezone.now().date())
+            chunks.append(_stats_event(sent_stats))
+            yield ''.join(chunks)
+    finally:
+        broker.unsubscribe(subscription)
+
+
+async def doctor_events(request):
+    """
+    Server-sent events with appointment and payment changes for the
+    dashboard's doctor
+
+    Needs an ASGI server. Under WSGI a stream would tie up a worker for as
+    long as the dashboard is open, so it answers 204, which tells
+    EventSource to stop reconnecting and leaves the dashboard static.
+    """
+    if not isinstance(request, ASGIRequest):
+        return HttpResponse(status=204)
+
+    doctor_id = await sync_to_async(_dashboard_doctor_id)(request)
+    if doctor_id is None:
+        return HttpResponse(status=403)
+    doctor = await Doctor.objects.filter(pk=doctor_id).afirst()
+    if doctor is None:
+        return HttpResponse(status=404)
+
+    last_event_id = broker.parse_event_id(request.headers.get('Last-Event-ID'))
+    subscription = broker.subscribe(doctor_topic(doctor.id), last_event_id)
+    response = StreamingHttpResponse(
+        _doctor_event_stream(subscription, doctor),
+        content_type='text/event-stream'
+    )
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
 @login_required
 def doctor_appointment_detail(request, appointment_id):
     """Doctor view for appointment details"""
@@ -818,22 +1118,31 @@ def delete_time_slot(request, slot_id):
     return redirect('doctor_schedule')
 
 
-def get_doctor_time_slots(request, doctor_id):
+@replica_reads
+async def get_doctor_time_slots(request, doctor_id):
     """Get time slots for a specific doctor (AJAX endpoint)"""
-    doctor = get_object_or_404(Doctor, id=doctor_id)
+    doctor = await _aget_object_or_404(Doctor, id=doctor_id)
+    slots_data = await sync_to_async(_cached_doctor_time_slots)(doctor)
+    return JsonResponse({'slots': slots_data})
+
+
+def _doctor_time_slots(doctor):
     time_slots = TimeSlot.objects.filter(doctor=doctor, is_available=True).order_by('weekday', 'start_time')
-    
-    slots_data = []
-    for slot in time_slots:
-        slots_data.append({
+    return [
+        {
             'id': slot.id,
             'weekday': slot.weekday,
             'weekday_name': slot.get_weekday_display(),
             'start_time': slot.start_time.strftime('%H:%M'),
             'end_time': slot.end_time.strftime('%H:%M'),
-        })
-    
-    return JsonResponse({'slots': slots_data})
+        }
+        for slot in time_slots
+    ]
+
+
+def _cached_doctor_time_slots(doctor):
+    key = caching.make_key(caching.doctor_scope(doctor), 'schedule')
+    return caching.get_or_set(key, lambda: _doctor_time_slots(doctor))
 
 
 @login_required
@@ -854,3 +1163,73 @@ def doctor_profile(request):
     }
     
     return render(request, 'appointments/doctor_profile.html', context)
+
+
+# JSON API v1
+def api_login_required(view_func):
+    """Like login_required, but answers 401 JSON instead of redirecting"""
+    @wraps(view_func)
+    def wrapper(request, *args, **kwargs):
+        if not request.user.is_authenticated:
+            return JsonResponse({'error': 'Authentication required'}, status=401)
+        return view_func(request, *args, **kwargs)
+    return wrapper
+
+
+def _sync_response(request, queryset, fields, serialize):
+    try:
+        limit = int(request.GET.get('limit', SYNC_PAGE_SIZE))
+        rows, cursor, has_more = changes_since(
+            queryset, fields,
+            cursor=request.GET.get('since'),
+            limit=max(1, min(limit, SYNC_MAX_PAGE_SIZE)),
+        )
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+
+    return _conditional_json(request, {
+        'appointments': [serialize(row) for row in rows],
+        'cursor': cursor,
+        'has_more': has_more,
+    })
+
+
+@api_login_required
+def api_patient_appointments(request):
+    """
+    The signed-in patient's appointments changed since ``?since=<cursor>``
+
+    Omit ``since`` for a full sync. Keep requesting with the returned
+    ``cursor`` while ``has_more`` is true; ``limit`` caps the page size.
+    """
+    if not hasattr(request.user, 'patient'):
+        return JsonResponse({'error': 'Patient profile not found'}, status=403)
+    appointments = Appointment.objects.filter(patient=request.user.patient)
+    return _sync_response(request, appointments, PATIENT_FIELDS, patient_row)
+
+
+@api_login_required
+def api_doctor_appointments(request):
+    """
+    The signed-in doctor's appointments changed since ``?since=<cursor>``
+
+    Staff users pick the doctor with ``?doctor_id=``. Paging works as in
+    ``api_patient_appointments``.
+    """
+    if hasattr(request.user, 'doctor'):
+        doctor = request.user.doctor
+    elif request.user.is_staff and request.GET.get('doctor_id', '').isdigit():
+        doctor = get_object_or_404(Doctor, id=request.GET['doctor_id'])
+    else:
+        return JsonResponse({'error': 'Doctor profile not found'}, status=403)
+    appointments = Appointment.objects.filter(doctor=doctor)
+    return _sync_response(request, appointments, DOCTOR_FIELDS, doctor_row)
+
+
+# Monitoring
+def prometheus_metrics(request):
+    """Metrics in the Prometheus text format, for scrapers on METRICS_ALLOWED_IPS and staff users"""
+    if request.META.get('REMOTE_ADDR') not in settings.METRICS_ALLOWED_IPS and not request.user.is_staff:
+        return HttpResponse('Forbidden', status=403, content_type='text/plain')
+    body, content_type = metrics.exposition()
+    return HttpResponse(body, content_type=content_type)
@@ -1,58 +1,156 @@
+import logging
 import requests
+import httpx
 import jwt
 import time
 from datetime import datetime, timedelta
 from django.conf import settings
 
+from .circuit_breaker import CircuitOpenError, zoom_breaker
+from .http_client import async_client
+
+
+logger = logging.getLogger(__name__)
+
 
 class ZoomService:
-    """Service class for Zoom API integration"""
+    """
+    Service class for Zoom API integration
+
+    Every API method has an async twin with an ``a`` prefix
+    (``acreate_meeting`` etc.) that uses a non-blocking HTTP client, for
+    async views running under ASGI.
+    """
     
     def __init__(self):
         self.account_id = settings.ZOOM_ACCOUNT_ID
         self.client_id = settings.ZOOM_CLIENT_ID
         self.client_secret = settings.ZOOM_CLIENT_SECRET
-        self.base_url = "https://api.zoom.us/v2"
-        self.token_url = "https://zoom.us/oauth/token"
+        self.base_url = settings.ZOOM_BASE_URL
+        self.token_url = settings.ZOOM_TOKEN_URL
+        # Reused by later calls on the same instance until shortly before it expires
+        self._access_token = None
+        self._token_expiry = 0
+    
+    def _has_credentials(self):
+        if not all([self.account_id, self.client_id, self.client_secret]):
+            logger.warning('Zoom credentials not configured - using manual entry mode')
+            return False
+        return True
+    
+    def _token_request(self):
+        """Headers and form data for the Server-to-Server OAuth token request"""
+        auth_string = f"{self.client_id}:{self.client_secret}"
+        import base64
+        auth_bytes = auth_string.encode('utf-8')
+        auth_base64 = base64.b64encode(auth_bytes).decode('utf-8')
+        
+        headers = {
+            'Authorization': f'Basic {auth_base64}',
+            'Content-Type': 'application/x-www-form-urlencoded'
+        }
+        
+        data = {
+            'grant_type': 'account_credentials',
+            'account_id': self.account_id
+        }
+        return headers, data
+    
+    def _manual_meeting(self, topic, start_time, duration):
+        """Fallback response when the API is unavailable: the doctor enters the link"""
+        return {
+            'meeting_id': f'manual_{int(time.time())}',
+            'join_url': 'MANUAL_ENTRY_REQUIRED',
+            'start_url': 'MANUAL_ENTRY_REQUIRED',
+            'password': 'N/A',
+            'topic': topic,
+            'start_time': start_time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'duration': duration,
+            'status': 'manual_entry',
+            'message': 'Doctor will provide meeting link manually'
+        }
+    
+    def _meeting_payload(self, topic, start_time, duration, agenda):
+        # Format start time for Zoom API (ISO 8601)
+        start_time_str = start_time.strftime('%Y-%m-%dT%H:%M:%S')
+        
+        return {
+            "topic": topic,
+            "type": 2,  # Scheduled meeting
+            "start_time": start_time_str,
+            "duration": duration,
+            "timezone": "Asia/Dhaka",
+            "agenda": agenda,
+            "settings": {
+                "host_video": True,
+                "participant_video": True,
+                "join_before_host": False,
+                "mute_upon_entry": True,
+                "watermark": False,
+                "audio": "both",
+                "auto_recording": "none",
+                "waiting_room": True,
+                "approval_type": 2  # No registration required
+            }
+        }
+    
+    def _meeting_result(self, meeting_info):
+        return {
+            'meeting_id': meeting_info.get('id'),
+            'join_url': meeting_info.get('join_url'),
+            'start_url': meeting_info.get('start_url'),
+            'password': meeting_info.get('password'),
+            'topic': meeting_info.get('topic'),
+            'start_time': meeting_info.get('start_time'),
+            'duration': meeting_info.get('duration')
+        }
+    
+    def _update_payload(self, topic=None, start_time=None, duration=None, agenda=None):
+        update_data = {}
+        if topic:
+            update_data['topic'] = topic
+        if start_time:
+            update_data['start_time'] = start_time.strftime('%Y-%m-%dT%H:%M:%S')
+        if duration:
+            update_data['duration'] = duration
+        if agenda:
+            update_data['agenda'] = agenda
+        return update_data
+    
+    def _async_client(self):
+        return async_client(settings.GATEWAY_TIMEOUT)
     
     def get_access_token(self):
         """Get OAuth access token using Server-to-Server OAuth"""
         try:
             # Check if credentials are available
-            if not all([self.account_id, self.client_id, self.client_secret]):
-                print("⚠️ Zoom credentials not configured - Using manual entry mode")
+            if not self._has_credentials():
                 return None
-                
-            auth_string = f"{self.client_id}:{self.client_secret}"
-            import base64
-            auth_bytes = auth_string.encode('utf-8')
-            auth_base64 = base64.b64encode(auth_bytes).decode('utf-8')
+            if self._access_token and time.monotonic() < self._token_expiry:
+                return self._access_token
             
-            headers = {
-                'Authorization': f'Basic {auth_base64}',
-                'Content-Type': 'application/x-www-form-urlencoded'
-            }
-            
-            data = {
-                'grant_type': 'account_credentials',
-                'account_id': self.account_id
-            }
-            
-            response = requests.post(self.token_url, headers=headers, data=data)
+            headers, data = self._token_request()
+            response = zoom_breaker.call(
+                requests.post, self.token_url, headers=headers, data=data, timeout=settings.GATEWAY_TIMEOUT
+            )
             response.raise_for_status()
             
             token_data = response.json()
-            return token_data.get('access_token')
+            self._access_token = token_data.get('access_token')
+            self._token_expiry = time.monotonic() + int(token_data.get('expires_in') or 3600) - 60
+            return self._access_token
         
+        except CircuitOpenError as e:
+            logger.warning('%s - using manual meeting entry mode', e)
+            return None
         except requests.exceptions.HTTPError as e:
-            print(f"❌ Zoom API Error: {e}")
-            if e.response is not None:
-                print(f"Response: {e.response.text}")
-            print("⚠️ Falling back to manual meeting entry mode")
+            logger.error(
+                'Zoom token request failed: %s - falling back to manual meeting entry mode', e,
+                extra={'response': e.response.text if e.response is not None else None},
+            )
             return None
-        except Exception as e:
-            print(f"❌ Error getting Zoom access token: {str(e)}")
-            print("⚠️ Using manual meeting entry mode")
+        except Exception:
+            logger.exception('Error getting Zoom access token - using manual meeting entry mode')
             return None
     
     def create_meeting(self, topic, start_time, duration=60, agenda=""):
@@ -71,72 +169,33 @@ class ZoomService:
         try:
             access_token = self.get_access_token()
             if not access_token:
-                print("⚠️ Zoom API not available - Using manual meeting entry")
+                logger.warning('Zoom API not available - using manual meeting entry')
                 # Return a fallback response for manual entry
-                return {
-                    'meeting_id': f'manual_{int(time.time())}',
-                    'join_url': 'MANUAL_ENTRY_REQUIRED',
-                    'start_url': 'MANUAL_ENTRY_REQUIRED',
-                    'password': 'N/A',
-                    'topic': topic,
-                    'start_time': start_time.strftime('%Y-%m-%dT%H:%M:%S'),
-                    'duration': duration,
-                    'status': 'manual_entry',
-                    'message': 'Doctor will provide meeting link manually'
-                }
+                return self._manual_meeting(topic, start_time, duration)
             
             headers = {
                 'Authorization': f'Bearer {access_token}',
                 'Content-Type': 'application/json'
             }
-            
-            # Format start time for Zoom API (ISO 8601)
-            start_time_str = start_time.strftime('%Y-%m-%dT%H:%M:%S')
-            
-            meeting_data = {
-                "topic": topic,
-                "type": 2,  # Scheduled meeting
-                "start_time": start_time_str,
-                "duration": duration,
-                "timezone": "Asia/Dhaka",
-                "agenda": agenda,
-                "settings": {
-                    "host_video": True,
-                    "participant_video": True,
-                    "join_before_host": False,
-                    "mute_upon_entry": True,
-                    "watermark": False,
-                    "audio": "both",
-                    "auto_recording": "none",
-                    "waiting_room": True,
-                    "approval_type": 2  # No registration required
-                }
-            }
+            meeting_data = self._meeting_payload(topic, start_time, duration, agenda)
             
             # Get user ID (using 'me' for the authenticated user)
             url = f"{self.base_url}/users/me/meetings"
             
-            response = requests.post(url, headers=headers, json=meeting_data)
+            response = zoom_breaker.call(
+                requests.post, url, headers=headers, json=meeting_data, timeout=settings.GATEWAY_TIMEOUT
+            )
             response.raise_for_status()
             
-            meeting_info = response.json()
-            
-            return {
-                'meeting_id': meeting_info.get('id'),
-                'join_url': meeting_info.get('join_url'),
-                'start_url': meeting_info.get('start_url'),
-                'password': meeting_info.get('password'),
-                'topic': meeting_info.get('topic'),
-                'start_time': meeting_info.get('start_time'),
-                'duration': meeting_info.get('duration')
-            }
+            return self._meeting_result(response.json())
         
+        except CircuitOpenError:
+            return self._manual_meeting(topic, start_time, duration)
         except requests.exceptions.HTTPError as e:
-            print(f"HTTP Error creating meeting: {e}")
-            print(f"Response: {e.response.text}")
+            logger.error('HTTP error creating meeting: %s', e, extra={'response': e.response.text})
             return None
-        except Exception as e:
-            print(f"Error creating meeting: {str(e)}")
+        except Exception:
+            logger.exception('Error creating meeting')
             return None
     
     def get_meeting(self, meeting_id):
@@ -151,13 +210,13 @@ class ZoomService:
             }
             
             url = f"{self.base_url}/meetings/{meeting_id}"
-            response = requests.get(url, headers=headers)
+            response = zoom_breaker.call(requests.get, url, headers=headers, timeout=settings.GATEWAY_TIMEOUT)
             response.raise_for_status()
             
             return response.json()
         
-        except Exception as e:
-            print(f"Error getting meeting: {str(e)}")
+        except Exception:
+            logger.exception('Error getting meeting %s', meeting_id)
             return None
     
     def delete_meeting(self, meeting_id):
@@ -172,13 +231,15 @@ class ZoomService:
             }
             
             url = f"{self.base_url}/meetings/{meeting_id}"
-            response = requests.delete(url, headers=headers)
+            response = zoom_breaker.call(requests.delete, url, headers=headers, timeout=settings.GATEWAY_TIMEOUT)
+            if response.status_code == 404:
+                return True  # Already deleted
             response.raise_for_status()
             
             return True
         
-        except Exception as e:
-            print(f"Error deleting meeting: {str(e)}")
+        except Exception:
+            logger.exception('Error deleting meeting %s', meeting_id)
             return False
     
     def update_meeting(self, meeting_id, topic=None, start_time=None, duration=None, agenda=None):
@@ -193,28 +254,167 @@ class ZoomService:
                 'Content-Type': 'application/json'
             }
             
-            update_data = {}
-            if topic:
-                update_data['topic'] = topic
-            if start_time:
-                update_data['start_time'] = start_time.strftime('%Y-%m-%dT%H:%M:%S')
-            if duration:
-                update_data['duration'] = duration
-            if agenda:
-                update_data['agenda'] = agenda
+            update_data = self._update_payload(topic, start_time, duration, agenda)
             
             url = f"{self.base_url}/meetings/{meeting_id}"
-            response = requests.patch(url, headers=headers, json=update_data)
+            response = zoom_breaker.call(
+                requests.patch, url, headers=headers, json=update_data, timeout=settings.GATEWAY_TIMEOUT
+            )
             response.raise_for_status()
             
             return True
         
-        except Exception as e:
-            print(f"Error updating meeting: {str(e)}")
+        except Exception:
+            logger.exception('Error updating meeting %s', meeting_id)
             return False
 
+    
+    async def aget_access_token(self, client=None):
+        """Async version of ``get_access_token``"""
+        try:
+            if not self._has_credentials():
+                return None
+            
+            headers, data = self._token_request()
+            if client is None:
+                async with self._async_client() as client:
+                    response = await zoom_breaker.acall(client.post, self.token_url, headers=headers, data=data)
+            else:
+                response = await zoom_breaker.acall(client.post, self.token_url, headers=headers, data=data)
+            response.raise_for_status()
+            
+            return response.json().get('access_token')
+        
+        except CircuitOpenError as e:
+            logger.warning('%s - using manual meeting entry mode', e)
+            return None
+        except httpx.HTTPStatusError as e:
+            logger.error(
+                'Zoom token request failed: %s - falling back to manual meeting entry mode', e,
+                extra={'response': e.response.text},
+            )
+            return None
+        except Exception:
+            logger.exception('Error getting Zoom access token - using manual meeting entry mode')
+            return None
+    
+    async def acreate_meeting(self, topic, start_time, duration=60, agenda=""):
+        """Async version of ``create_meeting``"""
+        try:
+            async with self._async_client() as client:
+                access_token = await self.aget_access_token(client)
+                if not access_token:
+                    logger.warning('Zoom API not available - using manual meeting entry')
+                    return self._manual_meeting(topic, start_time, duration)
+                
+                response = await zoom_breaker.acall(
+                    client.post,
+                    f"{self.base_url}/users/me/meetings",
+                    headers={'Authorization': f'Bearer {access_token}'},
+                    json=self._meeting_payload(topic, start_time, duration, agenda),
+                )
+                response.raise_for_status()
+            
+            return self._meeting_result(response.json())
+        
+        except CircuitOpenError:
+            return self._manual_meeting(topic, start_time, duration)
+        except httpx.HTTPStatusError as e:
+            logger.error('HTTP error creating meeting: %s', e, extra={'response': e.response.text})
+            return None
+        except Exception:
+            logger.exception('Error creating meeting')
+            return None
+    
+    async def aget_meeting(self, meeting_id):
+        """Async version of ``get_meeting``"""
+        try:
+            async with self._async_client() as client:
+                access_token = await self.aget_access_token(client)
+                if not access_token:
+                    return None
+                
+                response = await zoom_breaker.acall(
+                    client.get,
+                    f"{self.base_url}/meetings/{meeting_id}",
+                    headers={'Authorization': f'Bearer {access_token}'},
+                )
+                response.raise_for_status()
+            
+            return response.json()
+        
+        except Exception:
+            logger.exception('Error getting meeting %s', meeting_id)
+            return None
+    
+    async def adelete_meeting(self, meeting_id):
+        """Async version of ``delete_meeting``"""
+        try:
+            async with self._async_client() as client:
+                access_token = await self.aget_access_token(client)
+                if not access_token:
+                    return False
+                
+                response = await zoom_breaker.acall(
+                    client.delete,
+                    f"{self.base_url}/meetings/{meeting_id}",
+                    headers={'Authorization': f'Bearer {access_token}'},
+                )
+                if response.status_code == 404:
+                    return True  # Already deleted
+                response.raise_for_status()
+            
+            return True
+        
+        except Exception:
+            logger.exception('Error deleting meeting %s', meeting_id)
+            return False
+    
+    async def aupdate_meeting(self, meeting_id, topic=None, start_time=None, duration=None, agenda=None):
+        """Async version of ``update_meeting``"""
+        try:
+            async with self._async_client() as client:
+                access_token = await self.aget_access_token(client)
+                if not access_token:
+                    return None
+                
+                response = await zoom_breaker.acall(
+                    client.patch,
+                    f"{self.base_url}/meetings/{meeting_id}",
+                    headers={'Authorization': f'Bearer {access_token}'},
+                    json=self._update_payload(topic, start_time, duration, agenda),
+                )
+                response.raise_for_status()
+            
+            return True
+        
+        except Exception:
+            logger.exception('Error updating meeting %s', meeting_id)
+            return False
 
 # Helper function to create meeting for appointment
+def _appointment_meeting_details(appointment):
+    """Topic, start time and agenda for an appointment's meeting"""
+    # Combine date and time for meeting
+    appointment_datetime = datetime.combine(
+        appointment.appointment_date,
+        appointment.appointment_time
+    )
+    
+    # Create meeting topic
+    topic = f"Consultation: {appointment.patient.user.get_full_name()} with Dr. {appointment.doctor.name}"
+    agenda = f"Reason: {appointment.reason}"
+    return topic, appointment_datetime, agenda
+
+
+def _apply_meeting(appointment, meeting_info):
+    """Copy meeting details onto the appointment (not saved)"""
+    appointment.zoom_meeting_id = meeting_info.get('meeting_id')
+    appointment.zoom_join_url = meeting_info.get('join_url')
+    appointment.zoom_start_url = meeting_info.get('start_url')
+    appointment.zoom_password = meeting_info.get('password')
+
+
 def create_appointment_meeting(appointment):
     """
     Create a Zoom meeting for an appointment
@@ -227,17 +427,7 @@ def create_appointment_meeting(appointment):
     """
     try:
         zoom_service = ZoomService()
-        
-        # Combine date and time for meeting
-        from datetime import datetime
-        appointment_datetime = datetime.combine(
-            appointment.appointment_date,
-            appointment.appointment_time
-        )
-        
-        # Create meeting topic
-        topic = f"Consultation: {appointment.patient.user.get_full_name()} with Dr. {appointment.doctor.name}"
-        agenda = f"Reason: {appointment.reason}"
+        topic, appointment_datetime, agenda = _appointment_meeting_details(appointment)
         
         # Create meeting (default 60 minutes duration)
         meeting_info = zoom_service.create_meeting(
@@ -249,15 +439,46 @@ def create_appointment_meeting(appointment):
         
         if meeting_info:
             # Save meeting details to appointment
-            appointment.zoom_meeting_id = meeting_info.get('meeting_id')
-            appointment.zoom_join_url = meeting_info.get('join_url')
-            appointment.zoom_start_url = meeting_info.get('start_url')
-            appointment.zoom_password = meeting_info.get('password')
+            _apply_meeting(appointment, meeting_info)
             appointment.save()
-            print(f"✅ Zoom meeting created for appointment #{appointment.id}")
+            logger.info('Zoom meeting created for appointment #%s', appointment.id)
+        
+        return meeting_info
+    
+    except Exception:
+        logger.exception('Error creating Zoom meeting for appointment #%s', appointment.id)
+        return None
+
+
+async def acreate_appointment_meeting(appointment):
+    """
+    Async version of ``create_appointment_meeting``
+    
+    Args:
+        appointment: Appointment loaded with ``patient__user`` and ``doctor``
+            (related objects cannot be lazily fetched from async code)
+    
+    Returns:
+        dict: Meeting details or None if failed
+    """
+    try:
+        zoom_service = ZoomService()
+        topic, appointment_datetime, agenda = _appointment_meeting_details(appointment)
+        
+        meeting_info = await zoom_service.acreate_meeting(
+            topic=topic,
+            start_time=appointment_datetime,
+            duration=60,
+            agenda=agenda
+        )
+        
+        if meeting_info:
+            _apply_meeting(appointment, meeting_info)
+            await appointment.asave()
+            logger.info('Zoom meeting created for appointment #%s', appointment.id)
         
         return meeting_info
     
-    except Exception as e:
-        print(f"❌ Error creating Zoom meeting for appointment #{appointment.id}: {str(e)}")
+    except Exception:
+        logger.exception('Error creating Zoom meeting for appointment #%s', appointment.id)
         return None
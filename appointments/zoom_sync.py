@@ -0,0 +1,134 @@
+"""
+Zoom meeting sync queue
+
+Rescheduling an appointment queues an 'update' of its Zoom meeting and
+cancelling it queues a 'delete' (see the receivers in ``signals``), so no
+view waits on Zoom. The ``sync_zoom_meetings`` worker coalesces every due
+task for one meeting into a single API call: a delete supersedes updates,
+and an update always sends the appointment's current date and time, so a
+burst of edits to one appointment costs one PATCH.
+"""
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .circuit_breaker import OPEN, zoom_breaker
+from .models import ZoomSyncTask
+from .notifications import retry_delay
+from .zoom_service import ZoomService, _appointment_meeting_details
+
+
+def has_meeting(appointment):
+    """True if the appointment has a real Zoom meeting (not a manual-entry placeholder)"""
+    meeting_id = appointment.zoom_meeting_id
+    return bool(meeting_id) and not meeting_id.startswith('manual_')
+
+
+def enqueue(appointment, action):
+    """
+    Queue an 'update' or 'delete' of the appointment's Zoom meeting
+
+    A change to a meeting that already has a pending task is folded into
+    that task: a pending update covers any later update, and a delete
+    replaces it.
+
+    Returns:
+        ZoomSyncTask: The new row, or None if nothing new was queued
+    """
+    if not has_meeting(appointment):
+        return None
+    pending = ZoomSyncTask.objects.filter(meeting_id=appointment.zoom_meeting_id, status='pending')
+    if action == 'delete':
+        if pending.update(action='delete'):
+            return None
+    elif pending.exists():
+        return None
+    return ZoomSyncTask.objects.create(appointment=appointment, meeting_id=appointment.zoom_meeting_id, action=action)
+
+
+def claim_batch(batch_size, claim_seconds=None):
+    """
+    Claim due tasks for this worker
+
+    Claimed rows are 'processing' until ``claim_seconds`` from now; a row
+    still processing after that (its worker died) is claimed again.
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        tasks = list(
+            ZoomSyncTask.objects.filter(status__in=('pending', 'processing'), next_attempt_at__lte=now)
+            .select_related('appointment__patient__user', 'appointment__doctor')
+            .order_by('next_attempt_at', 'pk')
+            .select_for_update(skip_locked=True, of=('self',))[:batch_size]
+        )
+        for task in tasks:
+            task.status = 'processing'
+            task.attempts += 1
+            task.next_attempt_at = now + timedelta(seconds=claim_seconds or settings.ZOOM_SYNC_CLAIM_SECONDS)
+        ZoomSyncTask.objects.bulk_update(tasks, ['status', 'attempts', 'next_attempt_at'])
+    return tasks
+
+
+def _sync(service, meeting_id, tasks):
+    """Make the one Zoom call that covers all ``tasks`` for a meeting"""
+    if any(task.action == 'delete' for task in tasks):
+        return service.delete_meeting(meeting_id)
+    topic, start_time, agenda = _appointment_meeting_details(tasks[-1].appointment)
+    return service.update_meeting(meeting_id, topic=topic, start_time=start_time, duration=60, agenda=agenda)
+
+
+def process_batch(batch_size=None, max_attempts=None, workers=None):
+    """
+    Push one batch of due meeting changes to Zoom, ``workers`` at a time
+
+    Nothing is claimed while the Zoom circuit breaker is open. Tasks of a
+    meeting whose call failed go back to pending with exponential backoff
+    until ``max_attempts``.
+
+    Returns:
+        tuple: ``(synced, failed)`` counts of meetings (Zoom calls) for this batch
+    """
+    batch_size = batch_size or settings.ZOOM_SYNC_BATCH_SIZE
+    max_attempts = max_attempts or settings.ZOOM_SYNC_MAX_ATTEMPTS
+
+    if zoom_breaker.state() == OPEN:
+        return 0, 0
+    tasks = claim_batch(batch_size)
+    if not tasks:
+        return 0, 0
+
+    meetings = defaultdict(list)
+    for task in tasks:
+        meetings[task.meeting_id].append(task)
+
+    service = ZoomService()
+    service.get_access_token()  # One token for the whole batch
+    with ThreadPoolExecutor(max_workers=min(workers or settings.ZOOM_SYNC_WORKERS, len(meetings))) as pool:
+        results = list(pool.map(lambda item: _sync(service, *item), meetings.items()))
+
+    now = timezone.now()
+    synced = failed = 0
+    for group, ok in zip(meetings.values(), results):
+        if ok:
+            synced += 1
+        else:
+            failed += 1
+        for task in group:
+            if ok:
+                task.status = 'done'
+                task.processed_at = now
+                task.last_error = ''
+            else:
+                task.last_error = f'Zoom {task.action} failed'
+                if task.attempts >= max_attempts:
+                    task.status = 'failed'
+                else:
+                    task.status = 'pending'
+                    task.next_attempt_at = now + retry_delay(task.attempts)
+
+    ZoomSyncTask.objects.bulk_update(tasks, ['status', 'next_attempt_at', 'last_error', 'processed_at'])
+    return synced, failed